@@ -0,0 +1,132 @@
+"""Compare SQL statements and wall time per quiz save for the ORM and bulk insert paths.
+
+Usage (from backend/PDFBrain):
+    python -m benchmarks.bench_bulk_insert [--saves N] [--questions Q] [--latency-ms MS]
+
+Drops and recreates the schema, so it never runs against DATABASE_URL: it uses a throwaway
+SQLite file, or BENCHMARK_DATABASE_URL if set. Point that at a scratch local Postgres and
+pass --latency-ms to add a simulated round trip per statement (see bench_db_throughput).
+Also times importing a chat history message by message and in bulk.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Always set, so an exported DATABASE_URL (production) is never the one dropped
+os.environ["DATABASE_URL"] = os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///benchmark.db")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from benchmarks.bench_db_throughput import start_latency_proxy
+
+
+def question_rows(count: int):
+    return [
+        {
+            "question_type": "mcq",
+            "question_text": f"Question {i}?",
+            "correct_answer": "A",
+            "options": ["A", "B", "C", "D"],
+            "explanation": "Because.",
+            "order_index": i + 1
+        }
+        for i in range(count)
+    ]
+
+
+async def main(saves: int, questions: int, messages: int):
+    from datetime import datetime
+    from sqlalchemy import insert
+
+    from database import Base, SessionLocal, bulk_insert, count_queries, engine
+    from models import ChatMessage, PDFDocument, Quiz, QuizQuestion
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        document = PDFDocument(filename="bench.pdf", original_filename="bench.pdf", file_path="bench.pdf", file_size=0, status="ready")
+        db.add(document)
+        await db.commit()
+        document_id = document.id
+
+    rows = question_rows(questions)
+
+    async def per_object(db):
+        # Quiz flushed for its id, one add per question, then commit and refresh
+        quiz = Quiz(document_id=document_id, title="Quiz", total_questions=len(rows))
+        db.add(quiz)
+        await db.flush()
+        for row in rows:
+            db.add(QuizQuestion(quiz_id=quiz.id, **row))
+            await db.flush()
+        await db.commit()
+        await db.refresh(quiz)
+
+    async def relationship(db):
+        # Questions attached through the relationship and flushed together
+        quiz = Quiz(document_id=document_id, title="Quiz", total_questions=len(rows))
+        quiz.questions = [QuizQuestion(**row) for row in rows]
+        db.add(quiz)
+        await db.commit()
+
+    async def bulk(db):
+        # What QuizGeneratorService.generate_quiz does
+        quiz_id = await db.scalar(
+            insert(Quiz).values(document_id=document_id, title="Quiz", total_questions=len(rows)).returning(Quiz.id)
+        )
+        await bulk_insert(db, QuizQuestion, [{"quiz_id": quiz_id, **row} for row in rows], returning=(QuizQuestion.id,))
+        await db.commit()
+
+    print(f"{questions} questions per quiz, {saves} saves each")
+    print(f"{'quiz save':14} {'statements':>10} {'median ms':>10} {'mean ms':>10}")
+    for name, save in (("per-object", per_object), ("relationship", relationship), ("bulk", bulk)):
+        timings = []
+        with count_queries() as counter:
+            for _ in range(saves):
+                async with SessionLocal() as db:
+                    start = time.perf_counter()
+                    await save(db)
+                    timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:14} {counter['count'] / saves:10.1f} {statistics.median(timings):10.1f} {statistics.mean(timings):10.1f}")
+
+    history = [
+        {"document_id": document_id, "session_id": "bench", "user_message": f"Q{i}", "ai_response": f"A{i}", "timestamp": datetime.utcnow()}
+        for i in range(messages)
+    ]
+
+    async def import_per_object(db):
+        for row in history:
+            db.add(ChatMessage(**row))
+            await db.flush()
+        await db.commit()
+
+    async def import_bulk(db):
+        await bulk_insert(db, ChatMessage, history, returning=(ChatMessage.id,))
+        await db.commit()
+
+    print(f"\n{'chat import':14} {'statements':>10} {'ms':>10}   ({messages} messages)")
+    for name, save in (("per-object", import_per_object), ("bulk", import_bulk)):
+        with count_queries() as counter:
+            async with SessionLocal() as db:
+                start = time.perf_counter()
+                await save(db)
+                elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:14} {counter['count']:10} {elapsed:10.1f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--saves", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.latency_ms and os.environ["DATABASE_URL"].startswith("postgres"):
+        os.environ["DATABASE_URL"] = start_latency_proxy(os.environ["DATABASE_URL"], args.latency_ms)
+
+    asyncio.run(main(args.saves, args.questions, args.messages))
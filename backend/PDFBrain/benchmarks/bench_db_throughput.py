@@ -0,0 +1,159 @@
+"""Load test the read endpoints with concurrent clients and report throughput and /health latency.
+
+Usage (from backend/PDFBrain):
+    python -m benchmarks.bench_db_throughput [--requests N] [--concurrency C] [--latency-ms MS]
+
+Drops and recreates the schema, so it never runs against DATABASE_URL: it uses a throwaway
+SQLite file, or BENCHMARK_DATABASE_URL if set. Point that at a scratch local Postgres and
+pass --latency-ms to put a TCP proxy in front that delays every packet, which stands in for
+the round trip to a hosted database. A blocked event loop shows up as /health latency
+climbing with the database latency.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Always set, so an exported DATABASE_URL (production) is never the one dropped
+os.environ["DATABASE_URL"] = os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///benchmark.db")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import make_url
+
+SESSION_ID = "bench-session"
+
+
+async def _pipe(reader, writer, delay: float):
+    try:
+        while data := await reader.read(65536):
+            await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def start_latency_proxy(url: str, latency_ms: float) -> str:
+    """Start a delaying TCP proxy in front of a Postgres URL and return the proxied URL"""
+    url = make_url(url)
+    socket_dir = url.query.get("host")
+    delay = latency_ms / 1000 / 2  # half the round trip each way
+    ready = threading.Event()
+    listen = {}
+
+    async def handle(client_reader, client_writer):
+        if socket_dir and socket_dir.startswith("/"):
+            upstream = await asyncio.open_unix_connection(f"{socket_dir}/.s.PGSQL.{url.port or 5432}")
+        else:
+            upstream = await asyncio.open_connection(url.host or "localhost", url.port or 5432)
+        await asyncio.gather(_pipe(client_reader, upstream[1], delay), _pipe(upstream[0], client_writer, delay))
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        listen["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        await server.serve_forever()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+    proxied = url.set(host="127.0.0.1", port=listen["port"]).difference_update_query(["host"])
+    return proxied.render_as_string(hide_password=False)
+
+
+def seed(messages: int) -> int:
+    """Create a document with one chat session and a quiz through a plain sync engine"""
+    from database import Base
+    from models import ChatMessage, ChatSession, PDFDocument, Quiz
+
+    url = os.environ["DATABASE_URL"].replace("postgres://", "postgresql://", 1)
+    sync_engine = create_engine(url)
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
+    with sync_engine.begin() as conn:
+        document_id = conn.execute(insert(PDFDocument).values(
+            filename="bench.pdf", original_filename="bench.pdf", file_path="bench.pdf",
+            file_size=0, status="ready", extracted_text="lorem ipsum " * 1000
+        ).returning(PDFDocument.id)).scalar_one()
+        start = datetime.utcnow()
+        conn.execute(insert(ChatMessage), [
+            {
+                "document_id": document_id, "session_id": SESSION_ID,
+                "user_message": f"question {i}", "ai_response": "answer " * 50,
+                "timestamp": start + timedelta(seconds=i)
+            }
+            for i in range(messages)
+        ])
+        conn.execute(insert(ChatSession).values(
+            document_id=document_id, session_id=SESSION_ID,
+            message_count=messages, last_activity=start + timedelta(seconds=messages)
+        ))
+        conn.execute(insert(Quiz).values(id=1, document_id=document_id, title="Quiz", total_questions=0))
+    sync_engine.dispose()
+    return document_id
+
+
+async def run(document_id: int, requests: int, concurrency: int):
+    import httpx
+    from main import app
+
+    urls = [
+        f"/api/pdf/documents/{document_id}",
+        f"/api/chat/history/{document_id}/{SESSION_ID}?limit=20",
+        f"/api/chat/sessions/{document_id}",
+        f"/api/quiz/document/{document_id}/quizzes",
+    ]
+    remaining = iter(range(requests))
+    latencies, health = [], []
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            for i in remaining:
+                began = time.perf_counter()
+                response = await client.get(urls[i % len(urls)])
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - began)
+
+        async def probe():
+            while not done.is_set():
+                began = time.perf_counter()
+                await client.get("/health")
+                health.append(time.perf_counter() - began)
+                await asyncio.sleep(0.01)
+
+        # Warm the connection pool before timing
+        await client.get(urls[0])
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    latencies.sort()
+    health.sort()
+    print(f"{requests} requests, {concurrency} concurrent clients")
+    print(f"throughput:      {requests / elapsed:8.1f} req/s")
+    print(f"request p50/p99: {statistics.median(latencies) * 1000:8.1f} / {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"/health p50/p99: {statistics.median(health) * 1000:8.1f} / {health[int(len(health) * 0.99)] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.latency_ms and os.environ["DATABASE_URL"].startswith("postgres"):
+        os.environ["DATABASE_URL"] = start_latency_proxy(os.environ["DATABASE_URL"], args.latency_ms)
+
+    document_id = seed(args.messages)
+    asyncio.run(run(document_id, args.requests, args.concurrency))
@@ -0,0 +1,73 @@
+"""Compare bytes fetched and latency of the document list query with and without projection.
+
+Usage (from backend/PDFBrain):
+    python -m benchmarks.bench_document_list [documents] [text_kb]
+
+Seeds and deletes bench-* documents, so it never runs against DATABASE_URL: it uses a throwaway
+SQLite file, or BENCHMARK_DATABASE_URL if set.
+"""
+import os
+import sys
+import time
+
+# Always set, so an exported DATABASE_URL (production) is never the one written to
+os.environ["DATABASE_URL"] = os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///benchmark.db")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import asyncio
+
+from sqlalchemy import delete, select
+
+from database import Base, SessionLocal, engine
+from models import PDFDocument
+from routers.pdf_router import DOCUMENT_RESPONSE_COLUMNS
+
+
+async def measure(db, statement, runs: int = 5):
+    start = time.perf_counter()
+    for _ in range(runs):
+        rows = (await db.execute(statement)).all()
+    elapsed = (time.perf_counter() - start) / runs
+    fetched = sum(len(str(value).encode("utf-8")) for row in rows for value in row if value is not None)
+    return fetched, elapsed
+
+
+async def main(documents: int, text_kb: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        await db.execute(delete(PDFDocument).where(PDFDocument.filename.like("bench-%")))
+        db.add_all(
+            PDFDocument(
+                filename=f"bench-{i}.pdf",
+                original_filename=f"bench-{i}.pdf",
+                file_path=f"uploads/bench-{i}.pdf",
+                extracted_text="lorem ipsum " * (text_kb * 1024 // 12),
+                summary="summary " * 200,
+                file_size=text_kb * 1024,
+                status="ready"
+            )
+            for i in range(documents)
+        )
+        await db.commit()
+
+        # Before: every column of the entity, as db.query(PDFDocument) used to load
+        full_bytes, full_time = await measure(db, select(PDFDocument.__table__).limit(documents))
+        # After: the projection the list endpoint now runs
+        projected_bytes, projected_time = await measure(db, select(*DOCUMENT_RESPONSE_COLUMNS).limit(documents))
+
+        print(f"{documents} documents with {text_kb} KB of text each")
+        print(f"full rows:  {full_bytes / 1024 / 1024:8.2f} MB  {full_time * 1000:8.1f} ms")
+        print(f"projection: {projected_bytes / 1024 / 1024:8.2f} MB  {projected_time * 1000:8.1f} ms")
+
+        await db.execute(delete(PDFDocument).where(PDFDocument.filename.like("bench-%")))
+        await db.commit()
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    text_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(documents, text_kb))
@@ -0,0 +1,48 @@
+"""Report text extraction throughput in pages/sec for 1..N extraction processes.
+
+Usage (from backend/PDFBrain):
+    python -m benchmarks.bench_extraction [max_processes] [pdf ...]
+
+Defaults to the sample PDFs in uploads/ and up to os.cpu_count() processes.
+"""
+import glob
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmark.db")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from services.pdf_processor import PDFProcessor
+
+
+def run(processes: int, paths: list) -> float:
+    processor = PDFProcessor(extraction_processes=processes)
+    try:
+        # Warm up so process start-up is not counted against the first document
+        processor.extract_pages_from_pdf(paths[0])
+
+        pages = 0
+        start = time.perf_counter()
+        for path in paths:
+            pages += len(processor.extract_pages_from_pdf(path))
+        elapsed = time.perf_counter() - start
+    finally:
+        processor.shutdown()
+
+    print(f"{processes:>9} {pages:>6} {elapsed:>9.2f} {pages / elapsed:>10.1f}")
+    return pages / elapsed
+
+
+if __name__ == "__main__":
+    max_processes = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    paths = sys.argv[2:] or sorted(glob.glob("uploads/*.pdf"))
+    if not paths:
+        sys.exit("No PDFs found")
+
+    print(f"{'processes':>9} {'pages':>6} {'seconds':>9} {'pages/sec':>10}")
+    baseline = run(1, paths)
+    for processes in range(2, max_processes + 1):
+        rate = run(processes, paths)
+    if max_processes > 1:
+        print(f"speedup at {max_processes} processes: {rate / baseline:.2f}x")
@@ -0,0 +1,121 @@
+"""Measure quiz grading throughput: ORM grading, cached answer keys and batch grading.
+
+Usage (from backend/PDFBrain):
+    python -m benchmarks.bench_grading [--submissions N] [--quizzes Q] [--latency-ms MS]
+
+Drops and recreates the schema, so it never runs against DATABASE_URL: it uses a throwaway
+SQLite file, or BENCHMARK_DATABASE_URL if set. Point that at a scratch local Postgres and
+pass --latency-ms to add a simulated round trip per statement (see bench_db_throughput).
+Submissions are spread over the quizzes, as in a class taking a few quizzes at once.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+# Always set, so an exported DATABASE_URL (production) is never the one dropped
+os.environ["DATABASE_URL"] = os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///benchmark.db")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from benchmarks.bench_db_throughput import start_latency_proxy
+
+QUESTIONS_PER_QUIZ = 10
+
+
+async def main(num_submissions: int, num_quizzes: int):
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+
+    from database import Base, SessionLocal, count_queries, engine
+    from models import PDFDocument, Quiz, QuizQuestion
+    from schemas import QuizBatchSubmission, QuizSubmissionRequest, UserAnswer
+    from services.answer_key_service import answer_key_service
+    from services.quiz_generator import quiz_generator
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        document = PDFDocument(filename="bench.pdf", original_filename="bench.pdf", file_path="bench.pdf", file_size=0, status="ready")
+        db.add(document)
+        await db.flush()
+        quizzes = []
+        for q in range(num_quizzes):
+            quiz = Quiz(document_id=document.id, title=f"Quiz {q}", total_questions=QUESTIONS_PER_QUIZ)
+            quiz.questions = [
+                QuizQuestion(
+                    question_type="mcq",
+                    question_text=f"Question {i}?",
+                    correct_answer="B",
+                    options=["A) one", "B) two", "C) three", "D) four"],
+                    explanation="Two is right.",
+                    order_index=i + 1
+                )
+                for i in range(QUESTIONS_PER_QUIZ)
+            ]
+            db.add(quiz)
+            quizzes.append(quiz)
+        await db.commit()
+        question_ids = {quiz.id: [question.id for question in quiz.questions] for quiz in quizzes}
+
+    random.seed(0)
+    submissions = [
+        QuizBatchSubmission(
+            quiz_id=quiz_id,
+            answers=[UserAnswer(question_id=question_id, answer=random.choice("ABCD")) for question_id in question_ids[quiz_id]]
+        )
+        for quiz_id in random.choices(list(question_ids), k=num_submissions)
+    ]
+
+    async def orm(db, submission):
+        # What check_answers did: hydrate the quiz and its questions, compare in Python
+        quiz = await db.scalar(select(Quiz).options(selectinload(Quiz.questions)).where(Quiz.id == submission.quiz_id))
+        answers = {ans.question_id: ans.answer for ans in submission.answers}
+        return sum(answers.get(question.id, "").lower() == str(question.correct_answer).lower() for question in quiz.questions)
+
+    async def answer_key(db, submission):
+        return await quiz_generator.check_answers(submission.quiz_id, QuizSubmissionRequest(answers=submission.answers), db)
+
+    print(f"{num_submissions} submissions over {num_quizzes} quizzes of {QUESTIONS_PER_QUIZ} questions")
+    print(f"{'path':22} {'statements':>10} {'seconds':>8} {'per second':>10}")
+
+    for name, grade in (("orm", orm), ("answer key, cold", answer_key), ("answer key, warm", answer_key)):
+        if name.endswith("cold"):
+            for quiz_id in question_ids:
+                await answer_key_service.invalidate(quiz_id)
+        with count_queries() as counter:
+            start = time.perf_counter()
+            async with SessionLocal() as db:
+                for submission in submissions:
+                    await grade(db, submission)
+            elapsed = time.perf_counter() - start
+        print(f"{name:22} {counter['count']:10} {elapsed:8.3f} {num_submissions / elapsed:10.0f}")
+
+    for name in ("batch, cold", "batch, warm"):
+        if name.endswith("cold"):
+            for quiz_id in question_ids:
+                await answer_key_service.invalidate(quiz_id)
+        with count_queries() as counter:
+            start = time.perf_counter()
+            async with SessionLocal() as db:
+                graded = await quiz_generator.check_answers_batch(submissions, db)
+            elapsed = time.perf_counter() - start
+        assert len(graded["results"]) == num_submissions
+        print(f"{name:22} {counter['count']:10} {elapsed:8.3f} {num_submissions / elapsed:10.0f}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--submissions", type=int, default=500)
+    parser.add_argument("--quizzes", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.latency_ms and os.environ["DATABASE_URL"].startswith("postgres"):
+        os.environ["DATABASE_URL"] = start_latency_proxy(os.environ["DATABASE_URL"], args.latency_ms)
+
+    asyncio.run(main(args.submissions, args.quizzes))
@@ -0,0 +1,53 @@
+"""Compare prompt size and answer latency of chunk retrieval against truncation.
+
+Usage (from backend/PDFBrain, with GEMINI_API_KEY set):
+    python -m benchmarks.bench_retrieval uploads/<file>.pdf "What is the main conclusion?" ...
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmark.db")
+
+from services.gemini_service import gemini_service
+from services.pdf_processor import pdf_processor
+from services.retrieval_service import retrieval_service
+
+
+async def timed_answer(question: str, context: str) -> float:
+    start = time.perf_counter()
+    await gemini_service.answer_question(question=question, context=context)
+    return time.perf_counter() - start
+
+
+async def main(pdf_path: str, questions: list) -> None:
+    pages = pdf_processor.extract_pages_from_pdf(pdf_path)
+    text = pdf_processor.join_pages(pages)
+    truncated = pdf_processor.truncate_text_for_ai(text)
+
+    chunks = retrieval_service.build_chunks(pages)
+    start = time.perf_counter()
+    embeddings = await gemini_service.embed_texts([chunk["content"] for chunk in chunks])
+    print(f"{len(pages)} pages, {len(text)} chars, {len(chunks)} chunks indexed in {time.perf_counter() - start:.2f}s")
+
+    vectors = [retrieval_service._normalize(embedding) for embedding in embeddings]
+    print(f"{'question':40} {'trunc chars':>12} {'rag chars':>10} {'trunc s':>8} {'rag s':>8}")
+    for question in questions:
+        query = retrieval_service._normalize((await gemini_service.embed_texts([question], task_type="RETRIEVAL_QUERY"))[0])
+        ranked = sorted(
+            range(len(chunks)),
+            key=lambda i: sum(a * b for a, b in zip(query, vectors[i])),
+            reverse=True
+        )[:retrieval_service.top_k]
+        context = "\n\n".join(chunks[i]["content"] for i in sorted(ranked))
+
+        truncated_latency = await timed_answer(question, truncated)
+        retrieval_latency = await timed_answer(question, context)
+        print(f"{question[:40]:40} {len(truncated):>12} {len(context):>10} {truncated_latency:>8.2f} {retrieval_latency:>8.2f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit(__doc__)
+    asyncio.run(main(sys.argv[1], sys.argv[2:]))
@@ -0,0 +1,58 @@
+"""Compare latency and token use of single-shot and map-reduce summaries of a long document.
+
+Usage (from backend/PDFBrain, with GEMINI_API_KEY set):
+    python -m benchmarks.bench_summary uploads/<file>.pdf [copies]
+
+The PDF's pages are repeated `copies` times (default 1) to stand in for a textbook.
+The last run edits one page and re-summarizes, which only re-runs the map step for
+that page's section plus the reduce. Steps are stored in a throwaway SQLite file (or
+BENCHMARK_DATABASE_URL); delete it between runs for another cold run.
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Summary steps are stored in the database; keep them out of an exported DATABASE_URL
+os.environ["DATABASE_URL"] = os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///benchmark.db")
+
+from database import init_db
+from services.gemini_service import gemini_service
+from services.pdf_processor import pdf_processor
+from services.summarizer_service import summarizer_service
+
+
+async def measure(name: str, call) -> None:
+    usage = dict(gemini_service.token_usage)
+    start = time.perf_counter()
+    summary = await call()
+    elapsed = time.perf_counter() - start
+    delta = {key: gemini_service.token_usage[key] - usage[key] for key in usage}
+    print(
+        f"{name:28} {elapsed:8.2f} {delta['calls']:6} {delta['prompt_tokens']:10} "
+        f"{delta['output_tokens']:10} {len(summary):9}"
+    )
+
+
+async def main(pdf_path: str, copies: int) -> None:
+    await init_db()
+    original = pdf_processor.extract_pages_from_pdf(pdf_path)
+    # Number the copies so identical sections are not served from stored summaries
+    pages = [f"Copy {copy + 1}\n{page}" for copy in range(copies) for page in original]
+    text = pdf_processor.join_pages(pages)
+    print(f"{len(pages)} pages, {len(text)} chars, {len(summarizer_service.build_sections(pages))} sections")
+    print(f"{'path':28} {'seconds':>8} {'calls':>6} {'prompt tok':>10} {'output tok':>10} {'chars':>9}")
+
+    # Single-shot: what ingestion did before, on the first MAX_CONTENT_LENGTH characters only
+    await measure("single-shot (truncated)", lambda: gemini_service.generate_summary(pdf_processor.truncate_text_for_ai(text)))
+    await measure("map-reduce (cold)", lambda: summarizer_service.summarize(pages))
+
+    edited = list(pages)
+    edited[len(edited) // 2] += "\nAn added paragraph that changes this page."
+    await measure("map-reduce (one page edited)", lambda: summarizer_service.summarize(edited))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    asyncio.run(main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1))
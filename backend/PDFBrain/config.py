@@ -18,6 +18,49 @@ class Settings:
     
     # AI settings
     MAX_CONTENT_LENGTH: int = int(os.getenv("MAX_CONTENT_LENGTH", "50000"))  # Max chars for AI processing
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))  # In-flight Gemini calls per process
+    GEMINI_TIMEOUT: float = float(os.getenv("GEMINI_TIMEOUT", "60"))  # Seconds, including time spent queued
+    
+    # Retrieval settings
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1500"))  # Max chars per indexed chunk
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))  # Chars carried over between chunks of a section
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "6"))  # Chunks sent to the model per question
+    
+    # Response cache settings
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # "memory", "redis" or "none"
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))  # Seconds
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))  # LRU bound of the in-process backend
+    RESPONSE_CACHE_SIMILARITY: float = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))  # Cosine similarity for a question hit
+    RESPONSE_CACHE_QUESTIONS_PER_DOCUMENT: int = int(os.getenv("RESPONSE_CACHE_QUESTIONS_PER_DOCUMENT", "200"))
+    ANSWER_KEY_CACHE_TTL: int = int(os.getenv("ANSWER_KEY_CACHE_TTL", "300"))  # Seconds; quiz answer keys are cached per process
+    ANSWER_KEY_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_KEY_CACHE_MAX_ENTRIES", "1000"))
+    
+    # Ingestion settings
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", "4"))  # Documents processed concurrently
+    INGESTION_QUEUE_SIZE: int = int(os.getenv("INGESTION_QUEUE_SIZE", "100"))  # Uploads are rejected with 503 beyond this
+    INGESTION_MAX_RETRIES: int = int(os.getenv("INGESTION_MAX_RETRIES", "2"))
+    INGESTION_RETRY_BACKOFF: float = float(os.getenv("INGESTION_RETRY_BACKOFF", "2"))  # Seconds, doubled per retry
+    EXTRACTION_PROCESSES: int = int(os.getenv("EXTRACTION_PROCESSES", str(os.cpu_count() or 1)))
+    EXTRACTION_PAGES_PER_TASK: int = int(os.getenv("EXTRACTION_PAGES_PER_TASK", "8"))  # Page range size sent to one process
+    EXTRACTION_PAGE_TIMEOUT: float = float(os.getenv("EXTRACTION_PAGE_TIMEOUT", "30"))  # Seconds before a page is skipped
+    
+    # Summary settings
+    SUMMARY_PAGES_PER_CHUNK: int = int(os.getenv("SUMMARY_PAGES_PER_CHUNK", "10"))  # Pages per map step of long documents
+    SUMMARY_FAN_OUT: int = int(os.getenv("SUMMARY_FAN_OUT", "4"))  # Concurrent map calls per document
+    SUMMARY_PART_TTL_DAYS: int = int(os.getenv("SUMMARY_PART_TTL_DAYS", "90"))  # Stored map/reduce results unused this long are deleted
+    
+    # Quiz settings
+    QUIZ_MAX_SHARDS: int = int(os.getenv("QUIZ_MAX_SHARDS", "4"))  # Generation calls run at once per quiz
+    QUIZ_SHARD_MIN_CHARS: int = int(os.getenv("QUIZ_SHARD_MIN_CHARS", "3000"))  # Shorter documents get fewer shards
+    QUIZ_DUPLICATE_THRESHOLD: float = float(os.getenv("QUIZ_DUPLICATE_THRESHOLD", "0.8"))  # Word overlap (Jaccard) at which questions are duplicates
+    BUILD_QUESTION_BANK: bool = os.getenv("BUILD_QUESTION_BANK", "false").lower() == "true"  # Generate a bank after ingestion
+    QUESTION_BANK_SIZE: int = int(os.getenv("QUESTION_BANK_SIZE", "15"))  # Questions generated per difficulty level
+    
+    # Derivative settings
+    PRECOMPUTE_DERIVATIVES: bool = os.getenv("PRECOMPUTE_DERIVATIVES", "false").lower() == "true"  # Generate after ingestion
+    DERIVATIVE_OPERATIONS: list = os.getenv("DERIVATIVE_OPERATIONS", "summarize,outline,explain,bullet_points").split(",")
     
     def __init__(self):
         # Create upload directory if it doesn't exist
@@ -1,37 +1,133 @@
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-import asyncio
-from contextlib import asynccontextmanager
+from sqlalchemy import event, func, insert, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from contextlib import contextmanager
+from typing import Any, Dict, List, Sequence
 
 from config import settings
 
-# Create engine - Updated for Supabase PostgreSQL
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=False,
-    pool_pre_ping=True,
-    pool_size = 5,
-    max_overflow = 10
+def to_async_url(url: str) -> str:
+    """Point a sync DATABASE_URL at the matching async driver"""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        url = "postgresql+asyncpg://" + url.split("://", 1)[1]
+        # asyncpg takes ssl= rather than libpq's sslmode=
+        url = url.replace("sslmode=", "ssl=")
+    elif url.startswith("sqlite://"):
+        url = "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+ASYNC_DATABASE_URL = to_async_url(settings.DATABASE_URL)
 
-)
+engine_options = {"echo": False, "pool_pre_ping": True}
+if ASYNC_DATABASE_URL.startswith("postgresql+asyncpg"):
+    engine_options.update(
+        pool_size=5,
+        max_overflow=10,
+        # Supabase's pooler runs in transaction mode, which breaks cached prepared statements
+        connect_args={"statement_cache_size": 0}
+    )
+
+# Create engine - Updated for Supabase PostgreSQL
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options)
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factory; objects stay usable after commit since async sessions cannot lazy-refresh
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
 
 # Create base class for models
 Base = declarative_base()
 
 async def init_db():
     """Initialize database tables"""
-    from models import PDFDocument, ChatMessage, Quiz, QuizQuestion
-    Base.metadata.create_all(bind=engine)
+    from models import (
+        PDFDocument, StoredFile, DocumentChunk, DocumentDerivative, SummaryPart, QuestionBankItem, ChatMessage, ChatSession, Quiz, QuizQuestion,
+        QuizAttempt, QuizStat, QuizScoreBucket, QuizQuestionStat, UserProgress, UserQuizProgress
+    )
+    async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Workers start together; hold a transaction-scoped lock so only one creates or alters tables at a time
+            await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('pdfbrain_init_db'))"))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+        # Documents stored before status existed were all processed on upload
+        await conn.execute(update(PDFDocument).where(PDFDocument.status.is_(None)).values(status="ready"))
+        # Content-addressed files stored before they were counted
+        dialect = sqlite if conn.dialect.name == "sqlite" else postgresql
+        await conn.execute(dialect.insert(StoredFile).from_select(
+            ["content_hash", "file_path", "document_count"],
+            select(PDFDocument.content_hash, func.min(PDFDocument.file_path), func.count(PDFDocument.id))
+            .where(PDFDocument.content_hash.is_not(None))
+            .group_by(PDFDocument.content_hash)
+        ).on_conflict_do_nothing())
+    await backfill_chat_sessions()
+
+# Columns added to tables that already exist in deployed databases; create_all only creates missing tables
+ADDED_COLUMNS = {
+    "pdf_documents": ("content_hash", "status", "error_message", "page_engines"),
+    "chat_messages": (),
+    "summary_parts": ("last_used",),
+}
+
+def add_missing_columns(conn):
+    """Add ADDED_COLUMNS, and the indexes of their tables, where an existing table lacks them"""
+    inspector = inspect(conn)
+    for table_name, column_names in ADDED_COLUMNS.items():
+        table = Base.metadata.tables[table_name]
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        for name in column_names:
+            if name not in existing:
+                column_type = table.c[name].type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+async def backfill_chat_sessions():
+    """Populate chat_sessions from existing messages the first time the table is created"""
+    from models import ChatMessage, ChatSession
 
-def get_db():
+    async with engine.begin() as conn:
+        if (await conn.execute(select(ChatSession.session_id).limit(1))).first():
+            return
+        # Workers starting together may all find the table empty; the later inserts skip the sessions already there
+        dialect = sqlite if conn.dialect.name == "sqlite" else postgresql
+        await conn.execute(dialect.insert(ChatSession).from_select(
+            ["document_id", "session_id", "message_count", "last_activity"],
+            select(
+                ChatMessage.document_id,
+                ChatMessage.session_id,
+                func.count(ChatMessage.id),
+                func.max(ChatMessage.timestamp)
+            ).group_by(ChatMessage.document_id, ChatMessage.session_id)
+        ).on_conflict_do_nothing())
+
+async def bulk_insert(db: AsyncSession, model, rows: List[Dict[str, Any]], returning: Sequence = ()) -> List[Any]:
+    """Insert rows as multi-row INSERTs (RETURNING the given columns, in row order) without ORM unit-of-work overhead"""
+    if not rows:
+        return []
+    statement = insert(model)
+    if returning:
+        statement = statement.returning(*returning, sort_by_parameter_order=True)
+        return list((await db.execute(statement, rows)).all())
+    await db.execute(statement, rows)
+    return []
+
+async def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
+
+@contextmanager
+def count_queries(bind=engine.sync_engine):
+    """Count the SQL statements executed on the engine inside the block"""
+    counter = {"count": 0}
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["count"] += 1
+
+    event.listen(bind, "before_cursor_execute", on_execute)
+    try:
+        yield counter
     finally:
-        db.close()
+        event.remove(bind, "before_cursor_execute", on_execute)
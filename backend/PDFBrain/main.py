@@ -7,6 +7,8 @@ import os
 from contextlib import asynccontextmanager
 
 from database import init_db
+from services.ingestion_service import ingestion_service
+from services.response_cache import response_cache
 from routers.pdf_router import router as pdf_router
 from routers.chat_router import router as chat_router
 from routers.quiz_router import router as quiz_router
@@ -15,9 +17,11 @@ from routers.quiz_router import router as quiz_router
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await ingestion_service.start()
     yield
     # Shutdown
-    pass
+    await ingestion_service.stop()
+    await response_cache.close()
 
 app = FastAPI(
     title="PDF Knowledge Bot API",
@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, JSON, SmallInteger, Numeric
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, JSON, SmallInteger, Numeric, Float, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from database import Base
 
+# bigint on Postgres; SQLite only autoincrements INTEGER primary keys (local and benchmark databases)
+BigIntegerId = BigInteger().with_variant(Integer, "sqlite")
+
 
 class PDFDocument(Base):
     __tablename__ = "pdf_documents"
@@ -11,19 +14,97 @@ class PDFDocument(Base):
     filename = Column(String, nullable=False)           # character varying (no limit)
     original_filename = Column(String, nullable=False)  # character varying
     file_path = Column(String, nullable=False)          # character varying
-    extracted_text = Column(Text, nullable=True)        # text
+    # Large columns are only loaded when accessed or explicitly undeferred
+    extracted_text = deferred(Column(Text, nullable=True), group="content")  # text
     summary = Column(Text, nullable=True)               # text
     upload_time = Column(DateTime, default=datetime.utcnow)  # timestamp w/o tz
     file_size = Column(Integer, nullable=False)         # integer
     page_count = Column(Integer, nullable=True)         # integer
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 of the PDF bytes
+    status = Column(String, nullable=True, default="pending", index=True)  # see schemas.DocumentStatus
+    error_message = Column(Text, nullable=True)         # last ingestion failure
+    page_engines = deferred(Column(JSON, nullable=True), group="content")  # extractor that produced each page
     
     # Relationships
     chat_messages = relationship("ChatMessage", back_populates="document")
     quizzes = relationship("Quiz", back_populates="document")
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
+
+
+class StoredFile(Base):
+    __tablename__ = "stored_files"
+    
+    # Uploads are stored once per content; every document uploaded with that content shares the file
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 of the PDF bytes
+    file_path = Column(String, nullable=False)
+    document_count = Column(Integer, nullable=False, default=0)  # the file is removed with the last document
+
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("pdf_documents.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)            # position within the document
+    page_number = Column(Integer, nullable=True)             # 1-based, null for legacy documents
+    section = Column(String, nullable=True)                  # nearest heading above the chunk
+    content = Column(Text, nullable=False)
+    embedding = Column(JSON, nullable=True)                  # unit-normalized vector
+    
+    # Relationships
+    document = relationship("PDFDocument", back_populates="chunks")
+
+
+class DocumentDerivative(Base):
+    __tablename__ = "document_derivatives"
+    __table_args__ = (
+        UniqueConstraint("document_id", "operation", name="uq_document_derivatives_document_operation"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("pdf_documents.id"), nullable=False)
+    operation = Column(String, nullable=False)               # summarize, outline, explain, bullet_points
+    source_hash = Column(String(64), nullable=False)         # SHA-256 of the text the result was generated from
+    result = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SummaryPart(Base):
+    __tablename__ = "summary_parts"
+    
+    # Map and reduce steps of map-reduce summaries, keyed by input, so an edited document only re-runs the steps it changed
+    model = Column(String, primary_key=True)
+    step = Column(String, primary_key=True)                  # section, reduce, final
+    input_hash = Column(String(64), primary_key=True)        # SHA-256 of the step's input text
+    summary = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used = Column(DateTime, default=datetime.utcnow, index=True)  # refreshed at most daily; stale parts are swept
+
+
+class QuestionBankItem(Base):
+    __tablename__ = "question_bank_items"
+    __table_args__ = (
+        Index("ix_question_bank_items_document_difficulty_type", "document_id", "difficulty", "question_type"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("pdf_documents.id"), nullable=False)
+    question_type = Column(String, nullable=False)           # mcq, true_false, fill_blank
+    difficulty = Column(String, nullable=False)              # easy, medium, hard
+    topic = Column(String, nullable=True)                    # short concept label from the model
+    question_text = Column(Text, nullable=False)
+    options = Column(JSON, nullable=True)
+    correct_answer = Column(Text, nullable=False)
+    explanation = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Serves keyset pagination and recent-history lookups within a session
+        Index("ix_chat_messages_document_session_timestamp_id", "document_id", "session_id", "timestamp", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)   # integer
     document_id = Column(Integer, ForeignKey("pdf_documents.id"), nullable=False)
@@ -36,10 +117,20 @@ class ChatMessage(Base):
     document = relationship("PDFDocument", back_populates="chat_messages")
 
 
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+    
+    # Maintained alongside chat_messages so session listings and counts need no scan
+    document_id = Column(Integer, ForeignKey("pdf_documents.id"), primary_key=True)
+    session_id = Column(String, primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    last_activity = Column(DateTime, default=datetime.utcnow)
+
+
 class Quiz(Base):
     __tablename__ = "quizzes"
     
-    id = Column(BigInteger, primary_key=True, index=True)    # Supabase: bigint
+    id = Column(BigIntegerId, primary_key=True, index=True)  # Supabase: bigint
     created_at = Column(DateTime, default=datetime.utcnow)   # timestamp with tz default now()
     category_id = Column(BigInteger, nullable=True)          # bigint, FK to categories
     title = Column(String, nullable=True)                    # character varying
@@ -55,7 +146,7 @@ class Quiz(Base):
 class QuizQuestion(Base):
     __tablename__ = "quiz_questions"
     
-    id = Column(BigInteger, primary_key=True, index=True)    # Supabase: bigint
+    id = Column(BigIntegerId, primary_key=True, index=True)  # Supabase: bigint
     quiz_id = Column(BigInteger, ForeignKey("quizzes.id"), nullable=False)
     question_text = Column(Text, nullable=False)             # text
     options = Column(JSON, nullable=True)                    # jsonb
@@ -67,3 +158,74 @@ class QuizQuestion(Base):
     
     # Relationships
     quiz = relationship("Quiz", back_populates="questions")
+
+
+class QuizAttempt(Base):
+    __tablename__ = "quiz_attempts"
+    __table_args__ = (
+        # Serves a user's recent attempts
+        Index("ix_quiz_attempts_user_created_at", "user_id", "created_at"),
+    )
+    
+    id = Column(BigIntegerId, primary_key=True, index=True)
+    quiz_id = Column(BigInteger, ForeignKey("quizzes.id"), nullable=False, index=True)
+    user_id = Column(String, nullable=True)                  # anonymous submissions have none
+    score = Column(Float, nullable=False)                    # percent
+    correct_answers = Column(Integer, nullable=False)
+    total_questions = Column(Integer, nullable=False)
+    answers = Column(JSON, nullable=False)                   # [{question_id, answer, is_correct}]
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Aggregates below are updated in the same transaction as each attempt, so dashboards read
+# one row (or one row per question / bucket) instead of scanning quiz_attempts
+
+class QuizStat(Base):
+    __tablename__ = "quiz_stats"
+    
+    quiz_id = Column(BigInteger, ForeignKey("quizzes.id"), primary_key=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0)
+    best_score = Column(Float, nullable=False, default=0)
+    last_attempt_at = Column(DateTime, nullable=True)
+
+
+class QuizScoreBucket(Base):
+    __tablename__ = "quiz_score_buckets"
+    
+    quiz_id = Column(BigInteger, ForeignKey("quizzes.id"), primary_key=True)
+    bucket = Column(SmallInteger, primary_key=True)          # 0-9: scores 0-9.99, ..., 90-100
+    attempt_count = Column(Integer, nullable=False, default=0)
+
+
+class QuizQuestionStat(Base):
+    __tablename__ = "quiz_question_stats"
+    
+    question_id = Column(BigInteger, ForeignKey("quiz_questions.id"), primary_key=True)
+    quiz_id = Column(BigInteger, ForeignKey("quizzes.id"), nullable=False, index=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    correct_count = Column(Integer, nullable=False, default=0)
+
+
+class UserProgress(Base):
+    __tablename__ = "user_progress"
+    
+    # Totals over every attempt a user made, including attempts at quizzes deleted since
+    user_id = Column(String, primary_key=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0)
+    best_score = Column(Float, nullable=False, default=0)
+    questions_answered = Column(Integer, nullable=False, default=0)
+    questions_correct = Column(Integer, nullable=False, default=0)
+    last_attempt_at = Column(DateTime, nullable=True)
+
+
+class UserQuizProgress(Base):
+    __tablename__ = "user_quiz_progress"
+    
+    user_id = Column(String, primary_key=True)
+    quiz_id = Column(BigInteger, ForeignKey("quizzes.id"), primary_key=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    best_score = Column(Float, nullable=False, default=0)
+    last_score = Column(Float, nullable=False, default=0)
+    last_attempt_at = Column(DateTime, nullable=True)
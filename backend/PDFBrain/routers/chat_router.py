@@ -1,79 +1,208 @@
+import asyncio
+import base64
+import json
 import logging
+import time
 import uuid
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-
-from database import get_db
-from models import PDFDocument, ChatMessage
-from schemas import ChatRequest, ChatResponse, ChatHistoryResponse, ContentRequest, ContentResponse
+from contextlib import aclosing
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import case, delete, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from database import SessionLocal, bulk_insert, get_db
+from models import PDFDocument, ChatMessage, ChatSession
+from schemas import ChatRequest, ChatResponse, ChatHistoryResponse, ChatImportRequest, ChatImportResponse, ContentRequest, ContentResponse
+from services.derivative_service import derivative_service
 from services.gemini_service import gemini_service
 from services.pdf_processor import pdf_processor
+from services.response_cache import response_cache
+from services.retrieval_service import retrieval_service
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+ANSWER_FALLBACK = "I'm sorry, I couldn't generate a response to your question."
+
+def _encode_cursor(message: ChatMessage) -> str:
+    return base64.urlsafe_b64encode(f"{message.timestamp.isoformat()}|{message.id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _cache_key(document: PDFDocument) -> str:
+    """Identify a document by content so identical uploads share cached responses"""
+    return document.content_hash or f"document-{document.id}"
+
+async def _track_message(db: AsyncSession, message: ChatMessage):
+    """Bump the session counter for a message added in the same transaction"""
+    await _track_messages(db, message.document_id, message.session_id, 1, message.timestamp)
+
+async def _track_messages(db: AsyncSession, document_id: int, session_id: str, count: int, last_activity: datetime):
+    """Bump the session counter for messages added in the same transaction"""
+    # One upsert, so two first messages of a new session cannot both try to insert its row
+    dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+    statement = dialect.insert(ChatSession).values(
+        document_id=document_id,
+        session_id=session_id,
+        message_count=count,
+        last_activity=last_activity
+    )
+    table, excluded = ChatSession.__table__, statement.excluded
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.document_id, table.c.session_id],
+        set_={
+            "message_count": table.c.message_count + excluded.message_count,
+            # Imported history may be older than the session's latest message
+            "last_activity": case((table.c.last_activity > excluded.last_activity, table.c.last_activity), else_=excluded.last_activity)
+        }
+    ))
+
+class PreparedQuestion:
+    """Everything needed to answer a question, gathered before the model is called"""
+    
+    def __init__(self, request: ChatRequest, session_id: str, history: List[Dict], cache_key: str):
+        self.request = request
+        self.session_id = session_id
+        self.history = history
+        self.cache_key = cache_key
+        self.query_embedding: Optional[List[float]] = None
+        self.cached_answer: Optional[str] = None
+        self.context: Optional[str] = None
+    
+    @property
+    def cacheable(self) -> bool:
+        return self.query_embedding is not None and not self.history
+
+async def _prepare_question(db: AsyncSession, request: ChatRequest) -> PreparedQuestion:
+    """Load the document and history, check the response cache and retrieve context on a miss"""
+    # Get the document
+    document = await db.scalar(
+        select(PDFDocument).options(undefer(PDFDocument.extracted_text)).where(PDFDocument.id == request.document_id)
+    )
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    if not document or not document.extracted_text:
+        raise HTTPException(status_code=422, detail="No text content available for this document")
+    
+    # Generate session ID if not provided
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    # Get recent chat history for context
+    chat_history = (await db.scalars(
+        select(ChatMessage).where(
+            ChatMessage.document_id == request.document_id,
+            ChatMessage.session_id == session_id
+        ).order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(5)
+    )).all()
+    
+    # Convert to list of dicts for the AI service
+    history_dicts = [
+        {
+            "user_message": msg.user_message,
+            "ai_response": msg.ai_response
+        }
+        for msg in reversed(chat_history)  # Reverse to get chronological order
+    ]
+    
+    prepared = PreparedQuestion(request, session_id, history_dicts, _cache_key(document))
+    
+    # Opening questions are answered the same way for everyone, so near-identical ones share a cached answer;
+    # follow-ups depend on the conversation and always go to the model
+    if not history_dicts and response_cache.enabled:
+        try:
+            prepared.query_embedding = await retrieval_service.embed_query(request.message)
+            prepared.cached_answer = await response_cache.find_answer(prepared.cache_key, prepared.query_embedding)
+        except Exception as e:
+            logger.warning(f"Skipping response cache lookup: {str(e)}")
+    
+    if prepared.cached_answer is None:
+        # Get AI response from the chunks most relevant to the question
+        prepared.context = await retrieval_service.retrieve_context(document, request.message, db, query=prepared.query_embedding)
+    
+    return prepared
+
+async def _remember_answer(prepared: PreparedQuestion, answer: Optional[str]):
+    """Cache a generated answer for similar opening questions; the lookup is in _prepare_question"""
+    if answer and prepared.cacheable:
+        await response_cache.store_answer(prepared.cache_key, prepared.request.message, prepared.query_embedding, answer)
+
+async def _save_message(db: AsyncSession, prepared: PreparedQuestion, ai_response: str) -> ChatMessage:
+    chat_message = ChatMessage(
+        document_id=prepared.request.document_id,
+        session_id=prepared.session_id,
+        user_message=prepared.request.message,
+        ai_response=ai_response,
+        timestamp=datetime.utcnow()
+    )
+    
+    db.add(chat_message)
+    await _track_message(db, chat_message)
+    await db.commit()
+    return chat_message
+
+async def _stream_answer(prepared: PreparedQuestion) -> AsyncIterator[str]:
+    """Yield the answer as it is generated, then persist the complete message"""
+    if prepared.cached_answer is not None:
+        yield prepared.cached_answer
+        answer = prepared.cached_answer
+    else:
+        parts = []
+        async with aclosing(gemini_service.stream_answer(
+            question=prepared.request.message,
+            context=prepared.context,
+            chat_history=prepared.history
+        )) as deltas:
+            async for delta in deltas:
+                parts.append(delta)
+                yield delta
+        answer = "".join(parts)
+        await _remember_answer(prepared, answer)
+    
+    # Only complete answers are stored; a cancelled stream never gets here
+    async with SessionLocal() as db:
+        await _save_message(db, prepared, answer)
+
 @router.post("/ask", response_model=ChatResponse)
 async def ask_question(
     request: ChatRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Ask a question about a PDF document"""
     try:
-        # Get the document
-        document = db.query(PDFDocument).filter(PDFDocument.id == request.document_id).first()
-        if not document:
-            raise HTTPException(status_code=404, detail="Document not found")
-        
-        if not document or not document.extracted_text:
-            raise HTTPException(status_code=422, detail="No text content available for this document")
+        prepared = await _prepare_question(db, request)
         
-        # Generate session ID if not provided
-        session_id = request.session_id or str(uuid.uuid4())
-        
-        # Get recent chat history for context
-        chat_history = db.query(ChatMessage).filter(
-            ChatMessage.document_id == request.document_id,
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.timestamp.desc()).limit(5).all()
-        
-        # Convert to list of dicts for the AI service
-        history_dicts = [
-            {
-                "user_message": msg.user_message,
-                "ai_response": msg.ai_response
-            }
-            for msg in reversed(chat_history)  # Reverse to get chronological order
-        ]
-        
-        # Get AI response
-        truncated_content = pdf_processor.truncate_text_for_ai(str(document.extracted_text))
-        ai_response = await gemini_service.answer_question(
-            question=request.message,
-            context=truncated_content,
-            chat_history=history_dicts
-        )
+        ai_response = prepared.cached_answer
+        if ai_response is None:
+            ai_response = await gemini_service.answer_question(
+                question=request.message,
+                context=prepared.context,
+                chat_history=prepared.history
+            )
+            await _remember_answer(prepared, ai_response)
+        if ai_response is None:
+            ai_response = ANSWER_FALLBACK
         
         # Save chat message
-        chat_message = ChatMessage(
-            document_id=request.document_id,
-            session_id=session_id,
-            user_message=request.message,
-            ai_response=ai_response
-        )
-        
-        db.add(chat_message)
-        db.commit()
-        db.refresh(chat_message)
+        chat_message = await _save_message(db, prepared, ai_response)
         
-        logger.info(f"Answered question for document {request.document_id}, session {session_id}")
+        logger.info(f"Answered question for document {request.document_id}, session {prepared.session_id}")
         
         return ChatResponse(
             success=True,
             response=ai_response,
-            session_id=session_id,
+            session_id=prepared.session_id,
             document_id=request.document_id,
             timestamp=chat_message.timestamp or datetime.utcnow()
         )
@@ -84,32 +213,191 @@ async def ask_question(
         logger.error(f"Error processing question: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process question: {str(e)}")
 
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/ask/stream")
+async def ask_question_stream(
+    request: ChatRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """Ask a question and receive the answer as Server-Sent Events (start, token..., done)"""
+    started = time.perf_counter()
+    try:
+        prepared = await _prepare_question(db, request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing question: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to process question: {str(e)}")
+    
+    async def events():
+        first_token = None
+        yield _sse("start", {"session_id": prepared.session_id, "document_id": request.document_id})
+        try:
+            async with aclosing(_stream_answer(prepared)) as deltas:
+                async for delta in deltas:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    yield _sse("token", {"delta": delta})
+                    if await http_request.is_disconnected():
+                        # Closing the generators closes the Gemini stream, which stops generation upstream
+                        logger.info(f"Client disconnected, stopped answer for document {request.document_id}")
+                        return
+            
+            total = time.perf_counter() - started
+            logger.info(f"Streamed answer for document {request.document_id}: first token {(first_token or total) * 1000:.0f}ms, total {total * 1000:.0f}ms")
+            yield _sse("done", {"session_id": prepared.session_id, "time_to_first_token_ms": round((first_token or total) * 1000)})
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield _sse("error", {"detail": f"Failed to process question: {str(e)}"})
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _answer_over_websocket(websocket: WebSocket, request: ChatRequest):
+    started = time.perf_counter()
+    try:
+        async with SessionLocal() as db:
+            prepared = await _prepare_question(db, request)
+        
+        first_token = None
+        await websocket.send_json({"type": "start", "session_id": prepared.session_id, "document_id": request.document_id})
+        async with aclosing(_stream_answer(prepared)) as deltas:
+            async for delta in deltas:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                await websocket.send_json({"type": "token", "delta": delta})
+        
+        total = time.perf_counter() - started
+        logger.info(f"Streamed answer for document {request.document_id}: first token {(first_token or total) * 1000:.0f}ms, total {total * 1000:.0f}ms")
+        await websocket.send_json({"type": "done", "session_id": prepared.session_id, "time_to_first_token_ms": round((first_token or total) * 1000)})
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        logger.error(f"Error streaming answer: {str(e)}")
+        await websocket.send_json({"type": "error", "status_code": 500, "detail": f"Failed to process question: {str(e)}"})
+
+@router.websocket("/ws")
+async def ask_question_websocket(websocket: WebSocket):
+    """Ask questions over a WebSocket; any frame sent while an answer streams cancels it"""
+    await websocket.accept()
+    while True:
+        try:
+            payload = await websocket.receive_json()
+        except WebSocketDisconnect:
+            return
+        
+        try:
+            request = ChatRequest(**payload)
+        except (TypeError, ValidationError) as e:
+            await websocket.send_json({"type": "error", "status_code": 422, "detail": str(e)})
+            continue
+        
+        answer = asyncio.create_task(_answer_over_websocket(websocket, request))
+        incoming = asyncio.create_task(websocket.receive())
+        await asyncio.wait({answer, incoming}, return_when=asyncio.FIRST_COMPLETED)
+        
+        if not incoming.done():
+            incoming.cancel()
+            await asyncio.gather(answer, incoming, return_exceptions=True)
+            continue
+        
+        # The client disconnected or asked to cancel mid-answer: stop generating
+        answer.cancel()
+        await asyncio.gather(answer, return_exceptions=True)
+        if incoming.result()["type"] == "websocket.disconnect":
+            logger.info(f"Client disconnected, stopped answer for document {request.document_id}")
+            return
+        await websocket.send_json({"type": "cancelled", "document_id": request.document_id})
+
+@router.post("/import", response_model=ChatImportResponse)
+async def import_chat_messages(
+    request: ChatImportRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Import a batch of question/answer pairs into a chat session"""
+    try:
+        document_exists = await db.scalar(select(PDFDocument.id).where(PDFDocument.id == request.document_id))
+        if not document_exists:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        session_id = request.session_id or str(uuid.uuid4())
+        now = datetime.utcnow()
+        rows = []
+        for message in request.messages:
+            timestamp = message.timestamp or now
+            if timestamp.tzinfo is not None:
+                # Stored naive in UTC, like every other chat timestamp
+                timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+            rows.append({
+                "document_id": request.document_id,
+                "session_id": session_id,
+                "user_message": message.user_message,
+                "ai_response": message.ai_response,
+                "timestamp": timestamp
+            })
+        
+        inserted = await bulk_insert(db, ChatMessage, rows, returning=(ChatMessage.id,))
+        await _track_messages(db, request.document_id, session_id, len(rows), max(row["timestamp"] for row in rows))
+        await db.commit()
+        
+        logger.info(f"Imported {len(rows)} messages into document {request.document_id}, session {session_id}")
+        
+        return ChatImportResponse(
+            success=True,
+            session_id=session_id,
+            imported=len(rows),
+            message_ids=[row.id for row in inserted]
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error importing chat messages: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to import chat messages: {str(e)}")
+
 @router.get("/history/{document_id}/{session_id}", response_model=ChatHistoryResponse)
 async def get_chat_history(
     document_id: int,
     session_id: str,
+    cursor: Optional[str] = None,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get chat history for a specific document and session"""
+    """Get chat history for a specific document and session
+    
+    Pass the returned next_cursor to fetch the following page; skip is kept for older clients.
+    """
     
     # Verify document exists
-    document = db.query(PDFDocument).filter(PDFDocument.id == document_id).first()
+    document = await db.scalar(select(PDFDocument.id).where(PDFDocument.id == document_id))
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Get chat messages
-    messages = db.query(ChatMessage).filter(
+    # Get chat messages, seeking past the cursor instead of scanning skipped rows
+    query = select(ChatMessage).where(
         ChatMessage.document_id == document_id,
         ChatMessage.session_id == session_id
-    ).order_by(ChatMessage.timestamp.asc()).offset(skip).limit(limit).all()
+    )
+    if cursor:
+        query = query.where(tuple_(ChatMessage.timestamp, ChatMessage.id) > tuple_(*_decode_cursor(cursor)))
+    elif skip:
+        query = query.offset(skip)
     
-    # Count total messages
-    total_count = db.query(ChatMessage).filter(
-        ChatMessage.document_id == document_id,
-        ChatMessage.session_id == session_id
-    ).count()
+    messages = (await db.scalars(query.order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc()).limit(limit + 1))).all()
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    
+    # Total comes from the maintained session counter
+    total_count = await db.scalar(
+        select(ChatSession.message_count).where(
+            ChatSession.document_id == document_id,
+            ChatSession.session_id == session_id
+        )
+    )
     
     # Format messages
     formatted_messages = [
@@ -124,30 +412,27 @@ async def get_chat_history(
     
     return ChatHistoryResponse(
         messages=formatted_messages,
-        total_count=total_count
+        total_count=total_count or 0,
+        next_cursor=_encode_cursor(messages[-1]) if has_more else None
     )
 
 @router.get("/sessions/{document_id}")
 async def get_chat_sessions(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all chat sessions for a document"""
     
     # Verify document exists
-    document = db.query(PDFDocument).filter(PDFDocument.id == document_id).first()
+    document = await db.scalar(select(PDFDocument.id).where(PDFDocument.id == document_id))
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Get distinct session IDs with message counts
-    from sqlalchemy import func
-    sessions = db.query(
-        ChatMessage.session_id,
-        func.count(ChatMessage.id).label('message_count'),
-        func.max(ChatMessage.timestamp).label('last_activity')
-    ).filter(
-        ChatMessage.document_id == document_id
-    ).group_by(ChatMessage.session_id).all()
+    sessions = (await db.scalars(
+        select(ChatSession).where(
+            ChatSession.document_id == document_id
+        ).order_by(ChatSession.last_activity.desc())
+    )).all()
     
     return {
         "document_id": document_id,
@@ -164,27 +449,37 @@ async def get_chat_sessions(
 @router.post("/manipulate", response_model=ContentResponse)
 async def manipulate_content(
     request: ContentRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Manipulate document content (summarize, explain, restructure)"""
     try:
         # Get the document
-        document = db.query(PDFDocument).filter(PDFDocument.id == request.document_id).first()
+        document = await db.scalar(
+            select(PDFDocument).options(undefer(PDFDocument.extracted_text)).where(PDFDocument.id == request.document_id)
+        )
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
         if not document or not document.extracted_text:
             raise HTTPException(status_code=422, detail="No text content available for this document")
         
-        # Truncate content for AI processing
-        truncated_content = pdf_processor.truncate_text_for_ai(str(document.extracted_text))
+        if derivative_service.is_stored(request.operation, request.custom_prompt):
+            # Fixed views are read from the derivatives table, generated once per document text
+            result = await derivative_service.get_or_generate(db, document, request.operation)
+        else:
+            # Truncate content for AI processing
+            truncated_content = pdf_processor.truncate_text_for_ai(str(document.extracted_text))
+            
+            # Process content
+            result = await gemini_service.manipulate_content(
+                text=truncated_content,
+                operation=request.operation,
+                custom_prompt=request.custom_prompt,
+                cache_key=_cache_key(document)
+            )
         
-        # Process content
-        result = await gemini_service.manipulate_content(
-            text=truncated_content,
-            operation=request.operation,
-            custom_prompt=request.custom_prompt
-        )
+        if result is None:
+            result = f"Failed to {request.operation} the content"
         
         logger.info(f"Content manipulation '{request.operation}' completed for document {request.document_id}")
         
@@ -200,26 +495,41 @@ async def manipulate_content(
         logger.error(f"Error in content manipulation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process content: {str(e)}")
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Hit rates of the response cache in this process"""
+    return response_cache.stats()
+
 @router.delete("/sessions/{document_id}/{session_id}")
 async def delete_chat_session(
     document_id: int,
     session_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete all messages in a chat session"""
     
     # Verify document exists
-    document = db.query(PDFDocument).filter(PDFDocument.id == document_id).first()
+    document = await db.scalar(select(PDFDocument.id).where(PDFDocument.id == document_id))
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Delete messages
-    deleted_count = db.query(ChatMessage).filter(
-        ChatMessage.document_id == document_id,
-        ChatMessage.session_id == session_id
-    ).delete()
+    result = await db.execute(
+        delete(ChatMessage).where(
+            ChatMessage.document_id == document_id,
+            ChatMessage.session_id == session_id
+        )
+    )
+    deleted_count = result.rowcount
+    
+    await db.execute(
+        delete(ChatSession).where(
+            ChatSession.document_id == document_id,
+            ChatSession.session_id == session_id
+        )
+    )
     
-    db.commit()
+    await db.commit()
     
     return {
         "success": True,
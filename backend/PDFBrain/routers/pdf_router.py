@@ -1,93 +1,181 @@
+import asyncio
 import logging
+import os
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 from typing import List
 
 from database import get_db
-from models import PDFDocument
-from schemas import PDFUploadResponse, PDFDocumentResponse, SuccessResponse
+from models import PDFDocument, StoredFile, DocumentChunk, DocumentDerivative, QuestionBankItem, ChatMessage, ChatSession, Quiz
+from schemas import PDFUploadResponse, PDFDocumentResponse, IngestionJobResponse, DocumentStatus, SuccessResponse
 from services.pdf_processor import pdf_processor
-from services.gemini_service import gemini_service
+from services.ingestion_service import ingestion_service
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# The columns PDFDocumentResponse needs; metadata endpoints select only these
+DOCUMENT_RESPONSE_COLUMNS = (
+    PDFDocument.id,
+    PDFDocument.filename,
+    PDFDocument.original_filename,
+    PDFDocument.file_size,
+    PDFDocument.page_count,
+    PDFDocument.upload_time,
+    PDFDocument.summary,
+    PDFDocument.status
+)
+
+async def _acquire_file(db: AsyncSession, content_hash: str, file_path: str):
+    """Count a new document against the stored file for its content"""
+    dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+    statement = dialect.insert(StoredFile).values(content_hash=content_hash, file_path=file_path, document_count=1)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[StoredFile.content_hash],
+        set_={"document_count": StoredFile.document_count + 1}
+    ))
+
+async def _release_file(db: AsyncSession, document: PDFDocument):
+    """Drop a deleted document's claim on its stored file, removing the file with the last claim"""
+    if document.content_hash is None:
+        # Stored before content addressing, under a name of its own
+        pdf_processor.cleanup_file(str(document.file_path))
+        return
+    
+    remaining = await db.scalar(
+        update(StoredFile).where(StoredFile.content_hash == document.content_hash).values(
+            document_count=StoredFile.document_count - 1
+        ).returning(StoredFile.document_count)
+    )
+    if not remaining:
+        await db.execute(delete(StoredFile).where(StoredFile.content_hash == document.content_hash))
+        # Removed before the commit: an upload of the same content waits on the stored_files row,
+        # then puts the file back once this transaction is done
+        pdf_processor.cleanup_file(str(document.file_path))
+
+async def _delete_document(db: AsyncSession, document: PDFDocument):
+    """Delete a document, its generated rows and its claim on the stored file; the caller commits"""
+    # Set-based statements rather than loading every related row for the ORM cascade
+    await db.execute(update(Quiz).where(Quiz.document_id == document.id).values(document_id=None))
+    for model in (DocumentChunk, DocumentDerivative, QuestionBankItem, ChatMessage, ChatSession):
+        await db.execute(delete(model).where(model.document_id == document.id))
+    await db.execute(delete(PDFDocument).where(PDFDocument.id == document.id))
+    await _release_file(db, document)
+
 @router.post("/upload", response_model=PDFUploadResponse)
 async def upload_pdf(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Upload and process a PDF file"""
+    """Upload a PDF file and queue it for processing"""
     try:
-        # Save uploaded file
-        filename, file_path = await pdf_processor.save_uploaded_file(file)
+        # Reject early rather than accepting uploads we cannot process soon
+        if ingestion_service.is_full():
+            raise HTTPException(status_code=503, detail="Too many documents are being processed, please retry shortly")
         
-        # Extract text from PDF
-        extracted_text, page_count = pdf_processor.extract_text_from_pdf(file_path)
+        # Save uploaded file
+        temp_path, filename, content_hash = await pdf_processor.save_uploaded_file(file)
+        try:
+            # Create database record; text, summary and index are filled in by the ingestion workers
+            document = PDFDocument(
+                filename=filename,
+                original_filename=file.filename,
+                file_path=pdf_processor.stored_path(filename),
+                file_size=os.path.getsize(temp_path),
+                content_hash=content_hash,
+                status=DocumentStatus.PENDING.value
+            )
+            db.add(document)
+            await db.flush()
+            await _acquire_file(db, content_hash, document.file_path)
+            
+            # Every upload gets its own document, so deleting one never removes another's;
+            # an identical earlier upload's text, summary and index are copied instead of regenerated
+            reused = await ingestion_service.reuse_processed(db, document)
+            await db.commit()
+            
+            # Moved into place only once the claim is committed, so a concurrent delete of the
+            # last other document with this content cannot remove it afterwards
+            pdf_processor.store_file(temp_path, filename)
+        finally:
+            pdf_processor.cleanup_file(temp_path)
         
-        # Validate extracted text
-        if not pdf_processor.validate_extracted_text(extracted_text):
-            pdf_processor.cleanup_file(file_path)
-            raise HTTPException(
-                status_code=422,
-                detail="Extracted text appears to be invalid or insufficient for processing"
+        if reused:
+            logger.info(f"Duplicate upload of {file.filename} stored as document {document.id}")
+            return PDFUploadResponse(
+                success=True,
+                message="PDF already processed, reusing its content",
+                document=PDFDocumentResponse.from_orm(document)
             )
         
-        # Generate summary
         try:
-            truncated_text = pdf_processor.truncate_text_for_ai(extracted_text)
-            summary = await gemini_service.generate_summary(truncated_text)
-        except Exception as e:
-            logger.warning(f"Failed to generate summary: {str(e)}")
-            summary = None
-        
-        # Create database record
-        document = PDFDocument(
-            filename=filename,
-            original_filename=file.filename,
-            file_path=file_path,
-            extracted_text=extracted_text,
-            summary=summary,
-            file_size=len(extracted_text.encode('utf-8')),
-            page_count=page_count
-        )
-        
-        db.add(document)
-        db.commit()
-        db.refresh(document)
+            ingestion_service.submit(document.id)
+        except asyncio.QueueFull:
+            await _delete_document(db, document)
+            await db.commit()
+            raise HTTPException(status_code=503, detail="Too many documents are being processed, please retry shortly")
         
-        logger.info(f"Successfully processed PDF: {file.filename} (ID: {document.id})")
+        logger.info(f"Queued PDF for processing: {file.filename} (ID: {document.id})")
         
         return PDFUploadResponse(
             success=True,
-            message="PDF uploaded and processed successfully",
+            message="PDF uploaded, processing started",
             document=PDFDocumentResponse.from_orm(document)
         )
         
     except HTTPException:
         raise
     except Exception as e:
+        await db.rollback()
         logger.error(f"Error processing PDF upload: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
 
+@router.get("/jobs/{document_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(
+    document_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the processing status of an uploaded document"""
+    document = (await db.execute(
+        select(
+            PDFDocument.id,
+            PDFDocument.status,
+            PDFDocument.page_count,
+            PDFDocument.error_message
+        ).where(PDFDocument.id == document_id)
+    )).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return IngestionJobResponse(
+        document_id=document.id,
+        # Documents uploaded before background ingestion have no status and were processed inline
+        status=document.status or DocumentStatus.READY,
+        page_count=document.page_count,
+        error=document.error_message
+    )
+
 @router.get("/documents", response_model=List[PDFDocumentResponse])
 async def get_documents(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """Get list of uploaded PDF documents"""
-    documents = db.query(PDFDocument).offset(skip).limit(limit).all()
+    documents = (await db.execute(select(*DOCUMENT_RESPONSE_COLUMNS).offset(skip).limit(limit))).all()
     return [PDFDocumentResponse.from_orm(doc) for doc in documents]
 
 @router.get("/documents/{document_id}", response_model=PDFDocumentResponse)
 async def get_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get specific PDF document details"""
-    document = db.query(PDFDocument).filter(PDFDocument.id == document_id).first()
+    document = (await db.execute(select(*DOCUMENT_RESPONSE_COLUMNS).where(PDFDocument.id == document_id))).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
@@ -96,19 +184,15 @@ async def get_document(
 @router.delete("/documents/{document_id}", response_model=SuccessResponse)
 async def delete_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a PDF document and its file"""
-    document = db.query(PDFDocument).filter(PDFDocument.id == document_id).first()
+    document = await db.scalar(select(PDFDocument).where(PDFDocument.id == document_id))
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Clean up file
-    pdf_processor.cleanup_file(str(document.file_path))
-    
-    # Delete from database
-    db.delete(document)
-    db.commit()
+    await _delete_document(db, document)
+    await db.commit()
     
     return SuccessResponse(
         message=f"Document '{document.original_filename}' deleted successfully"
@@ -117,10 +201,12 @@ async def delete_document(
 @router.get("/documents/{document_id}/content")
 async def get_document_content(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get the extracted text content of a document"""
-    document = db.query(PDFDocument).filter(PDFDocument.id == document_id).first()
+    document = await db.scalar(
+        select(PDFDocument).options(undefer(PDFDocument.extracted_text)).where(PDFDocument.id == document_id)
+    )
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
@@ -1,6 +1,7 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from database import get_db
@@ -10,8 +11,13 @@ from schemas import (
     QuizGenerationResponse, 
     QuizResponse, 
     QuizSubmissionRequest,
-    QuizSubmissionResponse
+    QuizSubmissionResponse,
+    QuizBatchSubmissionRequest,
+    QuizBatchSubmissionResponse,
+    QuizStatsResponse,
+    UserProgressResponse
 )
+from services.analytics_service import analytics_service
 from services.quiz_generator import quiz_generator
 
 logger = logging.getLogger(__name__)
@@ -21,7 +27,7 @@ router = APIRouter()
 @router.post("/generate", response_model=QuizGenerationResponse)
 async def generate_quiz(
     request: QuizGenerationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Generate a quiz from PDF content"""
     try:
@@ -29,7 +35,7 @@ async def generate_quiz(
         if errors:
             raise HTTPException(status_code=422, detail=f"Validation errors: {', '.join(errors)}")
         
-        document = db.query(PDFDocument).filter(PDFDocument.id == request.document_id).first()
+        document = await db.scalar(select(PDFDocument.id).where(PDFDocument.id == request.document_id))
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
@@ -37,7 +43,11 @@ async def generate_quiz(
         
         return QuizGenerationResponse(
             success=True,
-            message=f"Quiz generated successfully with {quiz.total_questions} questions",
+            message=(
+                f"Quiz generated successfully with {quiz.total_questions} questions"
+                if quiz.total_questions >= request.num_questions
+                else f"Quiz generated with {quiz.total_questions} of {request.num_questions} requested questions"
+            ),
             quiz=QuizResponse.from_orm(quiz)
         )
         
@@ -48,11 +58,11 @@ async def generate_quiz(
 @router.get("/quiz/{quiz_id}", response_model=QuizResponse)
 async def get_quiz(
     quiz_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific quiz with all questions and answers"""
     try:
-        quiz = quiz_generator.get_quiz_by_id(quiz_id, db)
+        quiz = await quiz_generator.get_quiz_by_id(quiz_id, db)
         return QuizResponse.from_orm(quiz)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -61,36 +71,68 @@ async def get_quiz(
 async def submit_quiz(
     quiz_id: int,
     submission: QuizSubmissionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Submit quiz answers and get results"""
     try:
-        results = quiz_generator.check_answers(quiz_id, submission, db)
+        results = await quiz_generator.check_answers(quiz_id, submission, db)
         return QuizSubmissionResponse(**results)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@router.post("/submit/batch", response_model=QuizBatchSubmissionResponse)
+async def submit_quizzes_batch(
+    request: QuizBatchSubmissionRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Grade many submissions, possibly for different quizzes, in one call"""
+    try:
+        return await quiz_generator.check_answers_batch(request.submissions, db)
+    except Exception as e:
+        logger.error(f"Error grading quiz submissions: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to grade submissions: {str(e)}")
+
+@router.get("/quiz/{quiz_id}/stats", response_model=QuizStatsResponse)
+async def get_quiz_stats(
+    quiz_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Score distribution and per-question correctness for a quiz"""
+    try:
+        return await analytics_service.get_quiz_stats(db, quiz_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/progress/{user_id}", response_model=UserProgressResponse)
+async def get_user_progress(
+    user_id: str,
+    recent: int = 10,
+    db: AsyncSession = Depends(get_db)
+):
+    """A user's quiz progress: totals, per-quiz bests and recent attempts"""
+    return await analytics_service.get_user_progress(db, user_id, max(0, min(recent, 100)))
+
 @router.get("/document/{document_id}/quizzes", response_model=List[QuizResponse])
 async def get_document_quizzes(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all quizzes for a specific document"""
-    document = db.query(PDFDocument).filter(PDFDocument.id == document_id).first()
+    document = await db.scalar(select(PDFDocument.id).where(PDFDocument.id == document_id))
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    quizzes = quiz_generator.get_quizzes_by_document(document_id, db)
+    quizzes = await quiz_generator.get_quizzes_by_document(document_id, db)
     return [QuizResponse.from_orm(quiz) for quiz in quizzes]
 
 @router.delete("/quiz/{quiz_id}")
 async def delete_quiz(
     quiz_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a quiz"""
     try:
-        quiz_generator.delete_quiz(quiz_id, db)
+        await quiz_generator.delete_quiz(quiz_id, db)
         return {"success": True, "message": f"Quiz {quiz_id} deleted"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -99,10 +141,20 @@ async def delete_quiz(
 async def list_all_quizzes(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all quizzes"""
-    quizzes = db.query(Quiz).offset(skip).limit(limit).all()
+    # Join the filename in the same query rather than lazy-loading each quiz's document
+    quizzes = (await db.execute(
+        select(
+            Quiz.id,
+            Quiz.title,
+            Quiz.document_id,
+            Quiz.total_questions,
+            Quiz.created_at,
+            PDFDocument.original_filename
+        ).outerjoin(PDFDocument, Quiz.document_id == PDFDocument.id).offset(skip).limit(limit)
+    )).all()
     return {
         "quizzes": [
             {
@@ -111,7 +163,7 @@ async def list_all_quizzes(
                 "document_id": quiz.document_id,
                 "total_questions": quiz.total_questions,
                 "created_at": quiz.created_at.isoformat(),
-                "document_filename": quiz.document.original_filename if quiz.document else "Unknown"
+                "document_filename": quiz.original_filename or "Unknown"
             }
             for quiz in quizzes
         ],
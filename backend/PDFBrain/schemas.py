@@ -8,6 +8,12 @@ class QuestionType(str, Enum):
     TRUE_FALSE = "true_false"
     FILL_BLANK = "fill_blank"
 
+class DocumentStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    READY = "ready"
+    FAILED = "failed"
+
 # PDF Document schemas
 class PDFDocumentResponse(BaseModel):
     id: int
@@ -17,10 +23,17 @@ class PDFDocumentResponse(BaseModel):
     page_count: Optional[int]
     upload_time: datetime
     summary: Optional[str]
+    status: Optional[DocumentStatus] = None
     
     class Config:
         from_attributes = True
 
+class IngestionJobResponse(BaseModel):
+    document_id: int
+    status: DocumentStatus
+    page_count: Optional[int] = None
+    error: Optional[str] = None
+
 class PDFUploadResponse(BaseModel):
     success: bool
     message: str
@@ -42,6 +55,23 @@ class ChatResponse(BaseModel):
 class ChatHistoryResponse(BaseModel):
     messages: List[dict]
     total_count: int
+    next_cursor: Optional[str] = None
+
+class ChatImportMessage(BaseModel):
+    user_message: str
+    ai_response: str
+    timestamp: Optional[datetime] = None
+
+class ChatImportRequest(BaseModel):
+    document_id: int
+    session_id: Optional[str] = None
+    messages: List[ChatImportMessage] = Field(..., min_length=1, max_length=1000)
+
+class ChatImportResponse(BaseModel):
+    success: bool
+    session_id: str
+    imported: int
+    message_ids: List[int]
 
 # Content manipulation schemas
 class ContentRequest(BaseModel):
@@ -98,6 +128,7 @@ class UserAnswer(BaseModel):
 
 class QuizSubmissionRequest(BaseModel):
     answers: List[UserAnswer]
+    user_id: Optional[str] = None
 
 class QuestionResult(BaseModel):
     question_id: int
@@ -109,11 +140,81 @@ class QuestionResult(BaseModel):
 
 class QuizSubmissionResponse(BaseModel):
     quiz_id: int
+    attempt_id: Optional[int] = None
     score: float
     correct_answers: int
     total_questions: int
     results: List[QuestionResult]
 
+class QuizBatchSubmission(BaseModel):
+    quiz_id: int
+    answers: List[UserAnswer]
+    user_id: Optional[str] = None
+
+class QuizBatchSubmissionRequest(BaseModel):
+    submissions: List[QuizBatchSubmission] = Field(..., min_length=1, max_length=1000)
+
+class QuizBatchSubmissionResult(QuizSubmissionResponse):
+    index: int
+
+class QuizBatchSubmissionError(BaseModel):
+    index: int
+    quiz_id: int
+    error: str
+
+class QuizBatchSubmissionResponse(BaseModel):
+    results: List[QuizBatchSubmissionResult]
+    errors: List[QuizBatchSubmissionError]
+
+# Analytics schemas
+class ScoreBucket(BaseModel):
+    range: str
+    count: int
+
+class QuestionStat(BaseModel):
+    question_id: int
+    question_text: str
+    attempt_count: int
+    correct_count: int
+    correct_rate: Optional[float] = None
+
+class QuizStatsResponse(BaseModel):
+    quiz_id: int
+    title: Optional[str] = None
+    attempt_count: int
+    average_score: Optional[float] = None
+    best_score: Optional[float] = None
+    last_attempt_at: Optional[datetime] = None
+    score_distribution: List[ScoreBucket]
+    questions: List[QuestionStat]
+
+class UserQuizProgressResponse(BaseModel):
+    quiz_id: int
+    title: Optional[str] = None
+    attempt_count: int
+    best_score: float
+    last_score: float
+    last_attempt_at: Optional[datetime] = None
+
+class QuizAttemptSummary(BaseModel):
+    id: int
+    quiz_id: int
+    score: float
+    correct_answers: int
+    total_questions: int
+    created_at: datetime
+
+class UserProgressResponse(BaseModel):
+    user_id: str
+    attempt_count: int
+    average_score: Optional[float] = None
+    best_score: Optional[float] = None
+    questions_answered: int
+    questions_correct: int
+    last_attempt_at: Optional[datetime] = None
+    quizzes: List[UserQuizProgressResponse]
+    recent_attempts: List[QuizAttemptSummary]
+
 # General response schemas
 class ErrorResponse(BaseModel):
     success: bool = False
@@ -0,0 +1,213 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import case, delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import bulk_insert
+from models import (
+    Quiz, QuizQuestion, QuizAttempt, QuizStat, QuizScoreBucket, QuizQuestionStat, UserProgress, UserQuizProgress
+)
+
+SCORE_BUCKETS = 10
+
+
+class AnalyticsService:
+    """Stores quiz attempts and keeps per-question, per-quiz and per-user aggregates up to date"""
+
+    @staticmethod
+    def score_bucket(score: float) -> int:
+        return min(int(score // (100 / SCORE_BUCKETS)), SCORE_BUCKETS - 1)
+
+    async def _upsert(
+        self,
+        db: AsyncSession,
+        model,
+        rows: List[Dict[str, Any]],
+        increments: Tuple[str, ...] = (),
+        latest: Tuple[str, ...] = (),
+        maxima: Tuple[str, ...] = ()
+    ):
+        """Insert aggregate rows, or add to / overwrite / raise the columns of existing ones, in one statement"""
+        if not rows:
+            return
+        dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+        statement = dialect.insert(model).values(rows)
+        table, excluded = model.__table__, statement.excluded
+        set_ = {column: table.c[column] + excluded[column] for column in increments}
+        set_.update({column: excluded[column] for column in latest})
+        set_.update({
+            column: case((table.c[column] > excluded[column], table.c[column]), else_=excluded[column])
+            for column in maxima
+        })
+        await db.execute(statement.on_conflict_do_update(index_elements=list(table.primary_key.columns), set_=set_))
+
+    async def record(self, db: AsyncSession, attempts: List[Tuple[Optional[str], Dict[str, Any]]]) -> List[int]:
+        """Store graded attempts as (user id, graded result) and fold them into the aggregates; the caller commits"""
+        if not attempts:
+            return []
+        now = datetime.utcnow()
+
+        inserted = await bulk_insert(db, QuizAttempt, [
+            {
+                "quiz_id": graded["quiz_id"],
+                "user_id": user_id,
+                "score": graded["score"],
+                "correct_answers": graded["correct_answers"],
+                "total_questions": graded["total_questions"],
+                "answers": [
+                    {"question_id": result["question_id"], "answer": result["user_answer"], "is_correct": result["is_correct"]}
+                    for result in graded["results"]
+                ],
+                "created_at": now
+            }
+            for user_id, graded in attempts
+        ], returning=(QuizAttempt.id,))
+
+        # Fold the batch per key first; one row may only be upserted once per statement
+        quizzes: Dict[int, Dict[str, Any]] = {}
+        buckets: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        questions: Dict[int, Dict[str, Any]] = {}
+        users: Dict[str, Dict[str, Any]] = {}
+        user_quizzes: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for user_id, graded in attempts:
+            quiz_id, score = graded["quiz_id"], graded["score"]
+            quiz = quizzes.setdefault(quiz_id, {"quiz_id": quiz_id, "attempt_count": 0, "score_sum": 0.0, "best_score": 0.0, "last_attempt_at": now})
+            quiz["attempt_count"] += 1
+            quiz["score_sum"] += score
+            quiz["best_score"] = max(quiz["best_score"], score)
+
+            bucket = self.score_bucket(score)
+            buckets.setdefault((quiz_id, bucket), {"quiz_id": quiz_id, "bucket": bucket, "attempt_count": 0})["attempt_count"] += 1
+
+            for result in graded["results"]:
+                question = questions.setdefault(result["question_id"], {"question_id": result["question_id"], "quiz_id": quiz_id, "attempt_count": 0, "correct_count": 0})
+                question["attempt_count"] += 1
+                question["correct_count"] += result["is_correct"]
+
+            if user_id is None:
+                continue
+            user = users.setdefault(user_id, {
+                "user_id": user_id, "attempt_count": 0, "score_sum": 0.0, "best_score": 0.0,
+                "questions_answered": 0, "questions_correct": 0, "last_attempt_at": now
+            })
+            user["attempt_count"] += 1
+            user["score_sum"] += score
+            user["best_score"] = max(user["best_score"], score)
+            user["questions_answered"] += len(graded["results"])
+            user["questions_correct"] += graded["correct_answers"]
+
+            user_quiz = user_quizzes.setdefault((user_id, quiz_id), {
+                "user_id": user_id, "quiz_id": quiz_id, "attempt_count": 0, "best_score": 0.0, "last_score": 0.0, "last_attempt_at": now
+            })
+            user_quiz["attempt_count"] += 1
+            user_quiz["best_score"] = max(user_quiz["best_score"], score)
+            user_quiz["last_score"] = score
+
+        await self._upsert(db, QuizStat, list(quizzes.values()), increments=("attempt_count", "score_sum"), latest=("last_attempt_at",), maxima=("best_score",))
+        await self._upsert(db, QuizScoreBucket, list(buckets.values()), increments=("attempt_count",))
+        await self._upsert(db, QuizQuestionStat, list(questions.values()), increments=("attempt_count", "correct_count"))
+        await self._upsert(
+            db, UserProgress, list(users.values()),
+            increments=("attempt_count", "score_sum", "questions_answered", "questions_correct"),
+            latest=("last_attempt_at",),
+            maxima=("best_score",)
+        )
+        await self._upsert(
+            db, UserQuizProgress, list(user_quizzes.values()),
+            increments=("attempt_count",),
+            latest=("last_score", "last_attempt_at"),
+            maxima=("best_score",)
+        )
+        return [row.id for row in inserted]
+
+    async def get_quiz_stats(self, db: AsyncSession, quiz_id: int) -> Dict[str, Any]:
+        """Score summary, score distribution and per-question correctness for a quiz"""
+        quiz = (await db.execute(select(Quiz.id, Quiz.title).where(Quiz.id == quiz_id))).first()
+        if not quiz:
+            raise ValueError("Quiz not found")
+
+        stat = (await db.execute(select(QuizStat).where(QuizStat.quiz_id == quiz_id))).scalar_one_or_none()
+        distribution = [0] * SCORE_BUCKETS
+        for row in (await db.execute(select(QuizScoreBucket.bucket, QuizScoreBucket.attempt_count).where(QuizScoreBucket.quiz_id == quiz_id))).all():
+            distribution[row.bucket] = row.attempt_count
+
+        questions = (await db.execute(
+            select(QuizQuestion.id, QuizQuestion.question_text, QuizQuestionStat.attempt_count, QuizQuestionStat.correct_count)
+            .outerjoin(QuizQuestionStat, QuizQuestionStat.question_id == QuizQuestion.id)
+            .where(QuizQuestion.quiz_id == quiz_id)
+            .order_by(QuizQuestion.order_index, QuizQuestion.id)
+        )).all()
+
+        attempt_count = stat.attempt_count if stat else 0
+        width = 100 // SCORE_BUCKETS
+        return {
+            "quiz_id": quiz_id,
+            "title": quiz.title,
+            "attempt_count": attempt_count,
+            "average_score": round(stat.score_sum / attempt_count, 2) if attempt_count else None,
+            "best_score": stat.best_score if stat else None,
+            "last_attempt_at": stat.last_attempt_at if stat else None,
+            "score_distribution": [
+                {"range": f"{bucket * width}-{(bucket + 1) * width}", "count": count}
+                for bucket, count in enumerate(distribution)
+            ],
+            "questions": [
+                {
+                    "question_id": row.id,
+                    "question_text": row.question_text,
+                    "attempt_count": row.attempt_count or 0,
+                    "correct_count": row.correct_count or 0,
+                    "correct_rate": round(row.correct_count / row.attempt_count, 4) if row.attempt_count else None
+                }
+                for row in questions
+            ]
+        }
+
+    async def get_user_progress(self, db: AsyncSession, user_id: str, recent: int = 10) -> Dict[str, Any]:
+        """Overall totals, per-quiz bests and the most recent attempts for a user"""
+        progress = (await db.execute(select(UserProgress).where(UserProgress.user_id == user_id))).scalar_one_or_none()
+        quizzes = (await db.execute(
+            select(UserQuizProgress, Quiz.title)
+            .join(Quiz, Quiz.id == UserQuizProgress.quiz_id)
+            .where(UserQuizProgress.user_id == user_id)
+            .order_by(UserQuizProgress.last_attempt_at.desc())
+        )).all()
+        attempts = (await db.execute(
+            select(QuizAttempt.id, QuizAttempt.quiz_id, QuizAttempt.score, QuizAttempt.correct_answers, QuizAttempt.total_questions, QuizAttempt.created_at)
+            .where(QuizAttempt.user_id == user_id)
+            # Attempts graded in one batch share created_at; id keeps the cutoff deterministic
+            .order_by(QuizAttempt.created_at.desc(), QuizAttempt.id.desc())
+            .limit(recent)
+        )).all()
+
+        attempt_count = progress.attempt_count if progress else 0
+        return {
+            "user_id": user_id,
+            "attempt_count": attempt_count,
+            "average_score": round(progress.score_sum / attempt_count, 2) if attempt_count else None,
+            "best_score": progress.best_score if progress else None,
+            "questions_answered": progress.questions_answered if progress else 0,
+            "questions_correct": progress.questions_correct if progress else 0,
+            "last_attempt_at": progress.last_attempt_at if progress else None,
+            "quizzes": [
+                {
+                    "quiz_id": row.UserQuizProgress.quiz_id,
+                    "title": row.title,
+                    "attempt_count": row.UserQuizProgress.attempt_count,
+                    "best_score": row.UserQuizProgress.best_score,
+                    "last_score": row.UserQuizProgress.last_score,
+                    "last_attempt_at": row.UserQuizProgress.last_attempt_at
+                }
+                for row in quizzes
+            ],
+            "recent_attempts": [dict(row._mapping) for row in attempts]
+        }
+
+    async def invalidate_quiz(self, db: AsyncSession, quiz_id: int):
+        """Drop a quiz's attempts and aggregates before the quiz is deleted; users' overall totals are kept"""
+        for model in (QuizQuestionStat, QuizScoreBucket, QuizStat, UserQuizProgress, QuizAttempt):
+            await db.execute(delete(model).where(model.quiz_id == quiz_id))
+
+# Global instance
+analytics_service = AnalyticsService()
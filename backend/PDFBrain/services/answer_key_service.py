@@ -0,0 +1,131 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models import Quiz, QuizQuestion
+from services.response_cache import MemoryBackend
+
+OPTION_PREFIX = re.compile(r"^\(?([a-d])[).:]\s+")
+TRUE_FALSE_VARIANTS = {"true": ["true", "t"], "false": ["false", "f"]}
+
+
+class AnswerKeyService:
+    """Grades submissions against a cached per-quiz answer key instead of the ORM quiz"""
+
+    def __init__(self):
+        # Its own cache: keys must not depend on RESPONSE_CACHE_BACKEND or be evicted by Gemini responses
+        self.ttl = settings.ANSWER_KEY_CACHE_TTL
+        self._cache = MemoryBackend(settings.ANSWER_KEY_CACHE_MAX_ENTRIES)
+
+    @staticmethod
+    def normalize(answer: Any) -> str:
+        return " ".join(str(answer or "").lower().split()).rstrip(".")
+
+    def accepted_answers(self, question_type: str, correct_answer: str, options: Optional[List[str]]) -> List[str]:
+        """Normalized answers counted as correct: the answer itself plus its option letter or text for MCQs"""
+        correct = self.normalize(correct_answer)
+        accepted = {correct}
+        if question_type == "true_false":
+            accepted.update(TRUE_FALSE_VARIANTS.get(correct, []))
+        elif options:
+            normalized_options = [self.normalize(option) for option in options]
+            for index, option in enumerate(normalized_options):
+                letter = "abcd"[index] if index < 4 else None
+                text = OPTION_PREFIX.sub("", option)
+                if correct in (option, text) or (len(correct) == 1 and correct == letter):
+                    accepted.update(answer for answer in (option, text, letter) if answer)
+        return sorted(accepted)
+
+    async def _load(self, db: AsyncSession, quiz_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Build answer keys from plain column rows, two queries for any number of quizzes"""
+        keys = {
+            row.id: {"total_questions": row.total_questions or 0, "questions": []}
+            for row in (await db.execute(select(Quiz.id, Quiz.total_questions).where(Quiz.id.in_(quiz_ids)))).all()
+        }
+        if not keys:
+            return keys
+        rows = await db.execute(
+            select(
+                QuizQuestion.quiz_id,
+                QuizQuestion.id,
+                QuizQuestion.question_type,
+                QuizQuestion.question_text,
+                QuizQuestion.correct_answer,
+                QuizQuestion.options,
+                QuizQuestion.explanation
+            ).where(QuizQuestion.quiz_id.in_(list(keys))).order_by(QuizQuestion.quiz_id, QuizQuestion.order_index, QuizQuestion.id)
+        )
+        for row in rows.all():
+            # [id, text, correct answer, explanation, accepted answers]
+            keys[row.quiz_id]["questions"].append([
+                row.id,
+                row.question_text,
+                row.correct_answer,
+                row.explanation,
+                self.accepted_answers(row.question_type, row.correct_answer, row.options)
+            ])
+        return keys
+
+    async def get_many(self, db: AsyncSession, quiz_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Answer keys for the given quizzes; unknown quizzes are left out"""
+        keys: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        for quiz_id in dict.fromkeys(quiz_ids):
+            key = await self._cache.get(str(quiz_id))
+            if key is None:
+                missing.append(quiz_id)
+            else:
+                keys[quiz_id] = key
+        if keys:
+            # Quizzes are only ever deleted, but possibly by another worker whose invalidate does not reach this
+            # cache; check they still exist so a submission is not recorded against a deleted quiz
+            existing = set(await db.scalars(select(Quiz.id).where(Quiz.id.in_(list(keys)))))
+            for quiz_id in set(keys) - existing:
+                await self._cache.delete(str(quiz_id))
+                del keys[quiz_id]
+        if missing:
+            loaded = await self._load(db, missing)
+            for quiz_id, key in loaded.items():
+                await self._cache.set(str(quiz_id), key, self.ttl)
+            keys.update(loaded)
+        return keys
+
+    async def get(self, db: AsyncSession, quiz_id: int) -> Dict[str, Any]:
+        key = (await self.get_many(db, [quiz_id])).get(quiz_id)
+        if key is None:
+            raise ValueError("Quiz not found")
+        return key
+
+    async def invalidate(self, quiz_id: int):
+        await self._cache.delete(str(quiz_id))
+
+    def grade(self, quiz_id: int, key: Dict[str, Any], answers: Dict[int, str]) -> Dict[str, Any]:
+        """Score one submission (question id -> answer) against an answer key"""
+        correct_count = 0
+        results = []
+        for question_id, question_text, correct_answer, explanation, accepted in key["questions"]:
+            user_answer = answers.get(question_id, "")
+            is_correct = self.normalize(user_answer) in accepted
+            correct_count += is_correct
+            results.append({
+                "question_id": question_id,
+                "question_text": question_text,
+                "user_answer": user_answer,
+                "correct_answer": correct_answer,
+                "is_correct": is_correct,
+                "explanation": explanation
+            })
+
+        total_questions = key["total_questions"]
+        return {
+            "quiz_id": quiz_id,
+            "score": (correct_count / total_questions) * 100 if total_questions > 0 else 0,
+            "correct_answers": correct_count,
+            "total_questions": total_questions,
+            "results": results
+        }
+
+# Global instance
+answer_key_service = AnswerKeyService()
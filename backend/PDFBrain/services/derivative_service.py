@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from config import settings
+from database import SessionLocal
+from models import PDFDocument, DocumentDerivative
+from services.gemini_service import gemini_service
+from services.pdf_processor import pdf_processor
+
+logger = logging.getLogger(__name__)
+
+
+class DerivativeService:
+    """Stores per-document views (summary, outline, ...) so they are served with a DB read"""
+
+    def __init__(self):
+        self.operations = [operation.strip() for operation in settings.DERIVATIVE_OPERATIONS if operation.strip()]
+
+    @staticmethod
+    def source_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def is_stored(self, operation: str, custom_prompt: Optional[str] = None) -> bool:
+        """Only the fixed operations are document views; custom prompts are per request"""
+        return operation in self.operations and not custom_prompt
+
+    async def get(self, db: AsyncSession, document_id: int, operation: str, source_hash: str) -> Optional[str]:
+        """Return the stored result if it was generated from the current text"""
+        return await db.scalar(
+            select(DocumentDerivative.result).where(
+                DocumentDerivative.document_id == document_id,
+                DocumentDerivative.operation == operation,
+                DocumentDerivative.source_hash == source_hash
+            )
+        )
+
+    async def store(self, db: AsyncSession, document_id: int, operation: str, source_hash: str, result: str):
+        """Replace the stored result for a document and operation"""
+        try:
+            await db.execute(
+                delete(DocumentDerivative).where(
+                    DocumentDerivative.document_id == document_id,
+                    DocumentDerivative.operation == operation
+                )
+            )
+            db.add(DocumentDerivative(document_id=document_id, operation=operation, source_hash=source_hash, result=result))
+            await db.commit()
+        except IntegrityError:
+            # A concurrent request stored the same view first
+            await db.rollback()
+
+    async def invalidate(self, db: AsyncSession, document_id: int):
+        """Drop stored results, e.g. when a document's text is re-extracted"""
+        await db.execute(delete(DocumentDerivative).where(DocumentDerivative.document_id == document_id))
+
+    async def get_or_generate(self, db: AsyncSession, document: PDFDocument, operation: str) -> Optional[str]:
+        """Serve a stored view, generating and storing it on first use; None if the model returned nothing"""
+        document_id = document.id
+        cache_key = document.content_hash or f"document-{document_id}"
+        truncated_text = pdf_processor.truncate_text_for_ai(str(document.extracted_text))
+        source_hash = self.source_hash(truncated_text)
+
+        result = await self.get(db, document_id, operation, source_hash)
+        if result is not None:
+            return result
+
+        result = await gemini_service.manipulate_content(text=truncated_text, operation=operation, cache_key=cache_key)
+        if result is not None:
+            await self.store(db, document_id, operation, source_hash, result)
+        return result
+
+    async def precompute(self, document_id: int):
+        """Fill every configured view for a document; each runs in its own session"""
+        async def run(operation: str):
+            async with SessionLocal() as db:
+                try:
+                    document = await db.scalar(
+                        select(PDFDocument).options(undefer(PDFDocument.extracted_text)).where(PDFDocument.id == document_id)
+                    )
+                    if document and document.extracted_text:
+                        await self.get_or_generate(db, document, operation)
+                except Exception as e:
+                    logger.warning(f"Failed to precompute '{operation}' for document {document_id}: {str(e)}")
+
+        await asyncio.gather(*(run(operation) for operation in self.operations))
+        logger.info(f"Precomputed derivatives for document {document_id}")
+
+# Global instance
+derivative_service = DerivativeService()
@@ -1,13 +1,15 @@
+import asyncio
 import json
 import logging
 import os
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 
 from google import genai
 from google.genai import types
 from pydantic import BaseModel
 
 from config import settings
+from services.response_cache import response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +21,60 @@ class GeminiService:
         self.client = client
         self.default_model = "gemini-2.5-flash"
         self.pro_model = "gemini-2.5-pro"
+        self.embedding_model = settings.EMBEDDING_MODEL
+        self.embedding_batch_size = 100
+        self.timeout = settings.GEMINI_TIMEOUT
+        # Bounds in-flight Gemini calls so a burst of requests cannot exhaust the API quota
+        self._semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+        # Cumulative token use of generation calls in this process
+        self.token_usage = {"calls": 0, "prompt_tokens": 0, "output_tokens": 0}
+    
+    async def _bounded(self, call):
+        """Run a Gemini call bounded by the concurrency limit and deadline"""
+        async def run():
+            async with self._semaphore:
+                return await call()
+        
+        try:
+            return await asyncio.wait_for(run(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Gemini request timed out after {self.timeout:.0f}s")
+    
+    async def _generate(self, model: str, contents: str, config: Optional[types.GenerateContentConfig] = None):
+        """Run a generation call on the async client"""
+        response = await self._bounded(lambda: self.client.aio.models.generate_content(
+            model=model,
+            contents=contents,
+            config=config
+        ))
+        
+        usage = getattr(response, "usage_metadata", None)
+        self.token_usage["calls"] += 1
+        self.token_usage["prompt_tokens"] += getattr(usage, "prompt_token_count", None) or 0
+        self.token_usage["output_tokens"] += getattr(usage, "candidates_token_count", None) or 0
+        return response
+    
+    async def embed_texts(self, texts: List[str], task_type: str = "RETRIEVAL_DOCUMENT") -> List[List[float]]:
+        """Embed a list of texts, batching requests to stay within the API limits"""
+        try:
+            embeddings: List[List[float]] = []
+            for start in range(0, len(texts), self.embedding_batch_size):
+                batch = texts[start:start + self.embedding_batch_size]
+                response = await self._bounded(lambda: self.client.aio.models.embed_content(
+                    model=self.embedding_model,
+                    contents=batch,
+                    config=types.EmbedContentConfig(task_type=task_type)
+                ))
+                embeddings.extend(list(embedding.values or []) for embedding in response.embeddings or [])
+            
+            if len(embeddings) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+            
+            return embeddings
+            
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {str(e)}")
+            raise Exception(f"Failed to generate embeddings: {str(e)}")
     
     async def generate_summary(self, text: str) -> str:
         """Generate a concise summary of the PDF content"""
@@ -32,7 +88,7 @@ class GeminiService:
             {text}
             """
             
-            response = self.client.models.generate_content(
+            response = await self._generate(
                 model=self.default_model,
                 contents=prompt
             )
@@ -43,47 +99,156 @@ class GeminiService:
             logger.error(f"Error generating summary: {str(e)}")
             raise Exception(f"Failed to generate summary: {str(e)}")
     
-    async def answer_question(self, question: str, context: str, chat_history: Optional[List[Dict]] = None) -> str:
-        """Answer a question based on the PDF content and chat history"""
+    async def summarize_section(self, text: str, label: str) -> str:
+        """Summarize one part of a document too long to summarize in a single prompt"""
         try:
-            # Build context with chat history
-            conversation_context = ""
-            if chat_history:
-                for msg in chat_history[-5:]:  # Last 5 messages for context
-                    conversation_context += f"Human: {msg.get('user_message', '')}\n"
-                    conversation_context += f"Assistant: {msg.get('ai_response', '')}\n"
-            
             prompt = f"""
-            You are a helpful AI assistant that answers questions based on the provided document content.
-            Use the document content as your primary source of information.
-            If the question cannot be answered from the document, clearly state that.
-            Be accurate, helpful, and conversational.
+            The following is {label} of a longer document.
+            Summarize it so the summary can later be combined with summaries of the other parts.
+            Keep the main topics, key points, definitions and conclusions (one or two paragraphs).
             
-            Document content:
-            {context}
+            Content:
+            {text}
+            """
             
-            Previous conversation:
-            {conversation_context}
+            response = await self._generate(
+                model=self.default_model,
+                contents=prompt
+            )
             
-            Current question: {question}
+            if not response.text:
+                raise ValueError("empty response")
+            return response.text
             
-            Please provide a helpful and accurate answer:
+        except Exception as e:
+            logger.error(f"Error summarizing section: {str(e)}")
+            raise Exception(f"Failed to summarize {label}: {str(e)}")
+    
+    async def combine_summaries(self, summaries: List[str], final: bool = True) -> str:
+        """Merge summaries of consecutive document parts, into the final summary or a longer intermediate one"""
+        try:
+            parts = "\n\n".join(f"Part {index}:\n{summary}" for index, summary in enumerate(summaries, start=1))
+            length = "Keep it informative but concise (2-3 paragraphs maximum)." if final else "Keep every key point; this will be combined again."
+            prompt = f"""
+            The following are summaries of consecutive parts of one document, in order.
+            Combine them into a comprehensive summary of the whole document.
+            Include the main topics, key points, and important conclusions.
+            {length}
+            
+            Part summaries:
+            {parts}
             """
             
-            response = self.client.models.generate_content(
+            response = await self._generate(
+                model=self.default_model,
+                contents=prompt
+            )
+            
+            if not response.text:
+                raise ValueError("empty response")
+            return response.text
+            
+        except Exception as e:
+            logger.error(f"Error combining summaries: {str(e)}")
+            raise Exception(f"Failed to combine summaries: {str(e)}")
+    
+    def _answer_prompt(self, question: str, context: str, chat_history: Optional[List[Dict]] = None) -> str:
+        # Build context with chat history
+        conversation_context = ""
+        if chat_history:
+            for msg in chat_history[-5:]:  # Last 5 messages for context
+                conversation_context += f"Human: {msg.get('user_message', '')}\n"
+                conversation_context += f"Assistant: {msg.get('ai_response', '')}\n"
+        
+        return f"""
+        You are a helpful AI assistant that answers questions based on the provided document content.
+        Use the document content as your primary source of information.
+        If the question cannot be answered from the document, clearly state that.
+        Be accurate, helpful, and conversational.
+        
+        Document content:
+        {context}
+        
+        Previous conversation:
+        {conversation_context}
+        
+        Current question: {question}
+        
+        Please provide a helpful and accurate answer:
+        """
+    
+    async def answer_question(
+        self,
+        question: str,
+        context: str,
+        chat_history: Optional[List[Dict]] = None
+    ) -> Optional[str]:
+        """Answer a question based on the PDF content and chat history
+        
+        Returns None when the model produced no text, so callers never cache a placeholder.
+        """
+        try:
+            prompt = self._answer_prompt(question, context, chat_history)
+            
+            response = await self._generate(
                 model=self.default_model,
                 contents=prompt
             )
             
-            return response.text or "I'm sorry, I couldn't generate a response to your question."
+            return response.text or None
             
         except Exception as e:
             logger.error(f"Error answering question: {str(e)}")
             raise Exception(f"Failed to answer question: {str(e)}")
     
-    async def manipulate_content(self, text: str, operation: str, custom_prompt: Optional[str] = None) -> str:
-        """Manipulate content based on the specified operation"""
+    async def stream_answer(self, question: str, context: str, chat_history: Optional[List[Dict]] = None) -> AsyncIterator[str]:
+        """Answer a question like answer_question, yielding text as the model produces it"""
+        prompt = self._answer_prompt(question, context, chat_history)
+        
+        # Holds a concurrency slot for the whole stream; the deadline applies to each wait for the model
+        async with self._semaphore:
+            try:
+                stream = await asyncio.wait_for(
+                    self.client.aio.models.generate_content_stream(model=self.default_model, contents=prompt),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Gemini request timed out after {self.timeout:.0f}s")
+            
+            chunks = stream.__aiter__()
+            usage = None
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if chunk.text:
+                        yield chunk.text
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Gemini stream stalled for {self.timeout:.0f}s")
+            finally:
+                # Closing the stream drops the HTTP response, which is what stops generation upstream
+                if hasattr(stream, "aclose"):
+                    await stream.aclose()
+        
+        self.token_usage["calls"] += 1
+        self.token_usage["prompt_tokens"] += getattr(usage, "prompt_token_count", None) or 0
+        self.token_usage["output_tokens"] += getattr(usage, "candidates_token_count", None) or 0
+    
+    async def manipulate_content(self, text: str, operation: str, custom_prompt: Optional[str] = None, cache_key: Optional[str] = None) -> Optional[str]:
+        """Manipulate content based on the specified operation; results are cached per cache key (the document hash)
+        
+        Returns None when the model produced no text, so callers never store a placeholder.
+        """
         try:
+            cache_parts = (cache_key, self.default_model, operation, custom_prompt or "")
+            if cache_key:
+                cached = await response_cache.get("manipulation", *cache_parts)
+                if cached is not None:
+                    return cached
+            
             if custom_prompt:
                 prompt = f"{custom_prompt}\n\nContent:\n{text}"
             else:
@@ -97,22 +262,33 @@ class GeminiService:
                 
                 prompt = operation_prompts.get(operation, f"Process the following content according to '{operation}':\n\n{text}")
             
-            response = self.client.models.generate_content(
+            response = await self._generate(
                 model=self.default_model,
                 contents=prompt
             )
             
-            return response.text or f"Failed to {operation} the content"
+            if response.text and cache_key:
+                await response_cache.set("manipulation", response.text, *cache_parts)
+            
+            return response.text or None
             
         except Exception as e:
             logger.error(f"Error in content manipulation: {str(e)}")
             raise Exception(f"Failed to {operation} content: {str(e)}")
     
-    async def generate_quiz_questions(self, text: str, num_questions: int, question_types: List[str], difficulty: str = "medium") -> List[Dict[str, Any]]:
+    async def generate_quiz_questions(
+        self,
+        text: str,
+        num_questions: int,
+        question_types: List[str],
+        difficulty: str = "medium",
+        focus_topics: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """Generate quiz questions from the PDF content"""
         try:
             # Prepare question types string
             types_str = ", ".join(question_types)
+            focus_str = f"\n            - Focus on these topics: {', '.join(focus_topics)}" if focus_topics else ""
             
             prompt = f"""
             Based on the following document content, generate {num_questions} quiz questions.
@@ -122,7 +298,7 @@ class GeminiService:
             - Difficulty level: {difficulty}
             - Questions should test understanding of key concepts
             - Provide clear, unambiguous questions
-            - Include explanations for correct answers
+            - Include explanations for correct answers{focus_str}
             
             For MCQ questions: Provide 4 options (A, B, C, D)
             For True/False: Provide true or false questions
@@ -135,7 +311,8 @@ class GeminiService:
                     "question_text": "The question text",
                     "correct_answer": "The correct answer",
                     "options": ["A", "B", "C", "D"] (only for MCQ),
-                    "explanation": "Explanation of why this is correct"
+                    "explanation": "Explanation of why this is correct",
+                    "topic": "A short label (1-3 words) for the concept tested"
                 }}
             ]
             
@@ -143,7 +320,7 @@ class GeminiService:
             {text}
             """
             
-            response = self.client.models.generate_content(
+            response = await self._generate(
                 model=self.pro_model,
                 contents=prompt,
                 config=types.GenerateContentConfig(
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+from typing import List, Optional, Set
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer_group
+
+from config import settings
+from database import SessionLocal
+from models import PDFDocument, DocumentChunk, DocumentDerivative, QuestionBankItem
+from schemas import DocumentStatus
+from services.derivative_service import derivative_service
+from services.pdf_processor import pdf_processor
+from services.question_bank_service import question_bank_service
+from services.quiz_generator import quiz_generator
+from services.retrieval_service import retrieval_service
+from services.summarizer_service import summarizer_service
+
+logger = logging.getLogger(__name__)
+
+# Rows generated from a document's text, copied to another upload of the same content
+REUSED_MODELS = (DocumentChunk, DocumentDerivative, QuestionBankItem)
+
+
+class IngestionError(Exception):
+    """A document that cannot be ingested no matter how often it is retried"""
+
+
+class IngestionService:
+    def __init__(self):
+        self.num_workers = settings.INGESTION_WORKERS
+        self.queue_size = settings.INGESTION_QUEUE_SIZE
+        self.max_retries = settings.INGESTION_MAX_RETRIES
+        self.retry_backoff = settings.INGESTION_RETRY_BACKOFF
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._background: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the worker pool and requeue documents interrupted by a restart"""
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        self._workers.append(asyncio.create_task(self._recover()))
+        logger.info(f"Ingestion started: {self.num_workers} workers, {settings.EXTRACTION_PROCESSES} extraction processes")
+
+    async def stop(self):
+        tasks = self._workers + list(self._background)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._background.clear()
+        pdf_processor.shutdown()
+
+    def is_full(self) -> bool:
+        return self._queue is None or self._queue.full()
+
+    def submit(self, document_id: int) -> None:
+        """Queue a document for processing; raises asyncio.QueueFull when saturated"""
+        if self._queue is None:
+            raise RuntimeError("Ingestion service is not running")
+        self._queue.put_nowait(document_id)
+
+    async def reuse_processed(self, db: AsyncSession, document: PDFDocument) -> bool:
+        """Copy the text, summary, index and generated views of a processed upload with the same content
+        
+        Returns False when there is none; the caller commits.
+        """
+        if not document.content_hash:
+            return False
+        source = await db.scalar(
+            select(PDFDocument).options(undefer_group("content")).where(
+                PDFDocument.content_hash == document.content_hash,
+                PDFDocument.status == DocumentStatus.READY.value,
+                PDFDocument.id != document.id
+            ).limit(1)
+        )
+        if not source:
+            return False
+
+        document.extracted_text = source.extracted_text
+        document.page_engines = source.page_engines
+        document.page_count = source.page_count
+        document.summary = source.summary
+        document.status = DocumentStatus.READY.value
+        document.error_message = None
+        await db.flush()
+
+        for model in REUSED_MODELS:
+            columns = [column for column in model.__table__.c if column.name not in ("id", "document_id")]
+            await db.execute(delete(model).where(model.document_id == document.id))
+            await db.execute(insert(model).from_select(
+                ["document_id", *(column.name for column in columns)],
+                select(literal(document.id), *columns).where(model.document_id == source.id)
+            ))
+
+        logger.info(f"Document {document.id} reuses the processed content of document {source.id}")
+        return True
+
+    async def _recover(self):
+        async with SessionLocal() as db:
+            document_ids = (await db.scalars(
+                select(PDFDocument.id).where(
+                    PDFDocument.status.in_([DocumentStatus.PENDING.value, DocumentStatus.PROCESSING.value])
+                )
+            )).all()
+
+        for document_id in document_ids:
+            await self._queue.put(document_id)
+        if document_ids:
+            logger.info(f"Requeued {len(document_ids)} interrupted ingestion jobs")
+
+    async def _worker(self):
+        while True:
+            document_id = await self._queue.get()
+            try:
+                await self._process_with_retry(document_id)
+            except Exception as e:
+                logger.error(f"Unexpected ingestion failure for document {document_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _process_with_retry(self, document_id: int):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._process(document_id)
+                return
+            except IngestionError as e:
+                await self._mark_failed(document_id, str(e))
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    await self._mark_failed(document_id, str(e))
+                    return
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Ingestion of document {document_id} failed (attempt {attempt + 1}), retrying in {delay:.0f}s: {str(e)}")
+                await asyncio.sleep(delay)
+
+    async def _process(self, document_id: int):
+        """Extract, validate, summarize and index one document"""
+        async with SessionLocal() as db:
+            try:
+                document = await db.scalar(select(PDFDocument).where(PDFDocument.id == document_id))
+                if not document:
+                    logger.info(f"Document {document_id} was deleted before ingestion")
+                    return
+
+                # An identical upload may have finished processing while this one was queued
+                if await self.reuse_processed(db, document):
+                    await db.commit()
+                    return
+
+                document.status = DocumentStatus.PROCESSING.value
+                document.error_message = None
+                original_filename = document.original_filename
+                file_path = str(document.file_path)
+                await db.commit()
+
+                # Extraction fans out to the processor's process pool; wait for it off the event loop
+                try:
+                    pages, engines = await asyncio.to_thread(pdf_processor.extract_pages_with_engines, file_path)
+                except HTTPException as e:
+                    raise IngestionError(str(e.detail))
+                extracted_text = pdf_processor.join_pages(pages)
+
+                if not pdf_processor.validate_extracted_text(extracted_text):
+                    raise IngestionError("Extracted text appears to be invalid or insufficient for processing")
+
+                document.extracted_text = extracted_text
+                document.page_count = len(pages)
+                document.page_engines = engines
+                # Views and questions generated from the previous text are stale now
+                await derivative_service.invalidate(db, document_id)
+                await question_bank_service.invalidate(db, document_id)
+                await db.commit()
+
+                try:
+                    document.summary = await summarizer_service.summarize(pages)
+                    await db.commit()
+                except Exception as e:
+                    logger.warning(f"Failed to generate summary: {str(e)}")
+
+                try:
+                    await retrieval_service.index_document(document_id, pages, db)
+                except Exception as e:
+                    await db.rollback()
+                    logger.warning(f"Failed to index document {document_id}: {str(e)}")
+
+                await db.execute(
+                    update(PDFDocument).where(PDFDocument.id == document_id).values(status=DocumentStatus.READY.value)
+                )
+                await db.commit()
+
+                logger.info(f"Successfully processed PDF: {original_filename} (ID: {document_id})")
+                
+                # The document is usable already; optional extras run without holding up the next upload
+                if settings.PRECOMPUTE_DERIVATIVES:
+                    self._run_in_background(derivative_service.precompute(document_id))
+                if settings.BUILD_QUESTION_BANK:
+                    self._run_in_background(quiz_generator.build_question_bank(document_id))
+
+            except Exception:
+                await db.rollback()
+                raise
+
+    def _run_in_background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _mark_failed(self, document_id: int, error: str):
+        logger.error(f"Ingestion of document {document_id} failed: {error}")
+        async with SessionLocal() as db:
+            await db.execute(
+                update(PDFDocument).where(PDFDocument.id == document_id).values(
+                    status=DocumentStatus.FAILED.value,
+                    error_message=error
+                )
+            )
+            await db.commit()
+
+# Global instance
+ingestion_service = IngestionService()
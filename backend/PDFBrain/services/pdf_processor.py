@@ -1,6 +1,16 @@
+import asyncio
+import hashlib
+import itertools
+import multiprocessing
 import os
-import uuid
-from typing import Tuple, Optional
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional
 import PyPDF2
 import pdfplumber
 from fastapi import UploadFile, HTTPException
@@ -10,14 +20,165 @@ from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Engines recorded per page in PDFDocument.page_engines
+ENGINE_PDFPLUMBER = "pdfplumber"
+ENGINE_PYPDF2 = "pypdf2"
+ENGINE_NONE = "none"
+
+# A page below either threshold is re-extracted with the fallback engine
+MIN_PAGE_CHARS = 20
+MIN_READABLE_RATIO = 0.7
+
+# Runs of a page range whose worker died; past this the range is skipped instead of crashing the pool again
+MAX_RANGE_ATTEMPTS = 3
+# Seconds between checks whether a queued range has been picked up by a worker
+START_POLL_INTERVAL = 1.0
+
+
+class PageTimeoutError(Exception):
+    pass
+
+
+@contextmanager
+def _page_deadline(seconds: float):
+    """Interrupt a page that takes too long; only possible on the main thread of a Unix process,
+    which is why extraction always runs in the pool's worker processes"""
+    if not seconds or not hasattr(signal, "SIGALRM") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    
+    def on_timeout(signum, frame):
+        raise PageTimeoutError(f"page extraction exceeded {seconds:.0f}s")
+    
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def readable_ratio(text: str) -> float:
+    """Share of characters that are alphanumeric, whitespace or common punctuation"""
+    if not text:
+        return 0
+    readable_chars = sum(1 for c in text if c.isalnum() or c.isspace() or c in '.,!?;:')
+    return readable_chars / len(text)
+
+
+def _page_is_usable(text: str) -> bool:
+    return len(text.strip()) >= MIN_PAGE_CHARS and readable_ratio(text) > MIN_READABLE_RATIO
+
+
+def _extract_page_range(file_path: str, start: int, end: int, page_timeout: float) -> List[Tuple[str, str]]:
+    """Extract pages [start, end) as (text, engine) pairs; runs inside the extraction process pool
+    
+    pdfplumber is tried first. Pages whose text fails the quality check are re-extracted
+    with PyPDF2, and the better-scoring result is kept.
+    """
+    pages: List[Tuple[str, str]] = []
+    fallback_reader = None
+    with pdfplumber.open(file_path) as pdf, open(file_path, 'rb') as file:
+        for index in range(start, end):
+            text = ""
+            try:
+                with _page_deadline(page_timeout):
+                    text = pdf.pages[index].extract_text() or ""
+            except Exception as e:
+                # One pathological page must not fail the whole document
+                logger.warning(f"pdfplumber failed on page {index + 1} of {file_path}: {str(e)}")
+            
+            if _page_is_usable(text):
+                pages.append((text, ENGINE_PDFPLUMBER))
+                continue
+            
+            fallback_text = ""
+            try:
+                with _page_deadline(page_timeout):
+                    if fallback_reader is None:
+                        fallback_reader = PyPDF2.PdfReader(file)
+                    fallback_text = fallback_reader.pages[index].extract_text() or ""
+            except Exception as e:
+                logger.warning(f"PyPDF2 failed on page {index + 1} of {file_path}: {str(e)}")
+            
+            if fallback_text.strip() and (not text.strip() or readable_ratio(fallback_text) > readable_ratio(text)):
+                pages.append((fallback_text, ENGINE_PYPDF2))
+            elif text.strip():
+                pages.append((text, ENGINE_PDFPLUMBER))
+            else:
+                pages.append(("", ENGINE_NONE))
+    return pages
+
+
+# Set in each pool worker: where it reports the ranges it starts
+_started_queue = None
+
+
+def _init_worker(started_queue):
+    global _started_queue
+    _started_queue = started_queue
+
+
+def _run_page_range(task_id: int, file_path: str, start: int, end: int, page_timeout: float) -> List[Tuple[str, str]]:
+    """Pool entry point: report which worker started the range and when, then extract it"""
+    _started_queue.put((task_id, os.getpid(), time.time()))
+    return _extract_page_range(file_path, start, end, page_timeout)
+
+
 class PDFProcessor:
-    def __init__(self):
+    def __init__(self, extraction_processes: Optional[int] = None):
         self.upload_dir = settings.UPLOAD_DIR
         self.max_file_size = settings.MAX_FILE_SIZE
         self.allowed_extensions = settings.ALLOWED_EXTENSIONS
+        self.chunk_size = 1024 * 1024  # Upload streaming chunk size in bytes
+        self.extraction_processes = extraction_processes or settings.EXTRACTION_PROCESSES
+        self.pages_per_task = settings.EXTRACTION_PAGES_PER_TASK
+        self.page_timeout = settings.EXTRACTION_PAGE_TIMEOUT
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        # Task id -> (worker pid, start time) of ranges a worker has picked up
+        self._started: Dict[int, Tuple[int, float]] = {}
+        self._started_queue = None
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Return the shared pool, replacing it if a worker died and broke it"""
+        with self._executor_lock:
+            if self._executor is not None and self._executor._broken:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            if self._executor is None:
+                # spawn avoids inheriting locks held by the server's threads at fork time
+                context = multiprocessing.get_context("spawn")
+                if self._started_queue is None:
+                    self._started_queue = context.Queue()
+                    threading.Thread(target=self._record_starts, name="extraction-starts", daemon=True).start()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=max(self.extraction_processes, 1),
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._started_queue,)
+                )
+            return self._executor
     
-    async def save_uploaded_file(self, file: UploadFile) -> Tuple[str, str]:
-        """Save uploaded PDF file and return filename and file path"""
+    def _record_starts(self):
+        while True:
+            task_id, pid, started = self._started_queue.get()
+            self._started[task_id] = (pid, started)
+    
+    def shutdown(self):
+        """Stop the extraction process pool"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+    
+    async def save_uploaded_file(self, file: UploadFile) -> Tuple[str, str, str]:
+        """Stream uploaded PDF file to a temporary file and return its path, content-addressed filename and SHA-256 hash
+        
+        Move it into place with store_file once the upload is recorded, or remove it with cleanup_file.
+        """
         
         # Validate file extension
         if not file.filename or not any(file.filename.lower().endswith(ext) for ext in self.allowed_extensions):
@@ -26,82 +187,184 @@ class PDFProcessor:
                 detail=f"File type not allowed. Supported formats: {', '.join(self.allowed_extensions)}"
             )
         
-        # Check file size
-        file_content = await file.read()
-        if len(file_content) > self.max_file_size:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File size exceeds maximum allowed size of {self.max_file_size / 1024 / 1024:.1f}MB"
-            )
+        size_error = HTTPException(
+            status_code=400,
+            detail=f"File size exceeds maximum allowed size of {self.max_file_size / 1024 / 1024:.1f}MB"
+        )
         
-        # Generate unique filename
-        file_extension = os.path.splitext(file.filename or "")[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(self.upload_dir, unique_filename)
+        # Reject without reading when the declared size is already too large
+        if file.size is not None and file.size > self.max_file_size:
+            raise size_error
         
-        # Save file
+        file_extension = os.path.splitext(file.filename or "")[1].lower()
+        
+        # Stream into a temp file in the upload dir so the final rename is atomic
+        fd, temp_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+        hasher = hashlib.sha256()
+        size = 0
         try:
-            with open(file_path, "wb") as f:
-                f.write(file_content)
+            with os.fdopen(fd, "wb") as f:
+                while chunk := await file.read(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        raise size_error
+                    hasher.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
             
-            logger.info(f"File saved: {file_path}")
-            return unique_filename, file_path
+            content_hash = hasher.hexdigest()
+            logger.info(f"Upload received: {temp_path} ({size} bytes)")
+            return temp_path, f"{content_hash}{file_extension}", content_hash
             
+        except HTTPException:
+            self.cleanup_file(temp_path)
+            raise
         except Exception as e:
+            self.cleanup_file(temp_path)
             logger.error(f"Error saving file: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to save uploaded file")
     
-    def extract_text_from_pdf(self, file_path: str) -> Tuple[str, int]:
-        """Extract text from PDF file using multiple methods for better compatibility"""
+    def stored_path(self, filename: str) -> str:
+        return os.path.join(self.upload_dir, filename)
+    
+    def store_file(self, temp_path: str, filename: str) -> str:
+        """Move a saved upload to its content-addressed path, where identical uploads share one stored copy"""
+        file_path = self.stored_path(filename)
+        # Replacing an existing copy is harmless: the content is identical
+        os.replace(temp_path, file_path)
+        logger.info(f"File stored: {file_path}")
+        return file_path
+    
+    def extract_pages_from_pdf(self, file_path: str) -> List[str]:
+        """Extract text per page from PDF file"""
+        pages, _ = self.extract_pages_with_engines(file_path)
+        return pages
+    
+    def extract_pages_with_engines(self, file_path: str) -> Tuple[List[str], List[str]]:
+        """Extract text per page, routing each page to the extractor that handles it best
+        
+        Returns the page texts and, for each page, the engine that produced it.
+        """
         
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="PDF file not found")
         
-        text = ""
-        page_count = 0
-        
-        # Try pdfplumber first (better for complex layouts)
         try:
             with pdfplumber.open(file_path) as pdf:
                 page_count = len(pdf.pages)
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                if text.strip():
-                    logger.info(f"Successfully extracted text using pdfplumber: {len(text)} characters")
-                    return text.strip(), page_count
-                    
         except Exception as e:
-            logger.warning(f"pdfplumber extraction failed: {str(e)}")
+            # pdfplumber cannot open the document at all, so every page goes to PyPDF2
+            logger.warning(f"pdfplumber could not open {file_path}: {str(e)}")
+            results = self._extract_pages_pypdf2(file_path)
+        else:
+            results = self._extract_pages_parallel(file_path, page_count)
+        
+        pages = [text for text, _ in results]
+        engines = [engine for _, engine in results]
+        
+        if not any(page.strip() for page in pages):
+            raise HTTPException(
+                status_code=422,
+                detail="Could not extract text from PDF. The file may be corrupted, password-protected, or contain only images."
+            )
         
-        # Fallback to PyPDF2
+        counts = {engine: engines.count(engine) for engine in set(engines)}
+        logger.info(f"Extracted {len(pages)} pages from {file_path}: {counts}")
+        return pages, engines
+    
+    def _extract_pages_pypdf2(self, file_path: str) -> List[Tuple[str, str]]:
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                page_count = len(pdf_reader.pages)
-                
+                results = []
                 for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                
-                if text.strip():
-                    logger.info(f"Successfully extracted text using PyPDF2: {len(text)} characters")
-                    return text.strip(), page_count
-                    
+                    text = page.extract_text() or ""
+                    results.append((text, ENGINE_PYPDF2 if text.strip() else ENGINE_NONE))
+                return results
         except Exception as e:
             logger.error(f"PyPDF2 extraction failed: {str(e)}")
+            return []
+    
+    def _extract_pages_parallel(self, file_path: str, page_count: int) -> List[Tuple[str, str]]:
+        """Split the document into page ranges, extract them in the process pool and reassemble in order
         
-        # If both methods fail
-        if not text.strip():
-            raise HTTPException(
-                status_code=422,
-                detail="Could not extract text from PDF. The file may be corrupted, password-protected, or contain only images."
-            )
+        Every document goes through the pool, even one with a single range: the page deadline
+        relies on SIGALRM, which only works on a process's main thread, not in the to_thread
+        worker this is called from.
+        """
+        ranges = [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+        results: Dict[Tuple[int, int], List[Tuple[str, str]]] = {}
+        attempts = dict.fromkeys(ranges, 0)
+        pending = ranges
+        while pending:
+            tasks = [((start, end), *self._submit(file_path, start, end)) for start, end in pending]
+            pending = []
+            for (start, end), task_id, future in tasks:
+                try:
+                    results[(start, end)] = self._wait(task_id, future, end - start)
+                except FutureTimeoutError:
+                    logger.error(f"Pages {start + 1}-{end} of {file_path} timed out and were skipped")
+                    results[(start, end)] = [("", ENGINE_NONE)] * (end - start)
+                except BrokenProcessPool:
+                    # The pool is shared, so a worker killed for another range (of this or another document)
+                    # fails every range in flight; those are run again on the replacement pool
+                    attempts[(start, end)] += 1
+                    if attempts[(start, end)] < MAX_RANGE_ATTEMPTS:
+                        pending.append((start, end))
+                    else:
+                        logger.error(f"Pages {start + 1}-{end} of {file_path} were skipped after their worker died {MAX_RANGE_ATTEMPTS} times")
+                        results[(start, end)] = [("", ENGINE_NONE)] * (end - start)
+                finally:
+                    self._started.pop(task_id, None)
+        return [page for page_range in ranges for page in results[page_range]]
+    
+    def _submit(self, file_path: str, start: int, end: int) -> Tuple[int, Future]:
+        task_id = next(self._task_ids)
+        executor = self._get_executor()
+        try:
+            return task_id, executor.submit(_run_page_range, task_id, file_path, start, end, self.page_timeout)
+        except (BrokenProcessPool, RuntimeError):
+            # Broken or shut down by another thread since it was fetched; fetch its replacement once
+            with self._executor_lock:
+                if self._executor is executor:
+                    self._executor = None
+            return task_id, self._get_executor().submit(_run_page_range, task_id, file_path, start, end, self.page_timeout)
+    
+    def _wait(self, task_id: int, future: Future, page_count: int) -> List[Tuple[str, str]]:
+        """Wait for a range; past its deadline, counted from when a worker started it, kill that worker
+        
+        The deadline is a backstop for a page the signal cannot interrupt (a hang inside C code),
+        allowing every page both engines' full page timeout.
+        """
+        if not self.page_timeout:
+            return future.result()
         
-        return text.strip(), page_count
+        limit = self.page_timeout * 2 * page_count + 30
+        while True:
+            started = self._started.get(task_id)
+            # Queued behind other documents' ranges: not on the clock yet
+            remaining = START_POLL_INTERVAL if started is None else started[1] + limit - time.time()
+            try:
+                return future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                if started is not None and time.time() >= started[1] + limit:
+                    self._kill_worker(started[0])
+                    raise
+    
+    def _kill_worker(self, pid: int):
+        """Terminate a worker stuck on a page; the pool breaks and is replaced on next use"""
+        with self._executor_lock:
+            process = (self._executor._processes or {}).get(pid) if self._executor is not None else None
+        if process is not None:
+            process.terminate()
+    
+    def extract_text_from_pdf(self, file_path: str) -> Tuple[str, int]:
+        """Extract text from PDF file and return it with the page count"""
+        pages = self.extract_pages_from_pdf(file_path)
+        return self.join_pages(pages), len(pages)
+    
+    def join_pages(self, pages: List[str]) -> str:
+        """Join per-page text into the document text stored on PDFDocument"""
+        return "\n".join(page for page in pages if page).strip()
     
     def validate_extracted_text(self, text: str) -> bool:
         """Validate that extracted text is meaningful"""
@@ -109,10 +372,7 @@ class PDFProcessor:
             return False
         
         # Check if text contains mostly readable characters
-        readable_chars = sum(1 for c in text if c.isalnum() or c.isspace() or c in '.,!?;:')
-        ratio = readable_chars / len(text) if text else 0
-        
-        return ratio > 0.7  # At least 70% readable characters
+        return readable_ratio(text) > MIN_READABLE_RATIO
     
     def truncate_text_for_ai(self, text: str) -> str:
         """Truncate text to fit within AI model limits"""
@@ -0,0 +1,78 @@
+import random
+from typing import List, Dict, Any, Optional
+from sqlalchemy import delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import bulk_insert
+from models import QuestionBankItem
+
+
+class QuestionBankService:
+    """Per-document pool of generated questions that quizzes are assembled from"""
+
+    async def sample(
+        self,
+        db: AsyncSession,
+        document_id: int,
+        num_questions: int,
+        question_types: List[str],
+        difficulty: str,
+        focus_topics: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Pick up to num_questions random bank questions, alternating over the requested types"""
+        statement = select(
+            QuestionBankItem.question_type,
+            QuestionBankItem.topic,
+            QuestionBankItem.question_text,
+            QuestionBankItem.options,
+            QuestionBankItem.correct_answer,
+            QuestionBankItem.explanation
+        ).where(
+            QuestionBankItem.document_id == document_id,
+            QuestionBankItem.difficulty == difficulty,
+            QuestionBankItem.question_type.in_(question_types)
+        )
+        if focus_topics:
+            statement = statement.where(or_(*(
+                # autoescape: a topic is matched literally, so "%" or "_" in it is not a wildcard
+                or_(QuestionBankItem.topic.icontains(topic, autoescape=True), QuestionBankItem.question_text.icontains(topic, autoescape=True))
+                for topic in focus_topics
+            )))
+
+        by_type: Dict[str, List[Dict[str, Any]]] = {question_type: [] for question_type in question_types}
+        for row in (await db.execute(statement)).all():
+            by_type[row.question_type].append(dict(row._mapping))
+        for items in by_type.values():
+            random.shuffle(items)
+
+        picked: List[Dict[str, Any]] = []
+        while len(picked) < num_questions and any(by_type.values()):
+            for question_type in question_types:
+                if by_type[question_type] and len(picked) < num_questions:
+                    picked.append(by_type[question_type].pop())
+        return picked
+
+    async def add(self, db: AsyncSession, document_id: int, difficulty: str, questions: List[Dict[str, Any]]) -> int:
+        """Store generated questions in the bank; the caller commits"""
+        rows = [
+            {
+                "document_id": document_id,
+                "question_type": question.get("question_type", "mcq"),
+                "difficulty": difficulty,
+                "topic": question.get("topic"),
+                "question_text": question["question_text"],
+                "options": question.get("options"),
+                "correct_answer": question["correct_answer"],
+                "explanation": question.get("explanation", "")
+            }
+            for question in questions
+        ]
+        await bulk_insert(db, QuestionBankItem, rows)
+        return len(rows)
+
+    async def invalidate(self, db: AsyncSession, document_id: int):
+        """Drop a document's bank, e.g. when its text is re-extracted"""
+        await db.execute(delete(QuestionBankItem).where(QuestionBankItem.document_id == document_id))
+
+# Global instance
+question_bank_service = QuestionBankService()
@@ -1,32 +1,191 @@
+import asyncio
 import logging
-from typing import List, Dict, Any
-from sqlalchemy.orm import Session
+import math
+import re
+from typing import List, Dict, Any, Optional, Set
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer, selectinload
 
 from models import Quiz, QuizQuestion, PDFDocument
-from schemas import QuizGenerationRequest, QuestionType, QuizSubmissionRequest, QuestionResult
+from schemas import QuizGenerationRequest, QuestionType, QuizSubmissionRequest, QuizBatchSubmission
+from config import settings
+from database import SessionLocal, bulk_insert
+from services.analytics_service import analytics_service
+from services.answer_key_service import answer_key_service
 from services.gemini_service import gemini_service
+from services.pdf_processor import pdf_processor
+from services.question_bank_service import question_bank_service
 
 logger = logging.getLogger(__name__)
 
+QUESTION_BANK_DIFFICULTIES = ("easy", "medium", "hard")
+
 class QuizGeneratorService:
     def __init__(self):
-        pass
+        self.max_shards = settings.QUIZ_MAX_SHARDS
+        self.shard_min_chars = settings.QUIZ_SHARD_MIN_CHARS
+        self.duplicate_threshold = settings.QUIZ_DUPLICATE_THRESHOLD
+    
+    def build_shards(self, text: str, num_questions: int) -> List[str]:
+        """Split the document into contiguous sections, one generation call each, that together cover all of it"""
+        max_length = settings.MAX_CONTENT_LENGTH
+        # Enough shards for every section to fit in one prompt; never more calls than questions
+        count = max(math.ceil(len(text) / max_length), min(self.max_shards, math.ceil(len(text) / self.shard_min_chars)))
+        count = max(1, min(count, num_questions))
+        size = math.ceil(len(text) / count)
+        shards, start = [], 0
+        while start < len(text):
+            end = min(len(text), start + size)
+            # Prefer to cut at a line break so questions are not built on half a paragraph
+            newline = text.find("\n", end, end + 500)
+            if newline != -1:
+                end = newline
+            shards.append(self.sample_shard(text[start:end], max_length))
+            start = end
+        return [shard for shard in shards if shard.strip()]
+    
+    @staticmethod
+    def sample_shard(shard: str, max_length: int) -> str:
+        """Fit a section into one prompt with evenly spaced excerpts, rather than only its beginning"""
+        if len(shard) <= max_length:
+            return shard
+        parts = math.ceil(len(shard) / max_length) * 2
+        part_size = math.ceil(len(shard) / parts)
+        excerpt_size = max_length // parts - 5
+        excerpts = []
+        for offset in range(0, len(shard), part_size):
+            excerpt = shard[offset:offset + excerpt_size]
+            # Cut at a word boundary
+            excerpts.append(excerpt.rsplit(" ", 1)[0] if " " in excerpt else excerpt)
+        logger.info(f"Quiz shard of {len(shard)} chars sampled as {len(excerpts)} excerpts ({max_length / len(shard):.0%} of its text)")
+        return "\n[...]\n".join(excerpts)
+    
+    @staticmethod
+    def plan_shards(num_questions: int, question_types: List[str], num_shards: int) -> List[Dict[str, Any]]:
+        """Spread the question count and type mix over the shards"""
+        slots = [question_types[i % len(question_types)] for i in range(num_questions)]
+        plans = []
+        for index in range(num_shards):
+            shard_slots = slots[index::num_shards]
+            if shard_slots:
+                # Ask for one extra question per shard to make up for duplicates dropped later
+                plans.append({"shard": index, "num_questions": len(shard_slots) + 1, "question_types": sorted(set(shard_slots))})
+        return plans
+    
+    @staticmethod
+    def _question_words(text: str) -> Set[str]:
+        # Lowercased words with a plural/verb "s" stripped, so rewordings and reorderings compare equal
+        return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in re.findall(r"\w+", text.lower())}
+    
+    def _is_near_duplicate(self, words: Set[str], seen: List[Set[str]]) -> bool:
+        """Jaccard similarity of word sets; a swapped topic word in a templated question keeps it distinct"""
+        for other in seen:
+            union = words | other
+            if not union or len(words & other) / len(union) >= self.duplicate_threshold:
+                return True
+        return False
+    
+    def drop_duplicates(self, questions: List[Dict[str, Any]], seen: List[Set[str]]) -> List[Dict[str, Any]]:
+        """Keep well-formed questions that are not near duplicates of any seen so far; updates seen"""
+        kept = []
+        for question in questions:
+            if not isinstance(question, dict) or not question.get("question_text") or not question.get("correct_answer"):
+                continue
+            words = self._question_words(str(question["question_text"]))
+            if self._is_near_duplicate(words, seen):
+                continue
+            seen.append(words)
+            kept.append(question)
+        return kept
+    
+    def merge_questions(self, shard_questions: List[List[Dict[str, Any]]], num_questions: int) -> List[Dict[str, Any]]:
+        """Drop malformed and near-duplicate questions, then take questions round-robin across shards"""
+        seen: List[Set[str]] = []
+        unique = [self.drop_duplicates(questions, seen) for questions in shard_questions]
+        
+        # Round-robin keeps coverage spread over the document when there are more questions than needed
+        picked: List[tuple] = []
+        for position in range(max((len(kept) for kept in unique), default=0)):
+            for shard, kept in enumerate(unique):
+                if position < len(kept) and len(picked) < num_questions:
+                    picked.append((shard, position))
+        return [unique[shard][position] for shard, position in sorted(picked)]
+    
+    async def generate_questions(
+        self,
+        text: str,
+        num_questions: int,
+        question_types: List[str],
+        difficulty: str,
+        focus_topics: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Generate questions from all shards in parallel, returning whatever the successful shards produced"""
+        shards = self.build_shards(text, num_questions)
+        plans = self.plan_shards(num_questions, question_types, len(shards))
+        # Long documents get more shards than calls run at once
+        semaphore = asyncio.Semaphore(max(self.max_shards, 1))
+        
+        async def generate(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await gemini_service.generate_quiz_questions(
+                    text=shards[plan["shard"]],
+                    num_questions=plan["num_questions"],
+                    question_types=plan["question_types"],
+                    difficulty=difficulty,
+                    focus_topics=focus_topics
+                )
+        
+        results = await asyncio.gather(*(generate(plan) for plan in plans), return_exceptions=True)
+        
+        shard_questions = []
+        for plan, result in zip(plans, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Quiz shard {plan['shard'] + 1}/{len(plans)} failed: {str(result)}")
+                result = []
+            shard_questions.append(result)
+        
+        questions = self.merge_questions(shard_questions, num_questions)
+        logger.info(f"Generated {len(questions)}/{num_questions} quiz questions from {len(plans)} shards")
+        return questions
     
-    async def generate_quiz(self, request: QuizGenerationRequest, db: Session) -> Quiz:
+    async def generate_quiz(self, request: QuizGenerationRequest, db: AsyncSession) -> Quiz:
         """Generate a complete quiz from PDF content"""
         
-        document = db.query(PDFDocument).filter(PDFDocument.id == request.document_id).first()
+        document = await db.scalar(
+            select(PDFDocument).options(undefer(PDFDocument.extracted_text)).where(PDFDocument.id == request.document_id)
+        )
         if not document or not document.extracted_text:
             raise ValueError("No text content available for quiz generation")
         
         try:
             question_types_str = [qt.value for qt in request.question_types]
-            questions_data = await gemini_service.generate_quiz_questions(
-                text=str(document.extracted_text),
+            
+            # Assemble from the document's question bank first; the model only tops up what the bank lacks
+            questions_data = await question_bank_service.sample(
+                db,
+                document_id=request.document_id,
                 num_questions=request.num_questions,
                 question_types=question_types_str,
-                difficulty=request.difficulty
+                difficulty=request.difficulty,
+                focus_topics=request.focus_topics
             )
+            missing = request.num_questions - len(questions_data)
+            if missing > 0:
+                generated = await self.generate_questions(
+                    text=str(document.extracted_text),
+                    num_questions=missing,
+                    question_types=question_types_str,
+                    difficulty=request.difficulty,
+                    focus_topics=request.focus_topics
+                )
+                # Generated questions join the bank so the next quiz like this one needs no model call
+                seen = [self._question_words(str(question["question_text"])) for question in questions_data]
+                fresh = self.drop_duplicates(generated, seen)
+                await question_bank_service.add(db, request.document_id, request.difficulty, fresh)
+                questions_data = questions_data + fresh[:missing]
+                logger.info(f"Quiz for document {request.document_id}: {request.num_questions - missing} questions from the bank, {min(missing, len(fresh))} generated")
             
             if not questions_data:
                 raise ValueError("Failed to generate quiz questions")
@@ -37,77 +196,131 @@ class QuizGeneratorService:
                 description=f"Generated quiz from {document.original_filename}",
                 total_questions=len(questions_data)
             )
+            quiz.id, quiz.created_at = (await db.execute(
+                insert(Quiz).values(
+                    document_id=quiz.document_id,
+                    title=quiz.title,
+                    description=quiz.description,
+                    total_questions=quiz.total_questions
+                ).returning(Quiz.id, Quiz.created_at)
+            )).one()
             
-            db.add(quiz)
-            db.flush()
-            
-            for i, q_data in enumerate(questions_data):
-                db.add(QuizQuestion(
-                    quiz_id=quiz.id,
-                    question_type=q_data.get("question_type", "mcq"),
-                    question_text=q_data.get("question_text", ""),
-                    correct_answer=q_data.get("correct_answer", ""),
-                    options=q_data.get("options"),
-                    explanation=q_data.get("explanation", ""),
-                    order_index=i + 1
-                ))
+            # One multi-row INSERT ... RETURNING for all questions instead of a flush per object
+            question_rows = [
+                {
+                    "quiz_id": quiz.id,
+                    "question_type": q_data.get("question_type", "mcq"),
+                    "question_text": q_data.get("question_text", ""),
+                    "correct_answer": q_data.get("correct_answer", ""),
+                    "options": q_data.get("options"),
+                    "explanation": q_data.get("explanation", ""),
+                    "order_index": i + 1
+                }
+                for i, q_data in enumerate(questions_data)
+            ]
+            inserted = await bulk_insert(db, QuizQuestion, question_rows, returning=(QuizQuestion.id, QuizQuestion.created_at))
+            await db.commit()
             
-            db.commit()
-            db.refresh(quiz)
+            # Detached objects built from the returned keys; nothing is read back
+            quiz.questions = [
+                QuizQuestion(id=row.id, created_at=row.created_at, **values)
+                for row, values in zip(inserted, question_rows)
+            ]
             
             return quiz
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error generating quiz: {str(e)}")
             raise
     
-    def get_quiz_by_id(self, quiz_id: int, db: Session) -> Quiz:
-        quiz = db.query(Quiz).filter(Quiz.id == quiz_id).first()
+    async def build_question_bank(self, document_id: int):
+        """Fill a document's question bank for every difficulty and question type"""
+        async with SessionLocal() as db:
+            try:
+                document = await db.scalar(
+                    select(PDFDocument).options(undefer(PDFDocument.extracted_text)).where(PDFDocument.id == document_id)
+                )
+                if not document or not document.extracted_text:
+                    return
+                text = str(document.extracted_text)
+                
+                question_types = [question_type.value for question_type in QuestionType]
+                results = await asyncio.gather(*(
+                    self.generate_questions(text, settings.QUESTION_BANK_SIZE, question_types, difficulty)
+                    for difficulty in QUESTION_BANK_DIFFICULTIES
+                ), return_exceptions=True)
+                
+                added = 0
+                for difficulty, questions in zip(QUESTION_BANK_DIFFICULTIES, results):
+                    if isinstance(questions, Exception):
+                        logger.warning(f"Failed to build {difficulty} question bank for document {document_id}: {str(questions)}")
+                        continue
+                    added += await question_bank_service.add(db, document_id, difficulty, questions)
+                await db.commit()
+                logger.info(f"Question bank for document {document_id}: {added} questions")
+                
+            except Exception as e:
+                await db.rollback()
+                logger.warning(f"Failed to build question bank for document {document_id}: {str(e)}")
+    
+    async def get_quiz_by_id(self, quiz_id: int, db: AsyncSession) -> Quiz:
+        quiz = await db.scalar(select(Quiz).options(selectinload(Quiz.questions)).where(Quiz.id == quiz_id))
         if not quiz:
             raise ValueError("Quiz not found")
         return quiz
     
-    def get_quizzes_by_document(self, document_id: int, db: Session) -> List[Quiz]:
-        return db.query(Quiz).filter(Quiz.document_id == document_id).all()
+    async def get_quizzes_by_document(self, document_id: int, db: AsyncSession) -> List[Quiz]:
+        # Questions for all quizzes arrive in one extra query instead of one per quiz
+        result = await db.scalars(select(Quiz).options(selectinload(Quiz.questions)).where(Quiz.document_id == document_id))
+        return list(result)
     
-    def delete_quiz(self, quiz_id: int, db: Session) -> bool:
-        quiz = self.get_quiz_by_id(quiz_id, db)
-        db.delete(quiz)
-        db.commit()
+    async def delete_quiz(self, quiz_id: int, db: AsyncSession) -> bool:
+        quiz = await self.get_quiz_by_id(quiz_id, db)
+        await analytics_service.invalidate_quiz(db, quiz_id)
+        await db.delete(quiz)
+        await db.commit()
+        await answer_key_service.invalidate(quiz_id)
         return True
     
-    def check_answers(self, quiz_id: int, submission: QuizSubmissionRequest, db: Session) -> Dict[str, Any]:
-        quiz = self.get_quiz_by_id(quiz_id, db)
+    async def check_answers(self, quiz_id: int, submission: QuizSubmissionRequest, db: AsyncSession) -> Dict[str, Any]:
+        key = await answer_key_service.get(db, quiz_id)
+        graded = answer_key_service.grade(quiz_id, key, {ans.question_id: ans.answer for ans in submission.answers})
         
-        correct_count = 0
-        results: List[QuestionResult] = []
+        try:
+            (graded["attempt_id"],) = await analytics_service.record(db, [(submission.user_id, graded)])
+            await db.commit()
+        except IntegrityError:
+            # Deleted between the existence check and the insert
+            await db.rollback()
+            await answer_key_service.invalidate(quiz_id)
+            raise ValueError("Quiz not found")
+        return graded
+    
+    async def check_answers_batch(self, submissions: List[QuizBatchSubmission], db: AsyncSession) -> Dict[str, Any]:
+        """Grade many submissions, loading each quiz's answer key once"""
+        keys = await answer_key_service.get_many(db, [submission.quiz_id for submission in submissions])
         
-        user_answers = {ans.question_id: ans.answer for ans in submission.answers}
+        results = []
+        errors = []
+        attempts = []
+        for index, submission in enumerate(submissions):
+            key = keys.get(submission.quiz_id)
+            if key is None:
+                errors.append({"index": index, "quiz_id": submission.quiz_id, "error": "Quiz not found"})
+                continue
+            answers = {ans.question_id: ans.answer for ans in submission.answers}
+            graded = {"index": index, **answer_key_service.grade(submission.quiz_id, key, answers)}
+            results.append(graded)
+            attempts.append((submission.user_id, graded))
         
-        for question in quiz.questions:
-            user_answer = user_answers.get(question.id, "")
-            is_correct = user_answer.lower() == str(question.correct_answer).lower()
-            
-            if is_correct:
-                correct_count += 1
-            
-            results.append(QuestionResult(
-                question_id=question.id,
-                question_text=question.question_text,
-                user_answer=user_answer,
-                correct_answer=question.correct_answer,
-                is_correct=is_correct,
-                explanation=question.explanation
-            ))
+        # All attempts and their aggregate updates are written in one transaction
+        attempt_ids = await analytics_service.record(db, attempts)
+        await db.commit()
+        for graded, attempt_id in zip(results, attempt_ids):
+            graded["attempt_id"] = attempt_id
         
-        return {
-            "quiz_id": quiz_id,
-            "score": (correct_count / quiz.total_questions) * 100 if quiz.total_questions > 0 else 0,
-            "correct_answers": correct_count,
-            "total_questions": quiz.total_questions,
-            "results": results
-        }
+        return {"results": results, "errors": errors}
     
     def validate_quiz_request(self, request: QuizGenerationRequest) -> List[str]:
         errors = []
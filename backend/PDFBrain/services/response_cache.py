@@ -0,0 +1,234 @@
+import hashlib
+import json
+import logging
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# A cached question is stored as its id (a digest of the question) followed by its embedding as little-endian float16
+QUESTION_ID_BYTES = 16
+
+
+class MemoryBackend:
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def add_member(self, key: str, member: bytes, ttl: int, max_members: int):
+        """Add a member to a set in which each member expires on its own, keeping the max_members newest"""
+        now = time.monotonic()
+        members = {m: expires_at for m, expires_at in (await self.get(key) or {}).items() if expires_at > now}
+        members[member] = now + ttl
+        newest = sorted(members.items(), key=lambda item: item[1])[-max_members:]
+        await self.set(key, dict(newest), ttl)
+
+    async def members(self, key: str) -> List[bytes]:
+        """Unexpired members of a set built with add_member"""
+        now = time.monotonic()
+        return [member for member, expires_at in (await self.get(key) or {}).items() if expires_at > now]
+
+    async def close(self):
+        self._entries.clear()
+
+
+class RedisBackend:
+    """Redis-backed cache shared by every worker; eviction follows the server's maxmemory-policy"""
+
+    def __init__(self, url: str):
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int):
+        await self._client.set(key, json.dumps(value), ex=ttl)
+
+    async def delete(self, key: str):
+        await self._client.delete(key)
+
+    async def add_member(self, key: str, member: bytes, ttl: int, max_members: int):
+        """Add a member to a sorted set scored by expiry time, dropping expired members and all but the max_members newest"""
+        now = time.time()
+        # One transaction of single-key commands, so concurrent writers never overwrite each other's members
+        async with self._client.pipeline(transaction=True) as pipe:
+            pipe.zadd(key, {member: now + ttl})
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zremrangebyrank(key, 0, -max_members - 1)
+            pipe.expire(key, ttl)
+            await pipe.execute()
+
+    async def members(self, key: str) -> List[bytes]:
+        """Unexpired members of a set built with add_member"""
+        return await self._client.zrangebyscore(key, time.time(), "+inf")
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class ResponseCache:
+    """Caches Gemini results: exact keys for deterministic requests, embedding similarity for questions"""
+
+    def __init__(self):
+        self.ttl = settings.RESPONSE_CACHE_TTL
+        self.similarity_threshold = settings.RESPONSE_CACHE_SIMILARITY
+        self.questions_per_document = settings.RESPONSE_CACHE_QUESTIONS_PER_DOCUMENT
+        self.backend = self._create_backend(settings.RESPONSE_CACHE_BACKEND)
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _create_backend(self, name: str):
+        if name == "none":
+            return None
+        if name == "redis":
+            if redis is not None:
+                return RedisBackend(settings.REDIS_URL)
+            logger.warning("RESPONSE_CACHE_BACKEND=redis but the redis package is not installed, using the in-process cache")
+        return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @staticmethod
+    def make_key(namespace: str, *parts: Any) -> str:
+        digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+        return f"pdfbrain:{namespace}:{digest}"
+
+    def _record(self, namespace: str, hit: bool):
+        stats = self._stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+
+    async def _get(self, key: str) -> Optional[Any]:
+        # A cache outage must never fail the request it sits in front of
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            return None
+
+    async def _set(self, key: str, value: Any):
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+    async def get(self, namespace: str, *parts: Any) -> Optional[Any]:
+        """Look up an exact-key entry"""
+        if not self.enabled:
+            return None
+        value = await self._get(self.make_key(namespace, *parts))
+        self._record(namespace, value is not None)
+        return value
+
+    async def set(self, namespace: str, value: Any, *parts: Any):
+        """Store an exact-key entry"""
+        if self.enabled:
+            await self._set(self.make_key(namespace, *parts), value)
+
+    async def delete(self, namespace: str, *parts: Any):
+        """Drop an exact-key entry, e.g. when the data it was built from is deleted"""
+        if not self.enabled:
+            return
+        try:
+            await self.backend.delete(self.make_key(namespace, *parts))
+        except Exception as e:
+            logger.warning(f"Response cache delete failed: {str(e)}")
+
+    async def find_answer(self, document_key: str, embedding: List[float]) -> Optional[str]:
+        """Return a cached answer to a question close enough to the given normalized embedding"""
+        if not self.enabled:
+            return None
+        try:
+            members = await self.backend.members(self.make_key("questions", document_key))
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            members = []
+
+        best_score, best_id = 0.0, None
+        for member in members:
+            vector = struct.unpack(f"<{(len(member) - QUESTION_ID_BYTES) // 2}e", member[QUESTION_ID_BYTES:])
+            score = sum(a * b for a, b in zip(embedding, vector))
+            if score > best_score:
+                best_score, best_id = score, member[:QUESTION_ID_BYTES]
+
+        answer = None
+        if best_score >= self.similarity_threshold:
+            # Expires separately, so it may be gone even though its question was still listed
+            answer = await self._get(self.make_key("answers", document_key, best_id.hex()))
+        self._record("questions", answer is not None)
+        return answer
+
+    async def store_answer(self, document_key: str, question: str, embedding: List[float], answer: str):
+        """Remember an answer for similar questions about the same document"""
+        if not self.enabled:
+            return
+        question_id = hashlib.sha256(question.encode("utf-8")).digest()[:QUESTION_ID_BYTES]
+        await self._set(self.make_key("answers", document_key, question_id.hex()), answer)
+        try:
+            # Every question has its own expiry; the most recent questions_per_document are kept
+            await self.backend.add_member(
+                self.make_key("questions", document_key),
+                question_id + struct.pack(f"<{len(embedding)}e", *embedding),
+                self.ttl,
+                self.questions_per_document
+            )
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit and miss counts per namespace for this process"""
+        namespaces = {
+            namespace: {
+                **counts,
+                "hit_rate": round(counts["hits"] / (counts["hits"] + counts["misses"]), 4)
+            }
+            for namespace, counts in self._stats.items()
+        }
+        hits = sum(counts["hits"] for counts in self._stats.values())
+        lookups = hits + sum(counts["misses"] for counts in self._stats.values())
+        return {
+            "backend": "redis" if isinstance(self.backend, RedisBackend) else ("memory" if self.enabled else "none"),
+            "hits": hits,
+            "misses": lookups - hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "namespaces": namespaces
+        }
+
+    async def close(self):
+        if self.enabled:
+            await self.backend.close()
+
+# Global instance
+response_cache = ResponseCache()
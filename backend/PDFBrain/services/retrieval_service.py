@@ -0,0 +1,158 @@
+import logging
+import math
+import re
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from models import PDFDocument, DocumentChunk
+from services.gemini_service import gemini_service
+from services.pdf_processor import pdf_processor
+
+logger = logging.getLogger(__name__)
+
+# Numbered headings ("2.1 Methods", "Chapter 3", "Section IV") or short all-caps lines
+HEADING_PATTERN = re.compile(r"^((\d+(\.\d+)*\.?|(?i:chapter|section|part|unit))\s+\S.*|[A-Z][A-Z0-9 ,:&\-]{2,})$")
+
+
+class RetrievalService:
+    def __init__(self):
+        self.chunk_size = settings.CHUNK_SIZE
+        self.chunk_overlap = settings.CHUNK_OVERLAP
+        self.top_k = settings.RETRIEVAL_TOP_K
+
+    def build_chunks(self, pages: List[str], paged: bool = True) -> List[Dict[str, Any]]:
+        """Split per-page text into section-aware chunks that never span a page"""
+        chunks: List[Dict[str, Any]] = []
+        section: Optional[str] = None
+
+        for page_number, page_text in enumerate(pages, start=1):
+            for heading, body in self._split_sections(page_text):
+                section = heading or section
+                for piece in self._split_text(body):
+                    chunks.append({
+                        "chunk_index": len(chunks),
+                        "page_number": page_number if paged else None,
+                        "section": section,
+                        "content": piece
+                    })
+
+        return chunks
+
+    def _split_sections(self, text: str) -> List[Tuple[Optional[str], str]]:
+        """Split page text on heading-like lines, returning (heading, body) pairs"""
+        sections: List[Tuple[Optional[str], str]] = []
+        heading: Optional[str] = None
+        body: List[str] = []
+
+        for line in text.splitlines():
+            stripped = line.strip()
+            if stripped and len(stripped) <= 80 and HEADING_PATTERN.match(stripped) and not stripped.endswith((".", ",", ";")):
+                if any(part.strip() for part in body):
+                    sections.append((heading, "\n".join(body)))
+                heading, body = stripped, [line]
+            else:
+                body.append(line)
+
+        if any(part.strip() for part in body):
+            sections.append((heading, "\n".join(body)))
+
+        return sections
+
+    def _split_text(self, text: str) -> List[str]:
+        """Pack words into chunks of at most chunk_size characters with overlap"""
+        words = text.split()
+        pieces: List[str] = []
+        current: List[str] = []
+        length = 0
+
+        for word in words:
+            if current and length + len(word) + 1 > self.chunk_size:
+                pieces.append(" ".join(current))
+                # Carry the tail of the previous chunk over so answers spanning the cut stay retrievable
+                tail: List[str] = []
+                tail_length = 0
+                for previous in reversed(current):
+                    if tail_length + len(previous) + 1 > self.chunk_overlap:
+                        break
+                    tail.insert(0, previous)
+                    tail_length += len(previous) + 1
+                current, length = tail, tail_length
+            current.append(word)
+            length += len(word) + 1
+
+        if current:
+            pieces.append(" ".join(current))
+
+        return pieces
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> List[float]:
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    async def index_document(self, document_id: int, pages: List[str], db: AsyncSession, paged: bool = True) -> int:
+        """Chunk and embed a document, replacing any existing index for it"""
+        chunks = self.build_chunks(pages, paged=paged)
+        if not chunks:
+            return 0
+
+        embeddings = await gemini_service.embed_texts([chunk["content"] for chunk in chunks])
+
+        await db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document_id))
+        db.add_all(
+            DocumentChunk(document_id=document_id, embedding=self._normalize(embedding), **chunk)
+            for chunk, embedding in zip(chunks, embeddings)
+        )
+        await db.commit()
+
+        logger.info(f"Indexed document {document_id}: {len(chunks)} chunks")
+        return len(chunks)
+
+    async def embed_query(self, question: str) -> List[float]:
+        """Embed a question as a normalized query vector"""
+        return self._normalize((await gemini_service.embed_texts([question], task_type="RETRIEVAL_QUERY"))[0])
+
+    async def retrieve_context(self, document: PDFDocument, question: str, db: AsyncSession, query: Optional[List[float]] = None) -> str:
+        """Return the top-k chunks relevant to the question, falling back to truncation"""
+        # Read these up front: a rollback expires the document and it cannot lazy-load in an async session
+        document_id = document.id
+        extracted_text = str(document.extracted_text)
+        statement = select(DocumentChunk).where(DocumentChunk.document_id == document_id)
+        try:
+            chunks = (await db.scalars(statement)).all()
+            if not chunks:
+                # Documents uploaded before the index existed are indexed on first use
+                await self.index_document(document_id, [extracted_text], db, paged=False)
+                chunks = (await db.scalars(statement)).all()
+
+            if query is None:
+                query = await self.embed_query(question)
+            scored = [
+                (sum(a * b for a, b in zip(query, chunk.embedding)), chunk)
+                for chunk in chunks if chunk.embedding
+            ]
+            top = sorted(scored, key=lambda item: item[0], reverse=True)[:self.top_k]
+            if not top:
+                raise ValueError("no embedded chunks available")
+
+            # Present the selected chunks in document order
+            return "\n\n".join(
+                self._format_chunk(chunk)
+                for _, chunk in sorted(top, key=lambda item: item[1].chunk_index)
+            )
+
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"Retrieval failed for document {document_id}, falling back to truncation: {str(e)}")
+            return pdf_processor.truncate_text_for_ai(extracted_text)
+
+    def _format_chunk(self, chunk: DocumentChunk) -> str:
+        label = f"[Page {chunk.page_number}]" if chunk.page_number else "[Excerpt]"
+        if chunk.section:
+            label = f"{label} {chunk.section}"
+        return f"{label}\n{chunk.content}"
+
+# Global instance
+retrieval_service = RetrievalService()
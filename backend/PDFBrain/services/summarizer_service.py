@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Tuple
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from config import settings
+from database import SessionLocal
+from models import SummaryPart
+from services.gemini_service import gemini_service
+from services.pdf_processor import pdf_processor
+
+logger = logging.getLogger(__name__)
+
+# A reused part's last_used is only rewritten once it is this old, so reads rarely cost a write
+TOUCH_INTERVAL = timedelta(days=1)
+# Seconds between sweeps for unused parts in one process
+PRUNE_INTERVAL = 3600
+
+
+class SummarizerService:
+    """Summarizes documents of any length: single-shot when they fit, map-reduce over page groups otherwise"""
+
+    def __init__(self):
+        self.max_length = settings.MAX_CONTENT_LENGTH
+        self.pages_per_chunk = settings.SUMMARY_PAGES_PER_CHUNK
+        self.fan_out = settings.SUMMARY_FAN_OUT
+        self.part_ttl = timedelta(days=settings.SUMMARY_PART_TTL_DAYS)
+        self._pruned_at = None
+
+    def build_sections(self, pages: List[str]) -> List[Tuple[str, str]]:
+        """Group pages into (label, text) sections that each fit in one prompt"""
+        sections = []
+        for start in range(0, len(pages), self.pages_per_chunk):
+            group = pages[start:start + self.pages_per_chunk]
+            label = f"pages {start + 1}-{start + len(group)}"
+            text = pdf_processor.join_pages(group)
+            if len(text) <= self.max_length:
+                sections.append((label, text))
+                continue
+            # Very dense pages (or legacy documents stored as one page) are cut into fixed windows
+            for index, offset in enumerate(range(0, len(text), self.max_length), start=1):
+                sections.append((f"{label}, part {index}", text[offset:offset + self.max_length]))
+        return [(label, text) for label, text in sections if text.strip()]
+
+    async def _cached(self, step: str, inputs: List[str], generate: Callable[[int], Awaitable[str]]) -> List[str]:
+        """Results of one summarization step per input, calling generate(index) only for inputs not stored before"""
+        model = gemini_service.default_model
+        digests = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in inputs]
+        async with SessionLocal() as db:
+            stored = dict((await db.execute(
+                select(SummaryPart.input_hash, SummaryPart.summary).where(
+                    SummaryPart.model == model,
+                    SummaryPart.step == step,
+                    SummaryPart.input_hash.in_(set(digests))
+                )
+            )).all())
+            if stored:
+                now = datetime.utcnow()
+                await db.execute(
+                    update(SummaryPart).where(
+                        SummaryPart.model == model,
+                        SummaryPart.step == step,
+                        SummaryPart.input_hash.in_(set(stored)),
+                        or_(SummaryPart.last_used.is_(None), SummaryPart.last_used < now - TOUCH_INTERVAL)
+                    ).values(last_used=now)
+                )
+                await db.commit()
+
+        # Identical inputs (repeated boilerplate pages) are generated once
+        missing = {digest: index for index, digest in enumerate(digests) if digest not in stored}
+        if missing:
+            results = await asyncio.gather(*(generate(index) for index in missing.values()), return_exceptions=True)
+            generated = {digest: result for digest, result in zip(missing, results) if not isinstance(result, BaseException)}
+            if generated:
+                # Kept even if other inputs failed, so a retry only re-runs those
+                async with SessionLocal() as db:
+                    dialect = sqlite if db.bind.dialect.name == "sqlite" else postgresql
+                    await db.execute(dialect.insert(SummaryPart).on_conflict_do_nothing(), [
+                        {"model": model, "step": step, "input_hash": digest, "summary": summary}
+                        for digest, summary in generated.items()
+                    ])
+                    await db.commit()
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            stored.update(generated)
+        return [stored[digest] for digest in digests]
+
+    async def summarize(self, pages: List[str]) -> str:
+        """Summarize a document from its per-page text"""
+        text = pdf_processor.join_pages(pages)
+        if len(text) <= self.max_length:
+            return await gemini_service.generate_summary(text)
+
+        start = time.perf_counter()
+        usage = dict(gemini_service.token_usage)
+        semaphore = asyncio.Semaphore(self.fan_out)
+
+        async def bounded(call: Callable[[], Awaitable[str]]) -> str:
+            async with semaphore:
+                return await call()
+
+        # Map: section summaries are stored by content, so an edit only re-summarizes the sections it touched
+        sections = self.build_sections(pages)
+        summaries = await self._cached(
+            "section",
+            [section for _, section in sections],
+            lambda index: bounded(lambda: gemini_service.summarize_section(sections[index][1], sections[index][0]))
+        )
+
+        summary = await self._reduce(summaries, bounded)
+
+        # Token counts are process-wide, so concurrent calls elsewhere are included
+        calls = gemini_service.token_usage["calls"] - usage["calls"]
+        prompt_tokens = gemini_service.token_usage["prompt_tokens"] - usage["prompt_tokens"]
+        output_tokens = gemini_service.token_usage["output_tokens"] - usage["output_tokens"]
+        logger.info(
+            f"Map-reduce summary of {len(text)} chars: {len(sections)} sections, {calls} model calls, "
+            f"{prompt_tokens} prompt + {output_tokens} output tokens in {time.perf_counter() - start:.1f}s"
+        )
+
+        if self._pruned_at is None or time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+            self._pruned_at = time.monotonic()
+            try:
+                await self.prune()
+            except Exception as e:
+                logger.warning(f"Failed to prune summary parts: {str(e)}")
+        return summary
+
+    async def prune(self) -> int:
+        """Delete stored parts no summary has used within the TTL (parts are shared by content, so not tied to a document)"""
+        cutoff = datetime.utcnow() - self.part_ttl
+        async with SessionLocal() as db:
+            result = await db.execute(delete(SummaryPart).where(or_(
+                SummaryPart.last_used < cutoff,
+                # Stored before last_used was tracked
+                and_(SummaryPart.last_used.is_(None), SummaryPart.created_at < cutoff)
+            )))
+            await db.commit()
+        if result.rowcount:
+            logger.info(f"Pruned {result.rowcount} summary parts unused for {self.part_ttl.days} days")
+        return result.rowcount
+
+    async def _reduce(self, summaries: List[str], bounded) -> str:
+        """Combine summaries, in rounds of prompt-sized groups until one prompt holds them all"""
+        while sum(len(summary) for summary in summaries) > self.max_length and len(summaries) > 1:
+            groups, group, size = [], [], 0
+            for summary in summaries:
+                if group and size + len(summary) > self.max_length:
+                    groups.append(group)
+                    group, size = [], 0
+                group.append(summary)
+                size += len(summary)
+            groups.append(group)
+
+            if len(groups) == len(summaries):
+                # Every summary fills a prompt on its own; cut them down rather than loop forever
+                summaries = [summary[:self.max_length // len(summaries)] for summary in summaries]
+                break
+
+            summaries = await self._cached(
+                "reduce",
+                ["\x1f".join(group) for group in groups],
+                lambda index: bounded(lambda: gemini_service.combine_summaries(groups[index], final=False))
+            )
+
+        final = await self._cached(
+            "final", ["\x1f".join(summaries)], lambda index: gemini_service.combine_summaries(summaries, final=True)
+        )
+        return final[0]
+
+# Global instance
+summarizer_service = SummarizerService()
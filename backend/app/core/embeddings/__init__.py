@@ -0,0 +1,4 @@
+from .cache import EmbeddingCache
+from .embedings import EmbeddingBatcher, EmbeddingService, embedding_service
+
+__all__ = ["EmbeddingBatcher", "EmbeddingCache", "EmbeddingService", "embedding_service"]
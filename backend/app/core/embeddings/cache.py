@@ -0,0 +1,223 @@
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List
+
+# memory: LRU only; disk: LRU plus a SQLite file; redis: LRU plus Redis (shared by workers); none: off
+CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "disk")
+CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/embedding_cache.sqlite3")
+# ~0.9KB per 384-d entry; least recently used entries beyond this are evicted, whichever model wrote them
+CACHE_DISK_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", "500000"))
+CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600)))  # Redis only
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Bump when a model is swapped under the same name (fine-tune, new revision)
+MODEL_REVISION = os.getenv("EMBEDDING_MODEL_REVISION", "")
+
+
+def normalize_text(text: str) -> str:
+    """Texts that only differ in Unicode form or whitespace share one entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def pack(vector: List[float]) -> bytes:
+    # float16: 768 bytes for a 384-d vector, against 1.5KB as float32 and ~12KB as a list of Python floats
+    return struct.pack(f"<{len(vector)}e", *vector)
+
+
+def unpack(data: bytes) -> List[float]:
+    return list(struct.unpack(f"<{len(data) // 2}e", data))
+
+
+class SQLiteTier:
+    """On-disk tier, bounded to max_entries by evicting the least recently used rows.
+
+    Keys already include the model, so processes with different models or backends can share
+    the file; their entries age out instead of being deleted when another one opens it.
+    """
+
+    # Only so many rows are written between size checks, so a check is not a count per write
+    CHECK_EVERY = 1000
+
+    def __init__(self, path: str, model: str, max_entries: int = CACHE_DISK_MAX_ENTRIES):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+            if "last_used" not in columns:
+                # Files written before eviction existed; their rows count as least recently used
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self.model = model
+        self.max_entries = max_entries
+        self._written = self.CHECK_EVERY  # Check the size on the first write
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        with self._lock, self._conn:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for offset in range(0, len(keys), 500):
+                chunk = keys[offset:offset + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk).fetchall()
+                if rows:
+                    hits = [key for key, _ in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hits))})", [int(time.time()), *hits]
+                    )
+                found.update(rows)
+        return found
+
+    def set_many(self, items: Dict[str, bytes]):
+        now = int(time.time())
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(key, self.model, data, now) for key, data in items.items()]
+            )
+            self._written += len(items)
+            if self._written >= self.CHECK_EVERY:
+                self._written = 0
+                excess = self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    # Trim a little below the bound, so the next check does not evict again right away
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (excess + self.max_entries // 10,)
+                    )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+
+class RedisTier:
+    """Shared tier; entries expire after CACHE_TTL, so other models' keys age out on their own"""
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        return {key: data for key, data in zip(keys, self._client.mget(keys)) if data is not None}
+
+    def set_many(self, items: Dict[str, bytes]):
+        pipeline = self._client.pipeline(transaction=False)
+        for key, data in items.items():
+            pipeline.set(key, data, ex=CACHE_TTL)
+        pipeline.execute()
+
+    def __len__(self) -> int:
+        return 0  # Not counted; the keyspace is shared with other data
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: (model, normalized text hash) -> float16 vector"""
+
+    def __init__(self, model_name: str, backend: str = CACHE_BACKEND, max_entries: int = CACHE_MAX_ENTRIES):
+        self.model = f"{model_name}@{MODEL_REVISION}" if MODEL_REVISION else model_name
+        self.backend = backend
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tier = None
+        self._tier_lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend != "none"
+
+    @property
+    def tier(self):
+        """The second tier, opened on first use; None if off or unavailable"""
+        if self._tier is None and self.backend in ("disk", "redis"):
+            with self._tier_lock:
+                if self._tier is None:
+                    try:
+                        self._tier = RedisTier(REDIS_URL) if self.backend == "redis" else SQLiteTier(CACHE_PATH, self.model)
+                    except Exception as e:
+                        print(f"Embedding cache {self.backend} tier unavailable, using memory only: {e}")
+                        self.backend = "memory"
+        return self._tier
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(f"{self.model}\x1f{normalize_text(text)}".encode("utf-8")).hexdigest()
+        return f"embedding:{digest}"
+
+    def _remember(self, items: Dict[str, bytes]):
+        with self._lock:
+            for key, data in items.items():
+                self._memory[key] = data
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, texts: List[str]) -> Dict[str, List[float]]:
+        """Cached vectors for whichever of the texts have one, keyed by text"""
+        if not self.enabled or not texts:
+            return {}
+        keys = {text: self.key(text) for text in texts}
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            for key in set(keys.values()):
+                data = self._memory.get(key)
+                if data is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = data
+        memory_hits = len(found)
+
+        missing = [key for key in set(keys.values()) if key not in found]
+        if missing and self.tier is not None:
+            try:
+                promoted = self.tier.get_many(missing)
+            except Exception as e:
+                print(f"Embedding cache read failed: {e}")
+                promoted = {}
+            self._remember(promoted)
+            found.update(promoted)
+
+        with self._lock:
+            self.counters["memory_hits"] += memory_hits
+            self.counters["persistent_hits"] += len(found) - memory_hits
+            self.counters["misses"] += len(set(keys.values())) - len(found)
+        return {text: unpack(found[key]) for text, key in keys.items() if key in found}
+
+    def set_many(self, vectors: Dict[str, List[float]]) -> Dict[str, List[float]]:
+        """Store vectors by text; returns them as stored (float16-rounded) so hits and misses agree"""
+        if not self.enabled or not vectors:
+            return vectors
+        keys = {text: self.key(text) for text in vectors}
+        items = {keys[text]: pack(vector) for text, vector in vectors.items()}
+        self._remember(items)
+        if self.tier is not None:
+            try:
+                self.tier.set_many(items)
+            except Exception as e:
+                print(f"Embedding cache write failed: {e}")
+        return {text: unpack(items[key]) for text, key in keys.items()}
+
+    def stats(self) -> Dict:
+        lookups = sum(self.counters.values())
+        hits = self.counters["memory_hits"] + self.counters["persistent_hits"]
+        return {
+            "model": self.model,
+            "backend": self.backend,
+            **self.counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "persistent_entries": len(self.tier) if self.tier is not None else 0
+        }
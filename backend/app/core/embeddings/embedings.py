@@ -0,0 +1,159 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from .cache import EmbeddingCache
+from .models import DEFAULT_MODEL_NAME, EMBEDDING_BACKEND, load_embedding_model
+
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """Collects single-text requests from any thread into micro-batches encoded on one worker thread"""
+
+    def __init__(self, encode: Callable[[List[str]], List[List[float]]], max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "texts": 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self, first) -> list:
+        """Take whatever is already queued, then wait up to max_wait for the batch to fill"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if item is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [(text, future) for text, future in self._collect(item) if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                vectors = self._encode([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def close(self):
+        """Stop the worker after the requests already queued"""
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+
+class EmbeddingService:
+    """Sentence embeddings; the model is loaded on first use (or by warm_up), never at import"""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME, backend: str = EMBEDDING_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self._model = None
+        self._lock = threading.Lock()
+        # Concurrent single-text calls share one encode call instead of one each
+        self.batcher = EmbeddingBatcher(self.encode)
+        # Repeated texts skip the model entirely; quantized vectors differ slightly, so each backend has its own entries
+        self.cache = EmbeddingCache(model_name if backend == "torch" else f"{model_name}:{backend}")
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = load_embedding_model(self.model_name, self.backend)
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def warm_up(self) -> float:
+        """Load the model and run one encode so the first request pays neither; returns seconds taken"""
+        start = time.perf_counter()
+        self.generate_embedding("warm up")
+        return time.perf_counter() - start
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """Encode a list of texts in one forward pass per batch_size texts"""
+        if not texts:
+            return []
+        return self.model.encode(texts, batch_size=min(len(texts), MAX_BATCH_SIZE)).tolist()
+
+    def generate_embedding(self, text: str) -> List[float]:
+        cached = self.cache.get_many([text]).get(text)
+        if cached is not None:
+            return cached
+        return self.cache.set_many({text: self.batcher.embed(text)})[text]
+
+    async def agenerate_embedding(self, text: str) -> List[float]:
+        # The second cache tier does blocking I/O, so lookups and writes run off the event loop
+        cached = (await asyncio.to_thread(self.cache.get_many, [text])).get(text)
+        if cached is not None:
+            return cached
+        vector = await self.batcher.aembed(text)
+        return (await asyncio.to_thread(self.cache.set_many, {text: vector}))[text]
+
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # Already a batch; only texts not in the cache are encoded, each distinct text once
+        vectors = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        if missing:
+            vectors.update(self.cache.set_many(dict(zip(missing, self.encode(missing)))))
+        return [vectors[text] for text in texts]
+
+    def close(self):
+        self.batcher.close()
+
+embedding_service = EmbeddingService()
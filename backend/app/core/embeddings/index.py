@@ -0,0 +1,337 @@
+import base64
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, so only run one writing process there
+    fcntl = None
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "data/vector_index")
+# Above this many vectors "auto" switches from brute force to HNSW (when chromadb is installed)
+HNSW_THRESHOLD = int(os.getenv("VECTOR_INDEX_HNSW_THRESHOLD", "200000"))
+# Once the change log passes this size the next write folds it into a new snapshot
+COMPACT_BYTES = int(os.getenv("VECTOR_INDEX_COMPACT_BYTES", str(64 * 1024 * 1024)))
+
+
+def _restore_id(id_):
+    # JSON turns tuple ids (e.g. document id and chunk position) into lists
+    return tuple(id_) if isinstance(id_, list) else id_
+
+
+class NumpyIndex:
+    """Exact cosine search over a normalized float32 matrix, persisted as a memory-mapped .npy
+    snapshot plus an append-only log of the changes made since.
+
+    A write appends one log record, so its cost does not grow with the index. Every process
+    sharing the directory (uvicorn workers) replays records the others appended before it
+    searches or writes. save() folds the log into a new snapshot; writes do so on their own
+    once the log passes COMPACT_BYTES.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._ids: List[Any] = []
+        self._positions: Dict[Any, int] = {}
+        self._metadata: List[Dict[str, Any]] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._buffer = self._vectors  # Spare rows beyond _vectors for appends
+        self._lock = threading.Lock()
+        # Held while catching up with the files, so two threads never replay the same records
+        self._sync_lock = threading.Lock()
+        self._snapshot = None  # (inode, mtime) of the vectors.npy that is loaded
+        self._log_offset = 0  # Bytes of the log already applied
+        if path:
+            self.refresh()
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._ids)
+
+    def ids(self) -> List[Any]:
+        self.refresh()
+        return list(self._ids)
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Exclusive for appending or compacting; shared for reading a snapshot and log that must match"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("index.lock"), "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _apply_upsert(self, ids: Sequence[Any], vectors: np.ndarray, metadata: Sequence[Dict[str, Any]]):
+        rows = {id_: (vector, meta) for id_, vector, meta in zip(ids, vectors, metadata)}  # Last one wins
+        with self._lock:
+            count = len(self._ids)
+            new_ids = [id_ for id_ in rows if id_ not in self._positions]
+            buffer = self._buffer
+            if not buffer.flags.writeable or buffer.shape[1] != vectors.shape[1] or count + len(new_ids) > len(buffer):
+                # Grown by doubling, so appending is amortized O(1) rather than a copy of the whole matrix
+                buffer = np.empty((max(2 * count, count + len(new_ids), 1024), vectors.shape[1]), dtype=np.float32)
+                if count:
+                    buffer[:count] = self._vectors
+            # Rows past `count` are not visible to searches in flight, which hold the shorter view
+            for offset, id_ in enumerate(new_ids):
+                buffer[count + offset] = rows[id_][0]
+            metadata_list = self._metadata + [rows[id_][1] for id_ in new_ids]
+            for id_, (vector, meta) in rows.items():
+                position = self._positions.get(id_)
+                if position is not None:
+                    buffer[position] = vector
+                    metadata_list[position] = meta
+            self._positions.update({id_: count + offset for offset, id_ in enumerate(new_ids)})
+            self._buffer = buffer
+            self._vectors = buffer[:count + len(new_ids)]
+            self._ids = self._ids + new_ids
+            self._metadata = metadata_list
+
+    def _apply_remove(self, ids: Sequence[Any]):
+        with self._lock:
+            drop = {self._positions[id_] for id_ in ids if id_ in self._positions}
+            if not drop:
+                return
+            keep = [position for position in range(len(self._ids)) if position not in drop]
+            self._vectors = self._buffer = self._vectors[keep]
+            self._ids = [self._ids[position] for position in keep]
+            self._metadata = [self._metadata[position] for position in keep]
+            self._positions = {id_: position for position, id_ in enumerate(self._ids)}
+
+    def _write(self, record: Dict[str, Any], apply):
+        """Apply a change here and, for a persisted index, append it to the log for other processes"""
+        if not self.path:
+            apply()
+            return
+        with self._sync_lock, self._file_lock():
+            self._catch_up()
+            with open(self._file("log.jsonl"), "ab") as f:
+                f.write((json.dumps(record) + "\n").encode("utf-8"))
+                # Past our own record (and any torn one a crashed writer left before it)
+                self._log_offset = f.tell()
+            apply()
+            if self._log_offset > COMPACT_BYTES:
+                self._compact()
+
+    def upsert(self, ids: Sequence[Any], vectors, metadata: Optional[Sequence[Dict[str, Any]]] = None):
+        if not len(ids):
+            return
+        vectors = self._normalize(vectors)
+        if len(self._ids) and vectors.shape[1] != self._vectors.shape[1]:
+            # Checked before the record is logged, where it would break every replay
+            raise ValueError(f"Expected {self._vectors.shape[1]}-dimensional vectors, got {vectors.shape[1]}")
+        metadata = list(metadata) if metadata is not None else [{} for _ in ids]
+        record = {
+            "op": "upsert",
+            "ids": list(ids),
+            "dim": vectors.shape[1],
+            "vectors": base64.b64encode(vectors.tobytes()).decode("ascii"),
+            "metadata": metadata
+        }
+        self._write(record, lambda: self._apply_upsert(ids, vectors, metadata))
+
+    def remove(self, ids: Sequence[Any]):
+        if not len(ids):
+            return
+        self._write({"op": "remove", "ids": list(ids)}, lambda: self._apply_remove(ids))
+
+    def _replay(self, record: Dict[str, Any]):
+        ids = [_restore_id(id_) for id_ in record["ids"]]
+        if record["op"] == "remove":
+            self._apply_remove(ids)
+            return
+        vectors = np.frombuffer(base64.b64decode(record["vectors"]), dtype=np.float32).reshape(-1, record["dim"])
+        self._apply_upsert(ids, vectors, record["metadata"])
+
+    def _snapshot_stat(self):
+        try:
+            stat = os.stat(self._file("vectors.npy"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _log_size(self) -> int:
+        try:
+            return os.path.getsize(self._file("log.jsonl"))
+        except FileNotFoundError:
+            return 0
+
+    def _catch_up(self):
+        """Load a snapshot written by another process, then apply log records not applied yet"""
+        snapshot = self._snapshot_stat()
+        log_size = self._log_size()
+        # A shorter log than already applied means it was compacted into a new snapshot
+        if snapshot != self._snapshot or log_size < self._log_offset:
+            self._load_snapshot()
+            snapshot, log_size = self._snapshot, self._log_size()
+        if log_size <= self._log_offset:
+            return
+        with open(self._file("log.jsonl"), "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(log_size - self._log_offset)
+        # Only whole lines; a record still being written is picked up next time
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn record of a writer that crashed mid-append
+            self._replay(record)
+        self._log_offset += len(complete)
+
+    def refresh(self):
+        """Pick up changes other processes made; a stat of two files when there are none"""
+        if not self.path:
+            return
+        if self._snapshot_stat() == self._snapshot and self._log_size() == self._log_offset:
+            return
+        with self._sync_lock, self._file_lock(shared=True):
+            self._catch_up()
+
+    def search(self, query, limit: int = 5) -> List[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            vectors, ids, metadata = self._vectors, self._ids, self._metadata
+        if not ids:
+            return []
+        scores = vectors @ self._normalize(query)[0]
+        limit = min(limit, len(ids))
+        # Partial sort: only the top `limit` scores are ordered
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [{"id": ids[i], **metadata[i], "similarity": float(scores[i])} for i in top]
+
+    def _compact(self):
+        """Write everything as a new snapshot and empty the log; needs the exclusive file lock"""
+        with self._lock:
+            vectors, ids, metadata = self._vectors, self._ids, self._metadata
+        # Written under temporary names and renamed, so a reader never maps a half-written file
+        np.save(self._file("vectors.tmp.npy"), vectors)
+        with open(self._file("items.tmp.json"), "w") as f:
+            json.dump({"ids": ids, "metadata": metadata}, f)
+        os.replace(self._file("items.tmp.json"), self._file("items.json"))
+        os.replace(self._file("vectors.tmp.npy"), self._file("vectors.npy"))
+        open(self._file("log.jsonl"), "wb").close()
+        self._snapshot = self._snapshot_stat()
+        self._log_offset = 0
+
+    def save(self):
+        """Fold the log into a new snapshot, e.g. after a bulk load"""
+        if not self.path:
+            return
+        with self._sync_lock, self._file_lock():
+            self._catch_up()
+            self._compact()
+
+    def _load_snapshot(self):
+        snapshot = self._snapshot_stat()
+        ids, metadata = [], []
+        vectors = np.zeros((0, 0), dtype=np.float32)
+        if snapshot is not None:
+            with open(self._file("items.json")) as f:
+                items = json.load(f)
+            ids = [_restore_id(id_) for id_ in items["ids"]]
+            metadata = items["metadata"]
+            # Pages are read on demand, so loading a large index is instant and shared between workers
+            vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+        with self._lock:
+            self._vectors = self._buffer = vectors
+            self._ids, self._metadata = ids, metadata
+            self._positions = {id_: position for position, id_ in enumerate(ids)}
+        self._snapshot = snapshot
+        self._log_offset = 0
+
+    def load(self):
+        """Reload the snapshot and log from disk"""
+        with self._sync_lock, self._file_lock(shared=True):
+            self._load_snapshot()
+            self._catch_up()
+
+
+class ChromaIndex:
+    """Approximate (HNSW) cosine search in a persistent chromadb collection"""
+
+    def __init__(self, path: Optional[str] = None, collection: str = "posts"):
+        import chromadb
+
+        client = chromadb.PersistentClient(path=path) if path else chromadb.EphemeralClient()
+        # A wider search beam than the default (10) keeps recall close to exact for top-10 queries
+        self._collection = client.get_or_create_collection(
+            collection,
+            metadata={"hnsw:space": "cosine", "hnsw:construction_ef": 200, "hnsw:search_ef": 100}
+        )
+
+    def __len__(self) -> int:
+        return self._collection.count()
+
+    def ids(self) -> List[Any]:
+        return [json.loads(id_) for id_ in self._collection.get(include=[])["ids"]]
+
+    def upsert(self, ids: Sequence[Any], vectors, metadata: Optional[Sequence[Dict[str, Any]]] = None):
+        if not len(ids):
+            return
+        self._collection.upsert(
+            ids=[json.dumps(id_) for id_ in ids],
+            embeddings=np.asarray(vectors, dtype=np.float32).tolist(),
+            metadatas=[meta or None for meta in metadata] if metadata is not None else None
+        )
+
+    def remove(self, ids: Sequence[Any]):
+        if len(ids):
+            self._collection.delete(ids=[json.dumps(id_) for id_ in ids])
+
+    def search(self, query, limit: int = 5) -> List[Dict[str, Any]]:
+        if not len(self):
+            return []
+        result = self._collection.query(
+            query_embeddings=[np.asarray(query, dtype=np.float32).tolist()],
+            n_results=min(limit, len(self)),
+            include=["metadatas", "distances"]
+        )
+        return [
+            {"id": json.loads(id_), **(meta or {}), "similarity": 1 - distance}
+            for id_, meta, distance in zip(result["ids"][0], result["metadatas"][0], result["distances"][0])
+        ]
+
+    def save(self):
+        # PersistentClient writes through on every change
+        pass
+
+
+def create_index(kind: str = "auto", collection: str = "posts", size_hint: int = 0):
+    """Build the local index for a collection: "numpy", "chroma", or "auto" by expected size"""
+    if kind == "auto" and VECTOR_INDEX_DIR:
+        # Reopen whichever index was persisted before
+        for persisted in ("chroma", "numpy"):
+            if os.path.isdir(os.path.join(VECTOR_INDEX_DIR, persisted, collection)):
+                kind = persisted
+                break
+    if kind == "auto":
+        kind = "chroma" if size_hint > HNSW_THRESHOLD else "numpy"
+        if kind == "chroma":
+            try:
+                import chromadb  # noqa: F401
+            except ImportError:
+                kind = "numpy"
+    path = os.path.join(VECTOR_INDEX_DIR, kind, collection) if VECTOR_INDEX_DIR else None
+    if kind == "chroma":
+        return ChromaIndex(path, collection)
+    return NumpyIndex(path)
@@ -0,0 +1,108 @@
+import os
+from typing import List, Tuple, Union
+
+# all-MiniLM-L6-v2 produces the 384-dimensional vectors stored in posts.embedding
+DEFAULT_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# torch: sentence-transformers on PyTorch; onnx: the same weights on ONNX Runtime;
+# onnx-int8: ONNX Runtime with weights dynamically quantized to int8
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "data/onnx")
+ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0: one per core
+# sentence-transformers truncates all-MiniLM-L6-v2 inputs at 256 tokens
+MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "256"))
+
+
+def load_sentence_transformer(model_name: str = DEFAULT_MODEL_NAME):
+    """Import sentence-transformers (and torch) only when a model is actually needed"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+class OnnxEmbeddingModel:
+    """Mean-pooled, L2-normalized embeddings from an ONNX export, the same pipeline as sentence-transformers"""
+
+    def __init__(self, model_path: str, tokenizer_path: str, max_seq_length: int = MAX_SEQ_LENGTH):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self._np = np
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0, pad_token="[PAD]")
+
+    def _encode_batch(self, texts: List[str]):
+        np = self._np
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32):
+        """Same call shape as SentenceTransformer.encode: a vector for a string, a matrix for a list"""
+        np = self._np
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Similar lengths share a batch, so little compute goes to padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.zeros((len(texts), 0), dtype=np.float32)
+        for offset in range(0, len(texts), batch_size):
+            positions = order[offset:offset + batch_size]
+            batch = self._encode_batch([texts[i] for i in positions])
+            if not vectors.shape[1]:
+                vectors = np.zeros((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[positions] = batch
+        return vectors[0] if single else vectors
+
+
+def onnx_model_files(model_name: str = DEFAULT_MODEL_NAME, quantized: bool = False) -> Tuple[str, str]:
+    """Paths to the ONNX model and tokenizer, downloaded (and int8-quantized) into ONNX_DIR once.
+
+    sentence-transformers publishes onnx/model.onnx next to tokenizer.json on the Hub; for
+    other models, put an export (e.g. `optimum-cli export onnx`) at the same paths.
+    """
+    local_dir = os.path.join(ONNX_DIR, model_name.replace("/", "--"))
+    model_path = os.path.join(local_dir, "onnx", "model.onnx")
+    tokenizer_path = os.path.join(local_dir, "tokenizer.json")
+
+    if not (os.path.exists(model_path) and os.path.exists(tokenizer_path)):
+        from huggingface_hub import hf_hub_download
+
+        repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        for filename in ("onnx/model.onnx", "tokenizer.json"):
+            hf_hub_download(repo_id, filename, local_dir=local_dir)
+
+    if not quantized:
+        return model_path, tokenizer_path
+
+    quantized_path = os.path.join(local_dir, "onnx", "model_int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # Weights stored as int8, activations quantized per batch at run time; no calibration data needed
+        quantize_dynamic(model_path, quantized_path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(quantized_path + ".tmp", quantized_path)
+    return quantized_path, tokenizer_path
+
+
+def load_embedding_model(model_name: str = DEFAULT_MODEL_NAME, backend: str = EMBEDDING_BACKEND):
+    """Load a model with an encode(sentences, batch_size) method for the chosen backend"""
+    if backend == "torch":
+        return load_sentence_transformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddingModel(*onnx_model_files(model_name, quantized=backend == "onnx-int8"))
+    raise ValueError(f"Unknown embedding backend: {backend}")
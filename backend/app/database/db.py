@@ -1,10 +1,24 @@
-from supabase import create_client,Client
+from functools import lru_cache
+from typing import TYPE_CHECKING
 import os
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-print(SUPABASE_URL,SUPABASE_KEY)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_supabase() -> "Client":
+    """Create the Supabase client on first use, so importing this module does no network or config work"""
+    from supabase import create_client
+
+    SUPABASE_URL = os.getenv("SUPABASE_URL")
+    SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def __getattr__(name):
+    # Keeps `db.supabase` working for callers that reach it as a module attribute
+    if name == "supabase":
+        return get_supabase()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
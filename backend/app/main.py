@@ -1,6 +1,6 @@
 from fastapi import FastAPI,HTTPException,APIRouter
 import bcrypt
-from app.database.db import supabase
+from app.database.db import get_supabase
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from authlib.integrations.starlette_client import OAuth
@@ -12,13 +12,27 @@ from starlette.middleware.sessions import SessionMiddleware
 import os
 from dotenv import load_dotenv
 from app.routers import chatbot
+from app.core.embeddings import embedding_service
+from app.services.embedding_service import embedding_manager
+from contextlib import asynccontextmanager
+import asyncio
 
 #router handel
 chatbot_router=APIRouter(prefix="/chatbot")
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Off by default so boots and reloads stay fast; enable on workers that should not
+    # make their first embedding request wait for the model
+    if os.getenv("WARM_UP_EMBEDDINGS", "false").lower() == "true":
+        seconds = await asyncio.to_thread(embedding_service.warm_up)
+        print(f"Embedding model {embedding_service.model_name} warmed up in {seconds:.1f}s")
+    yield
+    embedding_service.close()
+
+app = FastAPI(lifespan=lifespan)
 
 #middleware
 app.add_middleware(SessionMiddleware, secret_key="supersecret_session_key")
@@ -48,7 +62,7 @@ def signup(name:str,email:str,password:str):
     hashed_pw=bcrypt.hashpw(password.encode("utf-8"),bcrypt.gensalt()).decode()
 
     # Insert into Supabase
-    response = supabase.table("users").insert({
+    response = get_supabase().table("users").insert({
         "name": name,
         "email": email,
         "password_hash": hashed_pw,
@@ -69,7 +83,7 @@ def login(user:User):
     password=user.password
    
     #fetch user details
-    response=supabase.table("users").select("*").eq("email",email).execute()
+    response=get_supabase().table("users").select("*").eq("email",email).execute()
 
     if not response.data:
         raise HTTPException(status_code=404, detail="User not found")
@@ -128,95 +142,23 @@ def dash(user: dict = Depends(get_current_user)):
     return {"message": f"Welcome to dashboard, {user['sub']}!", "role": user["role"]}
 
 
+@app.get("/embeddings/cache/stats")
+def embedding_cache_stats():
+    """Hit and miss counts of the embedding cache in this worker, for sizing it"""
+    return embedding_service.cache.stats()
+
+
 @chatbot_router.get("/")
 def chat():
     return {"Hello":"world"}
 
 
 #embedings
-# Python script to generate embeddings and store in Supabase
-from sentence_transformers import SentenceTransformer
-from supabase import create_client
-
-model = SentenceTransformer('all-MiniLM-L6-v2')
-
-
-
-import os
-from dotenv import load_dotenv
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-title='First Post'
-body='Hello world!'
-
-# output=model.encode(body).tolist()
-# result=supabase.table('posts').insert({
-#     'title':title,
-#     'body':body,
-#     'embedding':output
-# }).execute()
-# print(result)
-
-# query=model.encode("hello world").tolist()
-# search_res=supabase.rpc('search_similar_posts',{
-#     'query_embedding':query,
-#     'match_count':1
-# }).execute()
-# print("Res:",search_res.data)
-
-
+# Sample posts and test searches live in scripts/init_vector_db.py; the model and the
+# Supabase client are created on first use (see app.core.embeddings, app.database.db)
 def search_similar_posts(query_text, limit=5):
-    # Generate query embedding
-    query_embedding = model.encode(query_text).tolist()
-    
-    # Search using Supabase RPC function
-    # Make sure you have the search function created in your database
     try:
-        search_result = supabase.rpc('search_similar_posts', {
-            'query_embedding': query_embedding,
-            'match_count': limit
-        }).execute()
-        
-        return search_result.data
+        return embedding_manager.search_similar_posts(query_text, limit)
     except Exception as e:
         print(f"Search error: {e}")
         return None
-
-sample_posts = [
-    ("Python Tutorial", "Learn Python programming with examples and exercises"),
-    ("React Guide", "Building modern web applications with React and JavaScript"),
-    ("AI Introduction", "Understanding artificial intelligence and machine learning basics"),
-    ("Database Design", "Best practices for designing relational databases")
-]
-
-print("\n--- Adding More Sample Data ---")
-for title, body in sample_posts:
-    embedding = model.encode(body).tolist()
-    result = supabase.table('posts').insert({
-        'title': title,
-        'body': body,
-        'embedding': embedding
-    }).execute()
-    print(f"Added: {title}")
-
-# Test search with more data
-print("\n--- Testing Search with More Data ---")
-test_queries = [
-    "programming tutorial",
-    "web development",
-    "machine learning",
-    "database management"
-]
-
-for query in test_queries:
-    print(f"\n🔍 Searching for: '{query}'")
-    results = search_similar_posts(query, 3)
-    if results:
-        for i, post in enumerate(results, 1):
-            similarity = post.get('similarity', 0)
-            print(f"{i}. {post['title']} (similarity: {similarity:.3f})")
-    else:
-        print("No results found")
\ No newline at end of file
@@ -1,27 +1,123 @@
+import json
+import os
+import threading
 from app.core.embeddings import embedding_service
-from app.utils.database import supabase
-from typing import List, Dict
+from app.database.db import get_supabase
+from typing import Any, List, Dict, Optional, Sequence
+
+# supabase: pgvector RPC only; local: in-process index only; auto: the local index once it
+# has data (after sync_local_index), Supabase until then
+SEARCH_BACKEND = os.getenv("VECTOR_SEARCH_BACKEND", "supabase")
+# numpy (exact), chroma (HNSW) or auto (by collection size)
+LOCAL_INDEX_KIND = os.getenv("VECTOR_INDEX", "auto")
 
 class EmbeddingManager:
+    def __init__(self, backend: str = SEARCH_BACKEND):
+        self.backend = backend
+        self._indexes = {}
+        self._lock = threading.Lock()
+    
+    def local_index(self, collection: str = "posts", size_hint: int = 0):
+        """The in-process index for a collection, opened (memory-mapped if persisted) on first use"""
+        if collection not in self._indexes:
+            with self._lock:
+                if collection not in self._indexes:
+                    # numpy and chromadb are only imported once a local index is used
+                    from app.core.embeddings.index import create_index
+                    self._indexes[collection] = create_index(LOCAL_INDEX_KIND, collection, size_hint)
+        return self._indexes[collection]
+    
+    def index_items(self, collection: str, ids: Sequence[Any], embeddings, metadata: Optional[Sequence[Dict[str, Any]]] = None):
+        """Add or replace vectors in a local collection (posts, or e.g. PDF chunks keyed by document and position)
+
+        A persisted index appends the change to its log, which other workers replay on their next search.
+        """
+        self.local_index(collection, size_hint=len(ids)).upsert(ids, embeddings, metadata)
+    
+    def _index_posts(self, rows: List[Dict], embeddings: List[List[float]]):
+        # Only kept in sync once a local backend is in use; sync_local_index fills it from scratch
+        if self.backend != "supabase" and rows:
+            self.index_items(
+                "posts",
+                [row['id'] for row in rows],
+                embeddings,
+                [{'title': row['title'], 'body': row['body']} for row in rows]
+            )
+    
     def create_post_with_embedding(self, title: str, body: str):
         embedding = embedding_service.generate_embedding(body)
         
-        result = supabase.table('posts').insert({
+        result = get_supabase().table('posts').insert({
             'title': title,
             'body': body,
             'embedding': embedding
         }).execute()
         
+        self._index_posts(result.data, [embedding])
         return result.data
     
-    def search_similar_posts(self, query: str, limit: int = 5):
-        query_embedding = embedding_service.generate_embedding(query)
+    def create_posts_with_embeddings(self, posts: List[Dict[str, str]]):
+        """Embed every body in one encode call and insert all posts in one request"""
+        if not posts:
+            return []
+        embeddings = embedding_service.generate_embeddings([post['body'] for post in posts])
         
-        result = supabase.rpc('search_similar_posts', {
+        result = get_supabase().table('posts').insert([
+            {
+                'title': post['title'],
+                'body': post['body'],
+                'embedding': embedding
+            }
+            for post, embedding in zip(posts, embeddings)
+        ]).execute()
+        
+        self._index_posts(result.data, embeddings)
+        return result.data
+    
+    def sync_local_index(self, page_size: int = 1000) -> int:
+        """Load every post from Supabase into the local index, drop posts deleted there, and persist it"""
+        total = get_supabase().table('posts').select('id', count='exact').limit(1).execute().count or 0
+        self.local_index("posts", size_hint=total)
+        count = 0
+        upstream = set()
+        while True:
+            rows = get_supabase().table('posts').select('id,title,body,embedding').order('id').range(count, count + page_size - 1).execute().data
+            if not rows:
+                break
+            self.index_items(
+                "posts",
+                [row['id'] for row in rows],
+                # pgvector columns come back as "[0.1,0.2,...]" strings
+                [json.loads(row['embedding']) if isinstance(row['embedding'], str) else row['embedding'] for row in rows],
+                [{'title': row['title'], 'body': row['body']} for row in rows]
+            )
+            upstream.update(row['id'] for row in rows)
+            count += len(rows)
+            if len(rows) < page_size:
+                break
+        self.local_index("posts").remove([id_ for id_ in self.local_index("posts").ids() if id_ not in upstream])
+        # One snapshot for the whole load instead of a log record per page
+        self.local_index("posts").save()
+        return count
+    
+    def _search_supabase(self, query_embedding: List[float], limit: int):
+        result = get_supabase().rpc('search_similar_posts', {
             'query_embedding': query_embedding,
             'match_count': limit
         }).execute()
         
         return result.data
+    
+    def search_similar_posts(self, query: str, limit: int = 5, backend: Optional[str] = None):
+        backend = backend or self.backend
+        query_embedding = embedding_service.generate_embedding(query)
+        
+        if backend == "local":
+            return self.local_index("posts").search(query_embedding, limit)
+        if backend == "auto":
+            index = self.local_index("posts")
+            if len(index):
+                return index.search(query_embedding, limit)
+        return self._search_supabase(query_embedding, limit)
 
-embedding_manager = EmbeddingManager()
\ No newline at end of file
+embedding_manager = EmbeddingManager()
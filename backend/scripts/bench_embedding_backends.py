@@ -0,0 +1,77 @@
+"""Compare embedding backends: import/load time, latency, throughput and memory.
+
+Usage (from backend/):
+    python -m scripts.bench_embedding_backends [--backends torch onnx onnx-int8] [--texts 256]
+
+Each backend runs in a fresh interpreter, so import time and peak RSS are its own. Load
+time covers importing the runtime and loading the model (after the first download).
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from scripts.bench_embeddings import make_texts
+
+
+def worker(backend: str, model_name: str, texts: int):
+    start = time.perf_counter()
+    from app.core.embeddings.models import load_embedding_model
+    model = load_embedding_model(model_name, backend)
+    load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.encode(["first call"])
+    first = time.perf_counter() - start
+
+    sample = make_texts(texts)
+    latencies = []
+    for text in sample[:100]:
+        start = time.perf_counter()
+        model.encode([text])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    model.encode(sample, batch_size=32)
+    throughput = len(sample) / (time.perf_counter() - start)
+
+    print(json.dumps({
+        "load_s": load,
+        "first_ms": first * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "throughput": throughput,
+        # ru_maxrss is in kilobytes on Linux
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.model, args.texts)
+        sys.exit(0)
+
+    print(f"{'backend':>10} {'load s':>7} {'first ms':>9} {'p50 ms':>7} {'emb/s':>8} {'peak RSS MB':>12}")
+    for backend in args.backends:
+        result = subprocess.run(
+            [sys.executable, "-m", "scripts.bench_embedding_backends", "--worker", backend, "--model", args.model, "--texts", str(args.texts)],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            print(f"{backend:>10} failed: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+            continue
+        stats = json.loads(result.stdout.strip().splitlines()[-1])
+        print(
+            f"{backend:>10} {stats['load_s']:7.2f} {stats['first_ms']:9.1f} {stats['p50_ms']:7.2f} "
+            f"{stats['throughput']:8.0f} {stats['rss_mb']:12.0f}"
+        )
@@ -0,0 +1,73 @@
+"""Report embeddings/sec against batch size, directly and through the micro-batching queue.
+
+Usage (from backend/):
+    python -m scripts.bench_embeddings [--texts N] [--clients C] [--max-wait-ms MS]
+
+Part one encodes N texts in fixed-size batches. Part two has C threads asking for one
+embedding at a time, as concurrent requests do, with the batcher capped at each batch size.
+Uses EMBEDDING_MODEL (default all-MiniLM-L6-v2).
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from app.core.embeddings import EmbeddingBatcher, embedding_service
+
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+
+
+def make_texts(count: int):
+    words = "learn python web react database design machine learning model vector search query".split()
+    return [" ".join(words[(i + j) % len(words)] for j in range(12)) + f" {i}" for i in range(count)]
+
+
+def direct(texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        embedding_service.model.encode(texts[offset:offset + batch_size], batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def batched(texts, clients: int, max_batch_size: int, max_wait_ms: float):
+    batcher = EmbeddingBatcher(embedding_service.encode, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    latencies = []
+    chunks = [texts[i::clients] for i in range(clients)]
+
+    def client(chunk):
+        for text in chunk:
+            start = time.perf_counter()
+            batcher.embed(text)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    batcher.close()
+    return len(texts) / elapsed, batcher.stats["texts"] / batcher.stats["batches"], statistics.median(latencies) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    print(f"Loading {embedding_service.model_name}: {embedding_service.warm_up():.1f}s")
+
+    print(f"\ndirect encode, {args.texts} texts")
+    print(f"{'batch size':>10} {'emb/s':>10}")
+    for batch_size in BATCH_SIZES:
+        print(f"{batch_size:>10} {direct(texts, batch_size):10.0f}")
+
+    print(f"\n{args.clients} concurrent clients, one text per call, max wait {args.max_wait_ms}ms")
+    print(f"{'max batch':>10} {'emb/s':>10} {'mean batch':>10} {'p50 ms':>8}")
+    for batch_size in BATCH_SIZES:
+        rate, mean_batch, p50 = batched(texts, args.clients, batch_size, args.max_wait_ms)
+        print(f"{batch_size:>10} {rate:10.0f} {mean_batch:10.1f} {p50:8.1f}")
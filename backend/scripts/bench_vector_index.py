@@ -0,0 +1,67 @@
+"""Compare the local vector indexes: build time, query latency and recall against exact search.
+
+Usage (from backend/):
+    python -m scripts.bench_vector_index [--sizes 1000 10000 50000] [--queries 200] [--dim 384]
+
+Uses random unit vectors, so no model or Supabase is needed. Recall@10 is measured against
+the NumPy brute-force result; reopen is the time to memory-map a persisted index.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.embeddings.index import ChromaIndex, NumpyIndex
+
+
+def measure(index, vectors, queries, exact=None):
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), 5000):
+        chunk = vectors[offset:offset + 5000]
+        index.upsert(list(range(offset, offset + len(chunk))), chunk, [{"title": f"post {i}"} for i in range(offset, offset + len(chunk))])
+    index.save()
+    build = time.perf_counter() - start
+
+    latencies, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = index.search(query, 10)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append([result["id"] for result in results])
+    recall = None
+    if exact is not None:
+        recall = statistics.mean(len(set(a) & set(b)) / len(b) for a, b in zip(found, exact))
+    return build, statistics.median(latencies), found, recall
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'vectors':>8} {'index':>6} {'build s':>8} {'p50 ms':>8} {'recall@10':>10} {'reopen ms':>10}")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        # Queries near stored vectors, as real queries land near related posts
+        queries = vectors[rng.integers(0, size, args.queries)] + 0.5 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        with tempfile.TemporaryDirectory() as path:
+            build, p50, exact, _ = measure(NumpyIndex(path), vectors, queries)
+            start = time.perf_counter()
+            reopened = NumpyIndex(path)
+            reopened.search(queries[0], 10)
+            reopen = (time.perf_counter() - start) * 1000
+            print(f"{size:>8} {'numpy':>6} {build:8.2f} {p50:8.2f} {1.0:10.3f} {reopen:10.1f}")
+
+        with tempfile.TemporaryDirectory() as path:
+            build, p50, _, recall = measure(ChromaIndex(path, "bench"), vectors, queries, exact)
+            start = time.perf_counter()
+            reopened = ChromaIndex(path, "bench")
+            reopened.search(queries[0], 10)
+            reopen = (time.perf_counter() - start) * 1000
+            print(f"{size:>8} {'chroma':>6} {build:8.2f} {p50:8.2f} {recall:10.3f} {reopen:10.1f}")
@@ -0,0 +1,61 @@
+"""Check that an embedding backend agrees with the reference (sentence-transformers on PyTorch).
+
+Usage (from backend/):
+    python -m scripts.check_embedding_parity [--backend onnx-int8] [--reference torch] [--min-cosine 0.99]
+
+Embeds the same sentences with both backends and reports the cosine between each pair of
+vectors, plus whether every query still ranks the same post first. Exits non-zero if the
+lowest cosine is under --min-cosine or any top-1 result changes.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from app.core.embeddings.models import DEFAULT_MODEL_NAME, load_embedding_model
+from scripts.init_vector_db import sample_posts, test_queries
+
+SENTENCES = [body for _, body in sample_posts] + test_queries + [
+    "A",
+    "How do I reverse a linked list in Python without recursion?",
+    "Explain the difference between TCP and UDP with examples from video streaming and file transfer.",
+    "Ünïcödé, emoji 🚀 and punctuation!!! should not break tokenization.",
+    " ".join(["Very long input that exceeds the model's maximum sequence length."] * 60)
+]
+
+MIN_COSINE = 0.99
+
+
+def compare(model: str, backend: str, reference: str = "torch"):
+    """Cosine between each pair of vectors, and how many queries rank a different post first"""
+    reference_vectors = np.asarray(load_embedding_model(model, reference).encode(SENTENCES), dtype=np.float32)
+    candidate_vectors = np.asarray(load_embedding_model(model, backend).encode(SENTENCES), dtype=np.float32)
+
+    reference_vectors /= np.linalg.norm(reference_vectors, axis=1, keepdims=True)
+    candidate_vectors /= np.linalg.norm(candidate_vectors, axis=1, keepdims=True)
+    cosines = (reference_vectors * candidate_vectors).sum(axis=1)
+
+    posts = len(sample_posts)
+    queries = slice(posts, posts + len(test_queries))
+    reference_top = (reference_vectors[queries] @ reference_vectors[:posts].T).argmax(axis=1)
+    candidate_top = (candidate_vectors[queries] @ candidate_vectors[:posts].T).argmax(axis=1)
+    return cosines, int((reference_top != candidate_top).sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="onnx-int8")
+    parser.add_argument("--reference", default="torch")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--min-cosine", type=float, default=MIN_COSINE)
+    args = parser.parse_args()
+
+    cosines, changed = compare(args.model, args.backend, args.reference)
+
+    print(f"{args.backend} vs {args.reference} ({args.model}), {len(SENTENCES)} sentences")
+    print(f"cosine: mean {cosines.mean():.5f}, min {cosines.min():.5f}")
+    for sentence, cosine in sorted(zip(SENTENCES, cosines), key=lambda item: item[1])[:3]:
+        print(f"  {cosine:.5f}  {sentence[:60]!r}")
+    print(f"top-1 post changed for {changed} of {len(test_queries)} queries")
+
+    sys.exit(1 if cosines.min() < args.min_cosine or changed else 0)
@@ -0,0 +1,70 @@
+"""Check that importing the API stays cheap: no model runtime or Supabase client at import.
+
+Usage (from backend/):
+    python -m scripts.check_import_time [--module app.main] [--budget 1.0] [--top 15]
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter, prints the
+slowest imports by cumulative time, and exits non-zero if the total exceeds the budget
+(seconds) or if any module that should only load on first use was imported.
+"""
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+# Loaded lazily by app.core.embeddings and app.database.db
+LAZY_MODULES = ("sentence_transformers", "torch", "transformers", "onnxruntime", "tokenizers", "supabase")
+BUDGET_SECONDS = 1.0
+
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every import made by importing module in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        imports.append((name, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def total_seconds(imports: List[Tuple[str, int, int]]) -> float:
+    return sum(self_us for _, self_us, _ in imports) / 1e6
+
+
+def eager_modules(imports: List[Tuple[str, int, int]]) -> List[str]:
+    """Modules that should only load on first use but were imported"""
+    return sorted({name.strip().split(".")[0] for name, _, _ in imports} & set(LAZY_MODULES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    try:
+        imports = measure(args.module)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    total = total_seconds(imports)
+
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, self_us, cumulative_us in sorted(imports, key=lambda item: item[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:8.1f}  {name}")
+
+    eager = eager_modules(imports)
+    print(f"\nimport {args.module}: {total:.3f}s (budget {args.budget:.1f}s)")
+    if eager:
+        print(f"Imported eagerly: {', '.join(eager)}")
+    sys.exit(1 if total > args.budget or eager else 0)
@@ -0,0 +1,55 @@
+"""Seed the posts table with sample posts and run a few similarity searches.
+
+Usage (from backend/):
+    python -m scripts.init_vector_db
+
+This used to run on every import of app/main.py. Posts whose title already exists are
+skipped, so running it again does not add duplicate rows.
+"""
+from app.database.db import get_supabase
+from app.services.embedding_service import embedding_manager
+
+sample_posts = [
+    ("Python Tutorial", "Learn Python programming with examples and exercises"),
+    ("React Guide", "Building modern web applications with React and JavaScript"),
+    ("AI Introduction", "Understanding artificial intelligence and machine learning basics"),
+    ("Database Design", "Best practices for designing relational databases")
+]
+
+test_queries = [
+    "programming tutorial",
+    "web development",
+    "machine learning",
+    "database management"
+]
+
+
+def seed():
+    titles = [title for title, _ in sample_posts]
+    existing = get_supabase().table('posts').select('title').in_('title', titles).execute()
+    existing_titles = {row['title'] for row in existing.data or []}
+
+    print("\n--- Adding More Sample Data ---")
+    new_posts = [{'title': title, 'body': body} for title, body in sample_posts if title not in existing_titles]
+    for title in sorted(existing_titles):
+        print(f"Skipped (exists): {title}")
+    for post in embedding_manager.create_posts_with_embeddings(new_posts):
+        print(f"Added: {post['title']}")
+
+
+def search():
+    print("\n--- Testing Search with More Data ---")
+    for query in test_queries:
+        print(f"\n🔍 Searching for: '{query}'")
+        results = embedding_manager.search_similar_posts(query, 3)
+        if results:
+            for i, post in enumerate(results, 1):
+                similarity = post.get('similarity', 0)
+                print(f"{i}. {post['title']} (similarity: {similarity:.3f})")
+        else:
+            print("No results found")
+
+
+if __name__ == "__main__":
+    seed()
+    search()
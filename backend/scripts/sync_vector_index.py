@@ -0,0 +1,20 @@
+"""Fill the local vector index from the Supabase posts table.
+
+Usage (from backend/):
+    python -m scripts.sync_vector_index
+
+The index is written under VECTOR_INDEX_DIR (default data/vector_index). API workers
+started with VECTOR_SEARCH_BACKEND=auto or local memory-map it on first search. Posts
+created through EmbeddingManager are appended to the index's log, which every worker
+replays before searching; the log is folded into a new snapshot once it grows past
+VECTOR_INDEX_COMPACT_BYTES.
+"""
+import time
+
+from app.services.embedding_service import embedding_manager
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    count = embedding_manager.sync_local_index()
+    index = embedding_manager.local_index("posts")
+    print(f"Indexed {count} posts into {type(index).__name__} in {time.perf_counter() - start:.1f}s")
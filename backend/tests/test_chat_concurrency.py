@@ -0,0 +1,91 @@
+"""Concurrent /api/chat/ask calls must wait on Gemini together: N questions take about as long as one, not N times as long."""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+
+PDFBRAIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PDFBrain")
+sys.path.insert(0, PDFBRAIN_DIR)
+
+# Always a throwaway SQLite file, never an exported DATABASE_URL
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "chat_concurrency.db")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("google.genai")
+
+import httpx
+from fastapi.testclient import TestClient
+
+from database import SessionLocal
+from models import DocumentChunk, PDFDocument
+from services.gemini_service import gemini_service
+from services.response_cache import response_cache
+
+# Seconds each fake Gemini call takes; a question makes two (query embedding, then the answer)
+GEMINI_LATENCY = 0.5
+CONCURRENT_QUESTIONS = 8
+
+
+class FakeModels:
+    """Stands in for client.aio.models, answering after GEMINI_LATENCY without blocking the event loop"""
+
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(GEMINI_LATENCY)
+        return SimpleNamespace(text="An answer.", usage_metadata=None)
+
+    async def embed_content(self, model, contents, config=None):
+        await asyncio.sleep(GEMINI_LATENCY)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=[1.0, 0.0]) for _ in contents])
+
+
+async def seed() -> int:
+    """Store an already indexed document so questions go straight to retrieval and the model, and return its id"""
+    async with SessionLocal() as db:
+        document = PDFDocument(
+            filename="test.pdf", original_filename="test.pdf", file_path="test.pdf", file_size=0,
+            extracted_text="Some document text.", status="ready"
+        )
+        db.add(document)
+        await db.flush()
+        db.add(DocumentChunk(document_id=document.id, chunk_index=0, content="Some document text.", embedding=[1.0, 0.0]))
+        await db.commit()
+        return document.id
+
+
+async def ask(app, document_id: int, questions):
+    """Post the questions to /api/chat/ask at once and return the responses with the wall time taken"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(
+            http.post("/api/chat/ask", json={"document_id": document_id, "message": question})
+            for question in questions
+        ))
+        return responses, time.perf_counter() - started
+
+
+def test_concurrent_questions_overlap(monkeypatch):
+    monkeypatch.setattr(gemini_service, "client", SimpleNamespace(aio=SimpleNamespace(models=FakeModels())))
+    # Every question must reach the model; a cached answer would return without waiting on it
+    monkeypatch.setattr(response_cache, "backend", None)
+    # The app mounts static/ and uploads/ relative to the working directory
+    monkeypatch.chdir(PDFBRAIN_DIR)
+    from main import app
+
+    with TestClient(app) as client:
+        document_id = client.portal.call(seed)
+
+        responses, single = client.portal.call(ask, app, document_id, ["What is this document about?"])
+        assert responses[0].status_code == 200, responses[0].text
+
+        questions = [f"What does part {i} say?" for i in range(CONCURRENT_QUESTIONS)]
+        responses, elapsed = client.portal.call(ask, app, document_id, questions)
+
+    assert [response.status_code for response in responses] == [200] * CONCURRENT_QUESTIONS
+    assert elapsed < 2 * single, (
+        f"{CONCURRENT_QUESTIONS} concurrent questions took {elapsed:.2f}s, one took {single:.2f}s"
+    )
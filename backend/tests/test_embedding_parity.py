@@ -0,0 +1,28 @@
+"""The ONNX backends must embed like sentence-transformers on PyTorch: near-identical vectors, same top-1 posts."""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+for module in ("numpy", "torch", "sentence_transformers", "onnxruntime", "tokenizers", "huggingface_hub"):
+    pytest.importorskip(module)
+
+from app.core.embeddings.models import DEFAULT_MODEL_NAME
+from scripts.check_embedding_parity import MIN_COSINE, compare
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_backend_matches_torch(backend, monkeypatch):
+    # ONNX_DIR is relative to backend/
+    monkeypatch.chdir(BACKEND_DIR)
+    try:
+        cosines, changed = compare(DEFAULT_MODEL_NAME, backend)
+    except OSError as e:
+        # Model files come from the Hugging Face Hub on first use
+        pytest.skip(f"model files unavailable: {e}")
+
+    assert cosines.min() >= MIN_COSINE, f"{backend} lowest cosine to torch is {cosines.min():.5f}"
+    assert changed == 0, f"{backend} ranks a different post first for {changed} queries"
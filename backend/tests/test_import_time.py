@@ -0,0 +1,29 @@
+"""Importing the API must stay within the import-time budget and leave model runtimes and the Supabase client unloaded."""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from scripts.check_import_time import BUDGET_SECONDS, eager_modules, measure, total_seconds
+
+# Imported by app.main for login; without them only the embedding and database layers can be checked
+AUTH_MODULES = ("bcrypt", "authlib", "jose")
+MISSING_AUTH = [name for name in AUTH_MODULES if importlib.util.find_spec(name) is None]
+
+
+@pytest.mark.parametrize("module", [
+    pytest.param("app.main", marks=pytest.mark.skipif(bool(MISSING_AUTH), reason=f"auth dependencies missing: {MISSING_AUTH}")),
+    "app.core.embeddings",
+    "app.services.embedding_service",
+    "app.database.db",
+])
+def test_import_is_lazy_and_within_budget(module, monkeypatch):
+    monkeypatch.chdir(BACKEND_DIR)
+    imports = measure(module)
+
+    assert eager_modules(imports) == [], f"import {module} loaded modules that should load on first use"
+    assert total_seconds(imports) <= BUDGET_SECONDS, f"import {module} took {total_seconds(imports):.3f}s"
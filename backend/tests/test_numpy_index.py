@@ -0,0 +1,128 @@
+"""NumpyIndex must search what was written, share its changes with other instances on the same directory, and lose nothing when one compacts while another writes."""
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+np = pytest.importorskip("numpy")
+
+from app.core.embeddings import index as index_module
+from app.core.embeddings.index import NumpyIndex
+from app.services import embedding_service as embedding_service_module
+from app.services.embedding_service import EmbeddingManager
+
+DIM = 8
+
+
+def vector(i: int) -> np.ndarray:
+    """A distinct vector per id, so each id is its own nearest neighbour"""
+    return np.random.default_rng(i).standard_normal(DIM).astype(np.float32)
+
+
+def test_upsert_remove_search():
+    index = NumpyIndex()
+    index.upsert([1, 2, 3], [vector(1), vector(2), vector(3)], [{"title": "one"}, {"title": "two"}, {"title": "three"}])
+
+    top = index.search(vector(2), limit=2)
+    assert top[0]["id"] == 2 and top[0]["title"] == "two"
+    assert top[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert len(top) == 2
+
+    # Replacing keeps one row per id
+    index.upsert([2], [vector(4)], [{"title": "four"}])
+    assert len(index) == 3
+    assert index.search(vector(4), limit=1)[0] == pytest.approx({"id": 2, "title": "four", "similarity": 1.0}, abs=1e-5)
+
+    index.remove([2, 99])
+    assert sorted(index.ids()) == [1, 3]
+    assert 2 not in [hit["id"] for hit in index.search(vector(4), limit=5)]
+
+    with pytest.raises(ValueError):
+        index.upsert([5], [np.ones(DIM + 1)])
+
+
+def test_second_instance_replays_log(tmp_path):
+    writer = NumpyIndex(str(tmp_path))
+    writer.upsert([(1, 0), (1, 1)], [vector(10), vector(11)], [{"page": 0}, {"page": 1}])
+    writer.save()
+    # Left in the log, after the snapshot
+    writer.upsert([(2, 0)], [vector(20)], [{"page": 0}])
+    writer.remove([(1, 0)])
+
+    reader = NumpyIndex(str(tmp_path))
+    assert sorted(reader.ids()) == [(1, 1), (2, 0)]
+    assert reader.search(vector(20), limit=1)[0]["id"] == (2, 0)
+
+    # Later writes reach the reader on its next search
+    writer.upsert([(3, 0)], [vector(30)])
+    assert reader.search(vector(30), limit=1)[0]["id"] == (3, 0)
+
+
+def test_compaction_while_another_instance_writes(tmp_path, monkeypatch):
+    # Every few records a write folds the log into a new snapshot
+    monkeypatch.setattr(index_module, "COMPACT_BYTES", 1024)
+    first, second = NumpyIndex(str(tmp_path)), NumpyIndex(str(tmp_path))
+
+    def write(index, ids):
+        for i in ids:
+            index.upsert([i], [vector(i)])
+
+    threads = [
+        threading.Thread(target=write, args=(first, range(0, 100))),
+        threading.Thread(target=write, args=(second, range(100, 200)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.path.getsize(tmp_path / "log.jsonl") <= 1024 + 512
+    for index in (first, second, NumpyIndex(str(tmp_path))):
+        assert sorted(index.ids()) == list(range(200))
+        assert index.search(vector(150), limit=1)[0]["id"] == 150
+
+
+class FakePosts:
+    """The slice of the Supabase query builder sync_local_index uses, over a fixed list of posts"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.bounds = None
+
+    def table(self, name):
+        return self
+
+    def select(self, columns, count=None):
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        rows = self.rows[self.bounds[0]:self.bounds[1] + 1] if self.bounds else []
+        self.bounds = None
+        return SimpleNamespace(data=rows, count=len(self.rows))
+
+
+def test_sync_removes_posts_deleted_upstream(tmp_path, monkeypatch):
+    manager = EmbeddingManager(backend="local")
+    manager._indexes["posts"] = NumpyIndex(str(tmp_path))
+    manager.index_items("posts", [1, 2, 3], [vector(1), vector(2), vector(3)])
+
+    rows = [{"id": i, "title": f"post {i}", "body": "", "embedding": vector(i).tolist()} for i in (1, 3, 4, 5, 6)]
+    monkeypatch.setattr(embedding_service_module, "get_supabase", lambda: FakePosts(rows))
+
+    assert manager.sync_local_index(page_size=2) == 5
+    assert sorted(NumpyIndex(str(tmp_path)).ids()) == [1, 3, 4, 5, 6]
@@ -0,0 +1,109 @@
+"""PDFBrain quiz endpoints must issue as many SQL statements for 50 quizzes as for one (no N+1)."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+PDFBRAIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PDFBrain")
+sys.path.insert(0, PDFBRAIN_DIR)
+
+# Always a throwaway SQLite file, never an exported DATABASE_URL: the schema is dropped and recreated
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_counts.db")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("google.genai")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from database import Base, SessionLocal, count_queries, engine
+from models import PDFDocument, Quiz, QuizQuestion
+from services.analytics_service import analytics_service
+
+QUIZ_COUNTS = (1, 10, 50)
+QUESTIONS_PER_QUIZ = 5
+ENDPOINTS = (
+    "GET /api/quiz/",
+    "GET /api/quiz/document/{id}/quizzes",
+    "GET /api/quiz/quiz/{id}/stats",
+    "GET /api/quiz/progress/{user_id}",
+)
+
+
+async def seed(num_quizzes: int) -> int:
+    """Recreate the schema with a document holding num_quizzes quizzes, each attempted num_quizzes times, and return its id"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        document = PDFDocument(filename="test.pdf", original_filename="test.pdf", file_path="test.pdf", file_size=0, status="ready")
+        db.add(document)
+        await db.flush()
+        for q in range(num_quizzes):
+            quiz = Quiz(document_id=document.id, title=f"Quiz {q}", total_questions=QUESTIONS_PER_QUIZ)
+            quiz.questions = [
+                QuizQuestion(question_type="mcq", question_text=f"Q{i}", correct_answer="A", options=["A", "B"], order_index=i + 1)
+                for i in range(QUESTIONS_PER_QUIZ)
+            ]
+            db.add(quiz)
+        await db.commit()
+
+        await analytics_service.record(db, [
+            (f"user-{u}", {
+                "quiz_id": quiz.id,
+                "score": 100.0,
+                "correct_answers": QUESTIONS_PER_QUIZ,
+                "total_questions": QUESTIONS_PER_QUIZ,
+                "results": [{"question_id": question.id, "user_answer": "A", "is_correct": True} for question in quiz.questions]
+            })
+            for quiz in (await db.scalars(select(Quiz).options(selectinload(Quiz.questions)))).all()
+            for u in range(num_quizzes)
+        ])
+        await db.commit()
+        return document.id
+
+
+async def drop_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+
+@pytest.fixture(scope="module")
+def statement_counts():
+    """Statements per endpoint at each of QUIZ_COUNTS"""
+    counts = {}
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # The app mounts static/ and uploads/ relative to the working directory
+        monkeypatch.chdir(PDFBRAIN_DIR)
+        from main import app
+
+        # Keep one event loop for the whole run and seed through it, so pooled async connections stay on their loop
+        with TestClient(app) as client:
+            for num_quizzes in QUIZ_COUNTS:
+                document_id = client.portal.call(seed, num_quizzes)
+                quiz_id = client.get(f"/api/quiz/document/{document_id}/quizzes").json()[0]["id"]
+
+                urls = (
+                    "/api/quiz/?limit=1000",
+                    f"/api/quiz/document/{document_id}/quizzes",
+                    f"/api/quiz/quiz/{quiz_id}/stats",
+                    "/api/quiz/progress/user-0",
+                )
+                for name, url in zip(ENDPOINTS, urls):
+                    with count_queries() as counter:
+                        response = client.get(url)
+                    response.raise_for_status()
+                    counts.setdefault(name, []).append(counter["count"])
+
+            client.portal.call(drop_schema)
+    return counts
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_statement_count_does_not_grow_with_quizzes(statement_counts, endpoint):
+    counts = statement_counts[endpoint]
+    assert counts[-1] <= counts[0], f"{endpoint} issued {counts} statements for {QUIZ_COUNTS} quizzes"